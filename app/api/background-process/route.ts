@@ -24,6 +24,18 @@ export async function GET(request: NextRequest) {
           timestamp: new Date().toISOString()
         });
 
+      case 'events':
+        // offset 以降の新しいイベントのみ返す（次回は返却された offset を指定）
+        const offset = parseInt(url.searchParams.get('offset') || '0');
+        const eventsResult = await BackgroundProcessManager.getGenerationEvents(offset);
+
+        return NextResponse.json({
+          success: true,
+          events: eventsResult.events,
+          offset: eventsResult.offset,
+          timestamp: new Date().toISOString()
+        });
+
       case 'logs':
         const tailLines = parseInt(url.searchParams.get('lines') || '50');
         const logs = await BackgroundProcessManager.getProcessLogs(tailLines);
@@ -37,7 +49,7 @@ export async function GET(request: NextRequest) {
       default:
         return NextResponse.json({
           success: false,
-          error: 'Invalid action. Use: status, logs'
+          error: 'Invalid action. Use: status, events, logs'
         }, { status: 400 });
     }
 
@@ -83,7 +95,7 @@ export async function POST(request: NextRequest) {
 
 async function handleStartGeneration(params: any) {
   try {
-    const { sessionId, totalImages, imagePrompts } = params;
+    const { sessionId, totalImages, imagePrompts, resume } = params;
 
     if (!sessionId || !totalImages) {
       return NextResponse.json({
@@ -95,7 +107,8 @@ async function handleStartGeneration(params: any) {
     const config: BackgroundProcessConfig = {
       sessionId,
       totalImages: parseInt(totalImages),
-      imagePrompts
+      imagePrompts,
+      resume: resume === true || resume === 'true'
     };
 
     // 状態ファイル初期化
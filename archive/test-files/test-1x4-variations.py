@@ -11,7 +11,6 @@ import time
 from datetime import datetime
 from diffusers import StableDiffusionXLPipeline
 import torch
-from PIL import Image
 
 # プロジェクトディレクトリに移動
 os.chdir('/Users/gotohiro/Documents/user/Products/ContentFlow/sanity-edition')
@@ -20,6 +19,7 @@ os.chdir('/Users/gotohiro/Documents/user/Products/ContentFlow/sanity-edition')
 MODEL_PATH = "/Users/gotohiro/Documents/user/Products/AI/models/diffusers/juggernaut-xl"
 OUTPUT_DIR = "public/images/blog/test-1x4-variations"
 STATUS_FILE = "image-generation-status.json"
+BASE_SEED = 42  # バリエーション i のシードは BASE_SEED + i
 
 # 出力ディレクトリ作成
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -92,78 +92,74 @@ def generate_header_variations(pipeline):
     
     results = []
     
-    for i, variation in enumerate(style_variations, 1):
-        print(f"\n🎨 バリエーション {i}/4 生成中: {variation['name']}")
-        print(f"📝 説明: {variation['description']}")
+    # 4バリエーションを1回のパイプライン呼び出しでまとめて生成（プロンプト埋め込みもまとめてエンコード）
+    # シードはバリエーションごとに固定し、同じシードで1枚ずつ再生成できるよう記録する
+    seeds = [BASE_SEED + i for i in range(len(style_variations))]
+    prompts = [f"{base_prompt}, {variation['style']}" for variation in style_variations]
+    print(f"\n🎨 {len(style_variations)}バリエーションをバッチ生成中: {', '.join(v['name'] for v in style_variations)}")
+    
+    try:
+        start_time = time.time()
         
-        # プロンプト構築
-        full_prompt = f"{base_prompt}, {variation['style']}"
+        # 画像生成
+        images = pipeline(
+            prompt=prompts,
+            negative_prompt=[negative_prompt] * len(prompts),
+            width=1600,
+            height=896,  # 16:9比率、8の倍数
+            num_inference_steps=25,
+            guidance_scale=7.5,
+            generator=[torch.Generator("cpu").manual_seed(seed) for seed in seeds]
+        ).images
         
-        try:
-            start_time = time.time()
-            
-            # 画像生成
-            image = pipeline(
-                prompt=full_prompt,
-                negative_prompt=negative_prompt,
-                width=1600,
-                height=896,  # 16:9比率、8の倍数
-                num_inference_steps=25,
-                guidance_scale=7.5,
-                num_images_per_prompt=1
-            ).images[0]
-            
-            generation_time = time.time() - start_time
-            
-            # ファイル名生成
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"header-{variation['name']}-{timestamp}.png"
-            filepath = os.path.join(OUTPUT_DIR, filename)
-            
-            # 画像保存
-            image.save(filepath)
-            
-            # 結果記録
-            result = {
-                "variation": variation['name'],
-                "description": variation['description'],
-                "filename": filename,
-                "filepath": filepath,
-                "prompt": full_prompt,
-                "generation_time": f"{generation_time:.2f}秒",
-                "resolution": "1600x896",
-                "status": "success"
-            }
-            
-            results.append(result)
-            
-            # 状態更新
-            status_data["completed"] += 1
-            status_data["variations"].append(result)
-            
-            with open(STATUS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f, ensure_ascii=False, indent=2)
-            
-            print(f"✅ 生成完了: {filename} ({generation_time:.2f}秒)")
-            
-        except Exception as e:
-            print(f"❌ エラー発生: {str(e)}")
-            
+        batch_time = time.time() - start_time
+        print(f"📦 バッチ生成完了: {batch_time:.2f}秒 ({batch_time / len(images):.2f}秒/枚)")
+    except Exception as e:
+        print(f"❌ エラー発生: {str(e)}")
+        images = []
+        batch_error = str(e)
+    
+    for i, variation in enumerate(style_variations):
+        if not images:
             # エラー記録
             error_result = {
                 "variation": variation['name'],
                 "description": variation['description'],
+                "seed": seeds[i],
                 "status": "failed",
-                "error": str(e),
+                "error": batch_error,
                 "timestamp": datetime.now().isoformat()
             }
-            
             results.append(error_result)
             status_data["failed"] += 1
             status_data["variations"].append(error_result)
-            
-            with open(STATUS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f, ensure_ascii=False, indent=2)
+            continue
+        
+        # ファイル名生成
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"header-{variation['name']}-{timestamp}.png"
+        filepath = os.path.join(OUTPUT_DIR, filename)
+        
+        # 画像保存
+        images[i].save(filepath)
+        
+        # 結果記録
+        result = {
+            "variation": variation['name'],
+            "description": variation['description'],
+            "filename": filename,
+            "filepath": filepath,
+            "prompt": prompts[i],
+            "seed": seeds[i],
+            "generation_time": f"{batch_time / len(images):.2f}秒",
+            "resolution": "1600x896",
+            "status": "success"
+        }
+        
+        results.append(result)
+        status_data["completed"] += 1
+        status_data["variations"].append(result)
+        print(f"✅ 生成完了: {filename} (シード {seeds[i]})")
     
     # 最終状態更新
     status_data["status"] = "completed"
@@ -7,37 +7,48 @@ JSONファイルから画像プロンプトを読み取り、Stable Diffusionで
 import os
 import sys
 import json
-import time
+import signal
 import argparse
 import subprocess
 from datetime import datetime
 from pathlib import Path
 
+from contentflow_sd import MODEL_PATH, build_request, get_generator
+from contentflow_sd.settings import CHECKPOINT_INTERVAL, MEMORY_PROFILES, MEMORY_PROFILE, SPEED_PROFILES, SPEED_PROFILE
+from contentflow_sd.generator import find_existing_output
+from contentflow_sd.writer import apply_write_failures
+from contentflow_sd.derivatives import process_sessions
+from contentflow_sd.status import StatusLog
+from contentflow_sd.progress import session_eta
+from contentflow_sd.metrics import format_stages
+from contentflow_sd.validation import validate_article, print_messages
+
 class BackgroundImageGenerator:
-    def __init__(self, session_id):
+    def __init__(self, session_id, use_server=True, batch_size=1, force=False, derivatives=True, progress=True,
+                 resume=False, checkpoint_every=CHECKPOINT_INTERVAL, memory_profile=None, speed_profile=None):
         self.session_id = session_id
-        self.status_file = "image-generation-status.json"
-        self.model_path = "/Users/gotohiro/Documents/user/Products/AI/models/diffusers/juggernaut-xl"
+        self.memory_profile = memory_profile
+        self.speed_profile = speed_profile
+        self.resume = resume
+        self.checkpoint_every = checkpoint_every
+        self.interrupted = False
+        self.progress = progress
+        self.status_data = None
+        self.use_server = use_server
+        self.batch_size = batch_size
+        self.force = force
+        self.derivatives = derivatives
+        self.status = StatusLog(session_id)
+        self.model_path = MODEL_PATH
         self.python_path = "/Users/gotohiro/Documents/user/Products/stable-diffusion-local/venv310/bin/python"
         self.output_base_dir = f"public/images/blog/auto-generated/{session_id}"
-        
-        # Stable Diffusion環境の準備
-        self.setup_stable_diffusion()
+        # モデルは記事ファイルの検証後に準備する（run_background_generation）
+        self.generator = None
     
     def setup_stable_diffusion(self):
-        """Stable Diffusion環境セットアップ"""
+        """Stable Diffusion環境セットアップ（常駐サーバーがあれば利用）"""
         try:
-            from diffusers import StableDiffusionXLPipeline
-            import torch
-            
-            print(f"📂 Stable Diffusionモデルロード中...")
-            
-            self.pipe = StableDiffusionXLPipeline.from_pretrained(
-                self.model_path,
-                torch_dtype=torch.float16,
-                use_safetensors=False  # .bin形式のため必須
-            ).to("mps")  # Apple Silicon最適化
-            
+            self.generator = get_generator(self.model_path, use_server=self.use_server, memory_profile=self.memory_profile)
             print(f"✅ Stable Diffusion環境セットアップ完了")
             
         except Exception as e:
@@ -61,6 +72,13 @@ class BackgroundImageGenerator:
                 print(f"❌ 記事ファイルに画像プロンプトが含まれていません")
                 return None
             
+            # 必須フィールド・パラメータ範囲・ポジション重複（モデルのロード前に検出）
+            validation = validate_article(data)
+            print_messages(validation)
+            if validation["errors"]:
+                print(f"❌ 記事ファイルの画像プロンプトが無効です（{len(validation['errors'])}件）")
+                return None
+            
             print(f"✅ 記事データ読み込み完了")
             print(f"📝 記事タイトル: {data['article']['title']}")
             print(f"🎨 画像プロンプト数: {len(data['imagePrompts'])}")
@@ -71,80 +89,140 @@ class BackgroundImageGenerator:
             print(f"❌ 記事ファイル読み込みエラー: {e}")
             return None
     
-    def update_status(self, status_data):
-        """画像生成状況の更新"""
-        try:
-            with open(self.status_file, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f, indent=2, ensure_ascii=False)
-            
-        except Exception as e:
-            print(f"⚠️ 状況更新エラー: {e}")
+    def build_generation_request(self, prompt_data):
+        """生成リクエスト作成（途中チェックポイント・再開の指定を付与）"""
+        request = build_request(prompt_data, self.output_base_dir, session_id=self.session_id)
+        request["force"] = self.force
+        request["checkpoint_every"] = self.checkpoint_every
+        request["resume"] = self.resume
+        # 記事側の parameters.memory_profile / speed_profile を優先
+        for name, value in (("memory_profile", self.memory_profile), ("speed_profile", self.speed_profile)):
+            if value:
+                request["parameters"] = dict(request["parameters"])
+                request["parameters"].setdefault(name, value)
+        return request
+    
+    def handle_sigterm(self, signum, frame):
+        """SIGTERM受信時は実行中の画像をチェックポイント保存して止める（--resume で続きから再開）"""
+        print(f"\n🛑 シグナル {signum} を受信しました。チェックポイントを保存して中断します...")
+        self.interrupted = True
+        self.generator.interrupt()
+    
+    def skipped_result(self, prompt_data, output_path):
+        """既存画像を使う結果"""
+        print(f"⏭️ 生成済みのためスキップ ({prompt_data['position']}): {output_path}")
+        return {
+            "success": True,
+            "output_path": output_path,
+            "filename": os.path.basename(output_path),
+            "generation_time": 0.0,
+            "position": prompt_data['position'],
+            "description": prompt_data.get('description', ''),
+            "seed": None,
+            "skipped": True
+        }
+    
+    def update_status(self, status_data, event_type, event_data=None):
+        """画像生成状況の更新（イベントログに追記し、スナップショットを置換）"""
+        self.status.emit(event_type, event_data, status_data)
     
     def generate_image(self, prompt_data, output_dir):
         """単一画像生成"""
         print(f"\n🎨 画像生成開始: {prompt_data['position']}")
         print(f"📝 説明: {prompt_data['description']}")
         
-        try:
-            # 出力ディレクトリ作成
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # プロンプト構築
-            full_prompt = f"{prompt_data['prompt']}, {prompt_data['style']}"
-            
-            # 超強化ネガティブプロンプト（人物描画完全防止）
-            base_negative = prompt_data['negativePrompt']
-            human_prevention = "person, people, human, man, woman, face, realistic human features, portrait, character, figure, body, silhouette, sitting person, standing person, anyone, somebody, individual"
-            negative_prompt = f"{base_negative}, {human_prevention}"
-            
-            print(f"🔤 プロンプト: {full_prompt[:80]}...")
-            print(f"🚫 人物除去プロンプト適用済み")
-            
-            # 画像生成実行
-            print(f"⚡ 画像生成実行中...")
-            start_time = time.time()
-            
-            params = prompt_data.get('parameters', {})
-            
-            image = self.pipe(
-                prompt=full_prompt,
-                negative_prompt=negative_prompt,
-                width=params.get('width', 1600),
-                height=params.get('height', 896),
-                num_inference_steps=params.get('num_inference_steps', 25),
-                guidance_scale=params.get('guidance_scale', 7.5)
-            ).images[0]
-            
-            generation_time = time.time() - start_time
-            
-            # ファイル名生成・保存
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{prompt_data['position']}-{timestamp}.png"
-            output_path = os.path.join(output_dir, filename)
-            
-            image.save(output_path)
-            
+        request = self.build_generation_request(prompt_data)
+        request["output_dir"] = output_dir
+        
+        print(f"🔤 プロンプト: {request['prompt'][:80]}...")
+        print(f"🚫 人物除去プロンプト適用済み")
+        
+        # 画像生成実行
+        print(f"⚡ 画像生成実行中...")
+        result = self.generator.generate(request)
+        
+        if result["success"]:
+            params = request['parameters']
             print(f"✅ 画像生成完了")
-            print(f"⏱️ 生成時間: {generation_time:.2f}秒")
-            print(f"💾 保存先: {output_path}")
+            print(f"⏱️ 生成時間: {result['generation_time']:.2f}秒")
+            print(f"💾 保存先: {result['output_path']}")
             print(f"📏 解像度: {params.get('width', 1600)}x{params.get('height', 896)}")
+            print(f"🎲 シード: {result['seed']}")
+            if result.get("speed_profile"):
+                print(f"🏎️ 速度プロファイル: {result['speed_profile']}（{result['scheduler']} / {result['steps']}ステップ）")
+        
+        return result
+    
+    def publish_progress(self, progress):
+        """デノイズステップ進捗をスナップショットに反映（通知は StepProgress 側で間引き済み）"""
+        with self.status.lock:
+            generation = self.status_data["imageGeneration"]
+            finished = generation["completed"] + generation["failed"]
+            remaining = max(0, generation["total"] - finished - len(progress["positions"]))
+            image_times = [
+                result["generation_time"] for result in generation["results"]
+                if result["success"] and not result.get("cached") and not result.get("skipped")
+            ]
+            generation["progress"] = dict(progress, sessionEta=session_eta(progress, remaining, image_times))
+            self.status.write_snapshot(self.status_data)
+    
+    def record_result(self, status_data, result, index, total):
+        """生成結果を状況データに記録して状況ファイルを更新"""
+        if result.get("interrupted"):
+            print(f"⏸️ 画像 {index}/{total} 中断（チェックポイント保存済み）")
+            return
+        
+        with self.status.lock:
+            status_data["imageGeneration"]["results"].append(result)
+            status_data["imageGeneration"].pop("progress", None)
             
-            return {
-                "success": True,
-                "output_path": output_path,
-                "filename": filename,
-                "generation_time": generation_time,
-                "position": prompt_data['position'],
-                "description": prompt_data['description']
-            }
+            if result["success"]:
+                status_data["imageGeneration"]["completed"] += 1
+            else:
+                status_data["imageGeneration"]["failed"] += 1
+        
+        if result["success"]:
+            print(f"✅ 画像 {index}/{total} 生成成功")
+        else:
+            print(f"❌ 画像 {index}/{total} 生成失敗")
+        
+        self.update_status(status_data, "image", dict(result, index=index, total=total))
+    
+    def run_batched_generation(self, image_prompts, status_data, index_offset=0):
+        """パラメータが同じプロンプトをまとめてバッチ生成（index_offset: 先に記録した既存画像の枚数）"""
+        total = status_data["imageGeneration"]["total"]
+        
+        for start in range(0, len(image_prompts), self.batch_size):
+            if self.interrupted:
+                break
+            chunk = image_prompts[start:start + self.batch_size]
+            positions = ", ".join(prompt_data['position'] for prompt_data in chunk)
+            print(f"\n📊 進捗: {index_offset + start + 1}-{index_offset + start + len(chunk)}/{total} - {positions}")
+            print(f"⚡ バッチ画像生成実行中... ({len(chunk)}枚)")
             
-        except Exception as e:
-            print(f"❌ 画像生成エラー ({prompt_data['position']}): {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "position": prompt_data['position']
+            requests = [self.build_generation_request(prompt_data) for prompt_data in chunk]
+            results = self.generator.generate_batch(requests, max_batch_size=self.batch_size)
+            if any(result.get("interrupted") for result in results):
+                self.interrupted = True
+            
+            for offset, result in enumerate(results):
+                if result["success"]:
+                    print(f"⏱️ {result['position']}: {result['generation_time']:.2f}秒/枚 (バッチ{result['batch_size']}枚 {result['batch_time']:.2f}秒)")
+                self.record_result(status_data, result, index_offset + start + offset + 1, total)
+    
+    def build_derivatives(self, status_data):
+        """生成画像の派生ファイル作成（失敗しても生成結果には影響させない）"""
+        print(f"\n🖼️ 派生ファイル作成中...")
+        try:
+            summary = process_sessions([self.output_base_dir])
+            status_data["imageGeneration"]["derivatives"] = {
+                "manifest": summary["manifests"][0] if summary["manifests"] else None,
+                "created": summary["created"],
+                "failed": summary["failed"]
             }
+            print(f"✅ 派生ファイル作成完了: {summary['created']}件")
+        except Exception as e:
+            print(f"⚠️ 派生ファイル作成エラー: {e}")
     
     def run_background_generation(self):
         """バックグラウンド画像生成メイン処理"""
@@ -157,55 +235,123 @@ class BackgroundImageGenerator:
         if not article_data:
             sys.exit(1)
         
+        # Stable Diffusion環境の準備（記事ファイルが有効な場合のみモデルをロード）
+        self.setup_stable_diffusion()
+        
         image_prompts = article_data['imagePrompts']
         
+        # 再開時は有効な画像がある位置を生成対象から外す
+        skipped = []
+        if self.resume:
+            pending = []
+            for prompt_data in image_prompts:
+                existing = find_existing_output(self.output_base_dir, prompt_data['position'])
+                if existing:
+                    skipped.append(self.skipped_result(prompt_data, existing))
+                else:
+                    pending.append(prompt_data)
+            image_prompts = pending
+        
         # 初期状況設定
         status_data = {
             "sessionId": self.session_id,
             "status": "generating",
             "imageGeneration": {
                 "startedAt": datetime.now().isoformat(),
-                "total": len(image_prompts),
+                "total": len(image_prompts) + len(skipped),
                 "completed": 0,
                 "failed": 0,
                 "results": []
-            },
-            "prompts": image_prompts
+            }
         }
+        self.status_data = status_data
         
-        self.update_status(status_data)
+        # ステップ進捗をスナップショットに反映（tqdm出力は抑制される）
+        if self.progress:
+            self.generator.set_progress_callback(self.publish_progress)
         
-        # 各画像プロンプトに対して生成実行
-        for i, prompt_data in enumerate(image_prompts, 1):
-            print(f"\n📊 進捗: {i}/{len(image_prompts)} - {prompt_data['position']}")
-            
-            # 画像生成実行
-            result = self.generate_image(prompt_data, self.output_base_dir)
-            
-            # 結果記録
-            status_data["imageGeneration"]["results"].append(result)
-            
-            if result["success"]:
-                status_data["imageGeneration"]["completed"] += 1
-                print(f"✅ 画像 {i}/{len(image_prompts)} 生成成功")
-            else:
-                status_data["imageGeneration"]["failed"] += 1
-                print(f"❌ 画像 {i}/{len(image_prompts)} 生成失敗")
-            
-            # 状況更新
-            self.update_status(status_data)
+        # プロンプト本文は記事JSONにあるため状況にはポジションのみ記録
+        self.update_status(status_data, "started", {
+            "total": status_data["imageGeneration"]["total"],
+            "positions": [prompt_data['position'] for prompt_data in image_prompts],
+            "resume": self.resume
+        })
+        
+        # 既存画像を 1..k、生成分を k+1.. として全体の枚数に対する連番で記録
+        total = status_data["imageGeneration"]["total"]
+        for i, result in enumerate(skipped, 1):
+            self.record_result(status_data, result, i, total)
+        
+        signal.signal(signal.SIGTERM, self.handle_sigterm)
+        
+        if self.batch_size > 1:
+            self.run_batched_generation(image_prompts, status_data, index_offset=len(skipped))
+        else:
+            # 各画像プロンプトに対して生成実行
+            for i, prompt_data in enumerate(image_prompts, len(skipped) + 1):
+                if self.interrupted:
+                    break
+                print(f"\n📊 進捗: {i}/{total} - {prompt_data['position']}")
+                
+                # 画像生成実行
+                result = self.generate_image(prompt_data, self.output_base_dir)
+                if result.get("interrupted"):
+                    self.interrupted = True
+                
+                # 結果記録・状況更新
+                self.record_result(status_data, result, i, total)
+        
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        
+        if self.progress:
+            self.generator.set_progress_callback(None)
+        
+        # 全画像の書き込み・検証が終わってから最終状況を確定
+        results = status_data["imageGeneration"]["results"]
+        failures = self.generator.flush()
+        if apply_write_failures(results, failures):
+            status_data["imageGeneration"]["completed"] = sum(1 for result in results if result["success"])
+            status_data["imageGeneration"]["failed"] = len(results) - status_data["imageGeneration"]["completed"]
+            self.update_status(status_data, "write_failed", {"failures": failures})
+        
+        # 全画像の完了後に届いたシグナルは中断として扱わない
+        generation = status_data["imageGeneration"]
+        if self.interrupted and generation["completed"] + generation["failed"] < generation["total"]:
+            return self.finish_interrupted(status_data)
+        
+        # レスポンシブ派生ファイル（WebP/AVIF・OGP・LQIP）とマニフェスト作成
+        if self.derivatives and status_data["imageGeneration"]["completed"] > 0:
+            self.build_derivatives(status_data)
         
         # 最終状況更新
         status_data["status"] = "completed" if status_data["imageGeneration"]["failed"] == 0 else "completed_with_errors"
         status_data["imageGeneration"]["completedAt"] = datetime.now().isoformat()
         
-        self.update_status(status_data)
+        cache_stats = self.generator.cache_stats()
+        if cache_stats:
+            status_data["imageGeneration"]["embeddingCache"] = cache_stats
+        stage_stats = self.generator.stage_stats()
+        if stage_stats:
+            status_data["imageGeneration"]["stages"] = stage_stats
+        
+        self.update_status(status_data, "completed", {
+            "status": status_data["status"],
+            "completed": status_data["imageGeneration"]["completed"],
+            "failed": status_data["imageGeneration"]["failed"]
+        })
         
         # 結果サマリー
         print(f"\n🎉 バックグラウンド画像生成完了")
         print(f"✅ 成功: {status_data['imageGeneration']['completed']} 枚")
         print(f"❌ 失敗: {status_data['imageGeneration']['failed']} 枚")
         print(f"📂 出力ディレクトリ: {self.output_base_dir}")
+        reused = sum(1 for result in status_data["imageGeneration"]["results"] if result.get("cached"))
+        if reused:
+            print(f"♻️ 生成済み画像を再利用: {reused} 枚")
+        if cache_stats:
+            print(f"🧠 埋め込みキャッシュ: ヒット {cache_stats['hits']} / ミス {cache_stats['misses']}")
+        if stage_stats:
+            print(f"⏱️ 段階別時間: {format_stages(stage_stats)}")
         
         if status_data["imageGeneration"]["failed"] == 0:
             print(f"🎯 次のステップ: Sanity画像統合実行可能")
@@ -213,25 +359,69 @@ class BackgroundImageGenerator:
             print(f"⚠️ 一部の画像生成が失敗しました。ログを確認してください。")
         
         return status_data
+    
+    def finish_interrupted(self, status_data):
+        """中断時の状況確定（派生ファイルは再開後にまとめて作成）"""
+        generation = status_data["imageGeneration"]
+        status_data["status"] = "interrupted"
+        generation["interruptedAt"] = datetime.now().isoformat()
+        generation.pop("progress", None)
+        
+        self.update_status(status_data, "interrupted", {
+            "completed": generation["completed"],
+            "failed": generation["failed"],
+            "remaining": generation["total"] - generation["completed"] - generation["failed"]
+        })
+        
+        print(f"\n⏸️ バックグラウンド画像生成を中断しました")
+        print(f"✅ 成功: {generation['completed']} 枚 / 残り: {generation['total'] - generation['completed'] - generation['failed']} 枚")
+        print(f"🔁 再開: --session-id {self.session_id} --resume")
+        return status_data
 
 def main():
     """メイン処理"""
     parser = argparse.ArgumentParser(description='ContentFlow V2 バックグラウンド画像生成')
     parser.add_argument('--session-id', required=True, help='セッション ID（記事ファイル名）')
     parser.add_argument('--output-dir', help='出力ディレクトリ（オプション）')
+    parser.add_argument('--no-server', action='store_true', help='常駐生成サーバーを使わずプロセス内でモデルをロード')
+    parser.add_argument('--batch-size', type=int, default=1, help='1回のパイプライン呼び出しでまとめて生成する最大枚数（デフォルト: 1=逐次）')
+    parser.add_argument('--force', action='store_true', help='同一入力の生成済み画像があっても再生成')
+    parser.add_argument('--no-derivatives', action='store_true', help='WebP/AVIF・OGP・LQIP派生ファイルを作成しない')
+    parser.add_argument('--no-progress', action='store_true', help='ステップ進捗を状況ファイルに出さず、tqdmの進捗バーをログに出力')
+    parser.add_argument('--resume', action='store_true', help='中断したセッションを再開（有効な画像がある位置はスキップ、途中の画像はチェックポイントから続行）')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_INTERVAL,
+                        help=f'途中経過を保存するステップ間隔（デフォルト: {CHECKPOINT_INTERVAL}、0でSIGTERM時のみ保存）')
+    
+    parser.add_argument('--memory-profile', choices=list(MEMORY_PROFILES),
+                        help=f'メモリプロファイル（デフォルト: {MEMORY_PROFILE}、記事の parameters.memory_profile が優先）')
+    parser.add_argument('--speed-profile', choices=list(SPEED_PROFILES),
+                        help=f'速度プロファイル（デフォルト: {SPEED_PROFILE}、記事の parameters.speed_profile が優先）')
     
     args = parser.parse_args()
     
     try:
         # バックグラウンド画像生成実行
-        generator = BackgroundImageGenerator(args.session_id)
+        generator = BackgroundImageGenerator(
+            args.session_id,
+            use_server=not args.no_server,
+            batch_size=args.batch_size,
+            force=args.force,
+            derivatives=not args.no_derivatives,
+            progress=not args.no_progress,
+            resume=args.resume,
+            checkpoint_every=args.checkpoint_every,
+            memory_profile=args.memory_profile,
+            speed_profile=args.speed_profile
+        )
         
         if args.output_dir:
             generator.output_base_dir = args.output_dir
         
         final_status = generator.run_background_generation()
         
-        # 成功時は0、失敗時は1で終了
+        # 中断時は2（KeyboardInterruptと同じ）、成功時は0、失敗時は1で終了
+        if final_status["status"] == "interrupted":
+            sys.exit(2)
         exit_code = 0 if final_status["imageGeneration"]["failed"] == 0 else 1
         sys.exit(exit_code)
         
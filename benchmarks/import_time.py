@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+CLI起動時間（import時間）のベンチマーク
+--help・設定ファイルのエラーなど、モデルを使わずに終わる経路が torch / diffusers を import せず、
+起動時間の予算内に終わることを確認する。違反があれば終了コード1（CIのガードとして使える）
+
+Usage:
+    python benchmarks/import_time.py                  # 全ケース（各5回の中央値）
+    python benchmarks/import_time.py --budget 0.5 --runs 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+
+# モデルを使わない経路で import してはいけないモジュール
+HEAVY_MODULES = ("torch", "diffusers", "transformers", "accelerate", "safetensors", "numpy")
+
+# 起動時間の予算（秒、中央値）
+DEFAULT_BUDGET = 1.0
+
+AUTO_SD = "scripts/auto-sd-generator.py"
+
+
+def build_cases(work_dir: str) -> Dict[str, List[str]]:
+    """ケース名 → python に渡す引数（設定エラー用のファイルは work_dir に作成）"""
+    invalid_json = os.path.join(work_dir, "invalid.json")
+    with open(invalid_json, 'w', encoding='utf-8') as f:
+        f.write('{"prompts": [')
+    invalid_schema = os.path.join(work_dir, "invalid-schema.json")
+    with open(invalid_schema, 'w', encoding='utf-8') as f:
+        json.dump({"prompts": [{"name": "hero", "prompt": "desk"}], "article_info": {}}, f)
+    output = os.path.join(work_dir, "output")
+
+    return {
+        "import contentflow_sd": ["-c", "import contentflow_sd"],
+        "auto-sd --help": [AUTO_SD, "--help"],
+        "auto-sd 設定ファイルなし": [AUTO_SD, "--config", os.path.join(work_dir, "missing.json"), "--output", output],
+        "auto-sd JSON不正": [AUTO_SD, "--config", invalid_json, "--output", output],
+        "auto-sd 検証エラー": [AUTO_SD, "--config", invalid_schema, "--output", output],
+        "background --help": ["background-image-generator.py", "--help"],
+        "scheduler --help": ["-m", "contentflow_sd.scheduler", "--help"],
+        "server --help": ["-m", "contentflow_sd.server", "--help"],
+        "job_worker --help": ["-m", "contentflow_sd.job_worker", "--help"],
+        "worker_pool --help": ["-m", "contentflow_sd.worker_pool", "--help"],
+        "perf_store --help": ["-m", "contentflow_sd.perf_store", "--help"]
+    }
+
+
+def heavy_imports(args: List[str]) -> List[str]:
+    """-X importtime の出力から import された重いモジュール（トップレベル）を抽出"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=PROJECT_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imported = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        module = line.rsplit("|", 1)[-1].strip()
+        if module in HEAVY_MODULES:
+            imported.add(module)
+    return sorted(imported)
+
+
+def measure_case(args: List[str], runs: int) -> Dict[str, Any]:
+    """ケースを runs 回実行した壁時計時間（バイトコードキャッシュ作成のため1回目は計測しない）"""
+    subprocess.run([sys.executable, *args], cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    timings = []
+    exit_code = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, *args], cwd=PROJECT_ROOT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+        exit_code = completed.returncode
+    return {
+        "medianSeconds": round(statistics.median(timings), 3),
+        "maxSeconds": round(max(timings), 3),
+        "exitCode": exit_code,
+        "heavyImports": heavy_imports(args)
+    }
+
+
+def baseline(runs: int) -> float:
+    """インタープリター自体の起動時間（中央値）"""
+    return measure_case(["-c", "pass"], runs)["medianSeconds"]
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='CLI起動時間（import時間）のベンチマーク')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help=f'起動時間の予算（秒、中央値、デフォルト: {DEFAULT_BUDGET}）')
+    parser.add_argument('--runs', type=int, default=5, help='ケースごとの実行回数（デフォルト: 5）')
+    parser.add_argument('--cases', help='実行するケース（カンマ区切り、デフォルト: 全ケース）')
+    parser.add_argument('--no-save', action='store_true', help='結果JSONを保存しない')
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import-time-") as work_dir:
+        cases = build_cases(work_dir)
+        if args.cases:
+            names = [name.strip() for name in args.cases.split(",")]
+            unknown = [name for name in names if name not in cases]
+            if unknown:
+                parser.error(f"不明なケース: {', '.join(unknown)}（{', '.join(cases)}）")
+            cases = {name: cases[name] for name in names}
+
+        interpreter = baseline(args.runs)
+        print(f"⏱️ CLI起動時間: 予算 {args.budget}秒 / 各{args.runs}回 / インタープリター起動 {interpreter}秒")
+
+        results = {}
+        violations = []
+        for name, case_args in cases.items():
+            result = measure_case(case_args, args.runs)
+            results[name] = result
+            if result["heavyImports"]:
+                violations.append(f"{name}: {', '.join(result['heavyImports'])} を import")
+            if result["medianSeconds"] > args.budget:
+                violations.append(f"{name}: {result['medianSeconds']}秒（予算 {args.budget}秒）")
+
+    print("\n| ケース | 中央値 (秒) | 最大 (秒) | 終了コード | 重いimport |")
+    print("|---|---:|---:|---:|---|")
+    for name, result in results.items():
+        print(f"| {name} | {result['medianSeconds']} | {result['maxSeconds']} | {result['exitCode']} "
+              f"| {', '.join(result['heavyImports']) or 'なし'} |")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"import-time-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "measuredAt": datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "budgetSeconds": args.budget,
+                "interpreterSeconds": interpreter,
+                "cases": results,
+                "violations": violations
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 結果保存: {output}")
+
+    if violations:
+        print("\n❌ 起動時間の予算違反:")
+        for violation in violations:
+            print(f"  - {violation}")
+        sys.exit(1)
+    print("\n✅ 全ケースが予算内（重いモジュールの import なし）")
+
+
+if __name__ == "__main__":
+    main()
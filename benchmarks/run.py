@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+画像生成スタックのベンチマーク
+BackgroundImageGenerator（background-image-generator.py）と ContentFlowSDGenerator（scripts/auto-sd-generator.py）の
+逐次・バッチ・バリエーション経路と、CPUワーカープール（contentflow_sd.worker_pool）の並列生成を、
+シナリオごとに別プロセスで実行して計測する
+
+Usage:
+    python benchmarks/run.py                                  # 極小モデル（CPU、数十秒）で全シナリオ
+    python benchmarks/run.py --backend real                   # 設定済みの実モデル
+    python benchmarks/run.py --scenarios auto-batch,background
+    python benchmarks/run.py --scenarios pool                 # ワーカープールと単一プロセスの画像/時
+    python benchmarks/run.py --compare benchmarks/results/前回.json
+
+バックエンド:
+    tiny  ランダム初期化の極小SDXL。パイプライン以外のオーバーヘッド（状況書き込み・保存・プロンプト処理）を見る
+    real  settings.MODEL_PATH の実モデル（デバイス・精度も settings のまま）
+
+計測項目: モデルロード時間、段階別時間（メインスレッドの排他時間）、s/it、画像/時、ピークRSS。
+結果は benchmarks/results/<日時>-<コミット>-<バックエンド>.json に保存する（--compare で前回と比較）。
+作業ディレクトリは一時ディレクトリのため、キャッシュは毎回コールド状態から始まる。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import functools
+import subprocess
+import importlib.util
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+
+# 極小モデルのパラメータ（実モデルは各スクリプトの既定値を使う）
+TINY_PARAMETERS = {"width": 256, "height": 144, "num_inference_steps": 10, "guidance_scale": 7.5}
+
+# ワーカープールのシナリオ（実モデルは CPU 実行で1024x576・20ステップ、合計スレッド数は単一プロセスと同じ）
+POOL_WORKERS = 2
+POOL_IMAGES = 4
+POOL_REAL_PARAMETERS = {"width": 1024, "height": 576, "num_inference_steps": 20}
+
+# バックグラウンドスレッドで実行される段階（メインスレッドの時間とは重なる）
+BACKGROUND_STAGES = ("save",)
+
+SCENARIOS = {
+    "background": "BackgroundImageGenerator 逐次（状況ファイル・ステップ進捗・派生ファイル込み）",
+    "background-batch": "BackgroundImageGenerator --batch-size 3",
+    "auto-sequential": "ContentFlowSDGenerator 逐次（3シーン×1）",
+    "auto-batch": "ContentFlowSDGenerator --batch-size 4（3シーン×2バリエーション）",
+    "auto-variations": "ContentFlowSDGenerator 逐次（2シーン×3バリエーション）",
+    "pool": f"WorkerPool {POOL_WORKERS}プロセス vs 単一プロセス（同じ合計スレッド数、{POOL_IMAGES}枚ずつ）"
+}
+
+ARTICLE_PROMPTS = [
+    ("header", "modern minimalist workspace with laptop, natural morning light"),
+    ("section1", "cozy reading corner with bookshelves, warm afternoon light"),
+    ("section2", "calm seaside landscape at dusk, soft gradient sky")
+]
+
+
+class StageTimer:
+    """関数呼び出しを段階ごとに計測（入れ子の場合は内側の段階にだけ時間を計上する排他時間）"""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.iterations = 0
+        self.image_iterations = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self.local.__dict__.setdefault("stack", [])
+        now = time.perf_counter()
+        if stack:
+            self._add(stack[-1][0], now - stack[-1][1], count=False)
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            stage_name, started = stack.pop()
+            self._add(stage_name, now - started, count=True)
+            if stack:
+                stack[-1][1] = now
+
+    def _add(self, name: str, seconds: float, count: bool) -> None:
+        with self.lock:
+            self.totals[name] += seconds
+            if count:
+                self.counts[name] += 1
+
+    def wrap(self, owner, attribute: str, name: str) -> None:
+        """owner.attribute を計測付きの関数に置き換え"""
+        original = getattr(owner, attribute)
+        timer = self
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            with timer.stage(name):
+                return original(*args, **kwargs)
+
+        setattr(owner, attribute, wrapper)
+
+    def wrap_pipeline(self, pipeline_class) -> None:
+        """パイプライン呼び出しを計測し、実行したデノイズステップ数（s/it の分母）を数える"""
+        original = pipeline_class.__call__
+        timer = self
+
+        @functools.wraps(original)
+        def wrapper(pipe, *args, **kwargs):
+            with timer.stage("pipeline"):
+                output = original(pipe, *args, **kwargs)
+            steps = getattr(pipe, "num_timesteps", 0) or 0
+            with timer.lock:
+                timer.iterations += steps
+                timer.image_iterations += steps * len(output.images)
+            return output
+
+        pipeline_class.__call__ = wrapper
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        """段階別の時間（メインスレッドの未計上分は other）"""
+        stages = {
+            name: {"seconds": round(seconds, 3), "calls": self.counts[name]}
+            for name, seconds in sorted(self.totals.items())
+        }
+        main_thread = sum(seconds for name, seconds in self.totals.items() if name not in BACKGROUND_STAGES)
+        stages["other"] = {"seconds": round(max(0.0, wall - main_thread), 3), "calls": None}
+        return stages
+
+
+def load_script(name: str, path: Path):
+    """ハイフン入りファイル名のスクリプトをモジュールとして読み込み"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb() -> float:
+    """プロセスのピークRSS（MB）"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def instrument(timer: StageTimer, background_module=None) -> None:
+    """計測対象の関数を差し替え"""
+    from diffusers import StableDiffusionXLPipeline, StableDiffusionXLImg2ImgPipeline
+    from contentflow_sd.generator import LocalGenerator
+    from contentflow_sd.embedding_cache import PromptEmbeddingCache
+    from contentflow_sd.writer import ImageWriter
+    from contentflow_sd.status import StatusLog
+
+    timer.wrap_pipeline(StableDiffusionXLPipeline)
+    timer.wrap_pipeline(StableDiffusionXLImg2ImgPipeline)
+    timer.wrap(PromptEmbeddingCache, "pipeline_kwargs", "prompt_encoding")
+    timer.wrap(LocalGenerator, "lookup_cached", "result_cache_lookup")
+    timer.wrap(LocalGenerator, "flush", "write_wait")
+    timer.wrap(ImageWriter, "submit", "write_submit")
+    timer.wrap(ImageWriter, "_write", "save")
+    timer.wrap(StatusLog, "emit", "status")
+    timer.wrap(StatusLog, "write_snapshot", "status")
+
+    if background_module is not None:
+        timer.wrap(background_module.BackgroundImageGenerator, "build_derivatives", "derivatives")
+
+
+def write_article(path: str, parameters: Optional[Dict[str, Any]]) -> None:
+    """BackgroundImageGenerator 用の記事JSON"""
+    prompts = []
+    for position, prompt in ARTICLE_PROMPTS:
+        prompt_data = {
+            "position": position,
+            "prompt": prompt,
+            "style": "photorealistic, soft colors",
+            "negativePrompt": "text, watermark",
+            "description": position
+        }
+        if parameters:
+            prompt_data["parameters"] = dict(parameters)
+        prompts.append(prompt_data)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"article": {"title": "benchmark"}, "imagePrompts": prompts}, f, ensure_ascii=False)
+
+
+def write_prompt_config(path: str, scenes: int) -> None:
+    """ContentFlowSDGenerator 用のプロンプト設定"""
+    config = {
+        "prompts": [
+            {
+                "name": position,
+                "prompt": f"{prompt}, photorealistic, soft colors",
+                "negative_prompt": "text, watermark",
+                "filename_prefix": f"bench-{position}",
+                "description": position
+            }
+            for position, prompt in ARTICLE_PROMPTS[:scenes]
+        ],
+        "article_info": {"title": "benchmark", "style": "photorealistic", "estimated_scenes": scenes}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+
+
+def run_pool_scenario(backend: str, model_path: str) -> Dict[str, Any]:
+    """ワーカープールと単一プロセス（同じ合計スレッド数）の画像/時を比較（一時ディレクトリを作業ディレクトリにする）"""
+    from contentflow_sd.worker_pool import run_benchmark
+
+    threads = max(1, (os.cpu_count() or 1) // POOL_WORKERS)
+    parameters = dict(TINY_PARAMETERS) if backend == "tiny" else dict(POOL_REAL_PARAMETERS)
+
+    work_dir = tempfile.mkdtemp(prefix="sd-bench-pool-")
+    os.chdir(work_dir)
+
+    try:
+        started = time.perf_counter()
+        report = run_benchmark(model_path, POOL_WORKERS, threads, POOL_IMAGES, parameters)
+        wall = time.perf_counter() - started
+
+        return {
+            "description": SCENARIOS["pool"],
+            "images": report["pool"]["succeeded"],
+            "failed": POOL_IMAGES - report["pool"]["succeeded"],
+            "workers": POOL_WORKERS,
+            "threadsPerWorker": threads,
+            "wallSeconds": round(wall, 3),
+            "imagesPerHour": report["pool"]["imagesPerHour"],
+            "poolSeconds": report["pool"]["seconds"],
+            "singleImagesPerHour": report["single"]["imagesPerHour"],
+            "singleSeconds": report["single"]["seconds"],
+            "speedup": report["speedup"],
+            "workerMemory": report["pool"]["memory"]["workers"],
+            "peakRssMB": peak_rss_mb()
+        }
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_scenario(scenario: str, backend: str, model_path: str) -> Dict[str, Any]:
+    """1シナリオを現在のプロセスで実行して計測（一時ディレクトリを作業ディレクトリにする）"""
+    import torch
+
+    if scenario == "pool":
+        return run_pool_scenario(backend, model_path)
+    from contentflow_sd.generator import LocalGenerator
+
+    background_module = load_script("background_image_generator", PROJECT_ROOT / "background-image-generator.py")
+    auto_module = load_script("auto_sd_generator", PROJECT_ROOT / "scripts" / "auto-sd-generator.py")
+
+    timer = StageTimer()
+    instrument(timer, background_module)
+
+    work_dir = tempfile.mkdtemp(prefix=f"sd-bench-{scenario}-")
+    os.chdir(work_dir)
+
+    try:
+        load_started = time.perf_counter()
+        if backend == "tiny":
+            generator = LocalGenerator.from_model(model_path, torch_dtype=torch.float32, device="cpu")
+        else:
+            generator = LocalGenerator.from_model(model_path)
+        load_time = time.perf_counter() - load_started
+        rss_after_load = peak_rss_mb()
+
+        # 各スクリプトのモデルロードをロード済みジェネレーターに置き換え
+        background_module.get_generator = lambda *args, **kwargs: generator
+        auto_module.get_generator = lambda *args, **kwargs: generator
+        parameters = dict(TINY_PARAMETERS) if backend == "tiny" else None
+
+        started = time.perf_counter()
+        if scenario.startswith("background"):
+            write_article(os.path.join("articles", "new-article.json"), parameters)
+            runner = background_module.BackgroundImageGenerator(
+                "benchmark", use_server=False, batch_size=3 if scenario == "background-batch" else 1, force=True
+            )
+            status = runner.run_background_generation()
+            results = status["imageGeneration"]["results"]
+        else:
+            batch_size, scenes, variations = {
+                "auto-sequential": (1, 3, 1),
+                "auto-batch": (4, 3, 2),
+                "auto-variations": (1, 2, 3)
+            }[scenario]
+            write_prompt_config("prompts.json", scenes)
+            runner = auto_module.ContentFlowSDGenerator(
+                model_path=model_path, use_server=False, batch_size=batch_size, force=True
+            )
+            if parameters:
+                runner.settings = dict(runner.settings, torch_dtype=torch.float32, device="cpu", **parameters)
+            output = runner.generate_batch_images("prompts.json", "output", variations)
+            if not output["success"]:
+                raise RuntimeError(output.get("error"))
+            results = [{"success": True} for files in output["generated_files"].values() for _ in files]
+            results += [{"success": False}] * output["stats"]["failed_generations"]
+        wall = time.perf_counter() - started
+
+        generator.flush()
+        images = sum(1 for result in results if result["success"])
+        pipeline_time = timer.totals.get("pipeline", 0.0)
+
+        return {
+            "description": SCENARIOS[scenario],
+            "images": images,
+            "failed": len(results) - images,
+            "modelLoadSeconds": round(load_time, 3),
+            "wallSeconds": round(wall, 3),
+            "imagesPerHour": round(images * 3600 / wall, 1) if wall > 0 else None,
+            "secondsPerImage": round(wall / images, 3) if images else None,
+            "secondsPerIteration": round(pipeline_time / timer.iterations, 4) if timer.iterations else None,
+            "secondsPerImageStep": round(pipeline_time / timer.image_iterations, 4) if timer.image_iterations else None,
+            "stages": timer.report(wall),
+            "peakRssMB": peak_rss_mb(),
+            "rssAfterLoadMB": rss_after_load
+        }
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def git_revision() -> Dict[str, Any]:
+    """計測したコミット"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": None}
+
+
+def machine_info() -> Dict[str, Any]:
+    """計測環境"""
+    info = {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpuCount": os.cpu_count()
+    }
+    try:
+        import torch
+        import diffusers
+
+        info["torch"] = torch.__version__
+        info["diffusers"] = diffusers.__version__
+        info["torchThreads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def run_child(scenario: str, backend: str, model_path: str, verbose: bool) -> Dict[str, Any]:
+    """シナリオを別プロセスで実行（モデルロード時間とピークRSSをシナリオごとに独立させる）"""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+
+    command = [sys.executable, __file__, "--child", scenario, "--backend", backend,
+               "--model-path", model_path, "--child-output", result_path]
+    try:
+        completed = subprocess.run(
+            command,
+            cwd=PROJECT_ROOT,
+            stdout=None if verbose else subprocess.PIPE,
+            stderr=None if verbose else subprocess.STDOUT,
+            text=True
+        )
+        if completed.returncode != 0:
+            tail = (completed.stdout or "").strip().splitlines()[-10:]
+            return {"description": SCENARIOS[scenario], "error": f"exit {completed.returncode}", "log": tail}
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def compare(current: Dict[str, Any], previous_path: str) -> None:
+    """前回の結果との比較表示"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+
+    print(f"\n🔍 比較: {previous.get('git', {}).get('commit')} → {current['git']['commit']}")
+    for scenario, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(scenario)
+        if not before or "error" in result or "error" in before:
+            continue
+        change = (result["imagesPerHour"] / before["imagesPerHour"] - 1) * 100 if before.get("imagesPerHour") else 0
+        print(f"  {scenario:18s} {before['imagesPerHour']:>10} → {result['imagesPerHour']:>10} 枚/時 ({change:+.1f}%)"
+              f"  RSS {before['peakRssMB']} → {result['peakRssMB']}MB")
+
+
+def main():
+    """メイン処理"""
+    from contentflow_sd.settings import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description='画像生成スタックのベンチマーク')
+    parser.add_argument('--backend', choices=['tiny', 'real'], default='tiny', help='tiny=極小ランダムモデル（デフォルト）/ real=設定済みモデル')
+    parser.add_argument('--scenarios', help=f'実行するシナリオ（カンマ区切り、デフォルト: 全部 = {",".join(SCENARIOS)}）')
+    parser.add_argument('--model-path', help='real バックエンドのモデルディレクトリ（デフォルト: settings.MODEL_PATH）')
+    parser.add_argument('--output', help='結果JSONの保存先（デフォルト: benchmarks/results/<日時>-<コミット>-<バックエンド>.json）')
+    parser.add_argument('--compare', help='比較する前回の結果JSON')
+    parser.add_argument('--verbose', action='store_true', help='各シナリオの生成ログを表示')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_scenario(args.child, args.backend, args.model_path)
+        with open(args.child_output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(",")] if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"不明なシナリオ: {', '.join(unknown)}")
+
+    if args.backend == "tiny":
+        from benchmarks.tiny_model import build_tiny_model
+
+        model_path = os.path.abspath(build_tiny_model(str(PROJECT_ROOT / ".cache" / "benchmarks" / "tiny-sdxl")))
+    else:
+        model_path = os.path.abspath(args.model_path or MODEL_PATH)
+        if not os.path.exists(model_path):
+            print(f"❌ モデルが見つかりません: {model_path}")
+            sys.exit(1)
+
+    report = {
+        "backend": args.backend,
+        "modelPath": model_path,
+        "startedAt": datetime.now().isoformat(),
+        "git": git_revision(),
+        "machine": machine_info(),
+        "parameters": TINY_PARAMETERS if args.backend == "tiny" else "script defaults",
+        "scenarios": {}
+    }
+
+    print(f"⏱️ ベンチマーク開始: {args.backend} バックエンド / {len(scenarios)}シナリオ")
+    for scenario in scenarios:
+        print(f"\n▶️ {scenario}: {SCENARIOS[scenario]}")
+        result = run_child(scenario, args.backend, model_path, args.verbose)
+        report["scenarios"][scenario] = result
+
+        if "error" in result:
+            print(f"❌ 失敗: {result['error']}")
+            for line in result.get("log", []):
+                print(f"    {line}")
+            continue
+
+        if scenario == "pool":
+            memory = ", ".join(f"PSS {worker['pssMB']}MB" for worker in result["workerMemory"] if worker)
+            print(f"  プール {result['workers']}×{result['threadsPerWorker']}スレッド: {result['imagesPerHour']} 枚/時"
+                  f" ({result['poolSeconds']}秒) / 単一プロセス: {result['singleImagesPerHour']} 枚/時"
+                  f" ({result['singleSeconds']}秒) / 速度比 {result['speedup']}倍" + (f" / ワーカー {memory}" if memory else ""))
+            continue
+
+        print(f"  ロード {result['modelLoadSeconds']}秒 / 実行 {result['wallSeconds']}秒 / {result['images']}枚"
+              f" / {result['imagesPerHour']} 枚/時 / {result['secondsPerIteration']} s/it / ピークRSS {result['peakRssMB']}MB")
+        stages = sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"])
+        print("  " + " / ".join(f"{name} {stage['seconds']:.2f}秒" for name, stage in stages if stage["seconds"] >= 0.005))
+
+    report["finishedAt"] = datetime.now().isoformat()
+
+    output = args.output
+    if not output:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = str(RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{report['git']['commit']}-{args.backend}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 結果保存: {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    if any("error" in result for result in report["scenarios"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+ベンチマーク用の極小SDXLパイプライン（ランダム初期化）
+CPUで1枚数秒以内に生成でき、パイプライン以外の処理（状況ファイル書き込み・保存・プロンプト処理）の
+オーバーヘッドを計測するために使う。画像の内容には意味がない。
+"""
+
+import os
+import json
+import tempfile
+
+TINY_MODEL_DIR = ".cache/benchmarks/tiny-sdxl"
+TOKENIZER_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789,.-:"
+
+
+def build_tiny_model(path: str = TINY_MODEL_DIR) -> str:
+    """極小SDXLパイプラインを作成して保存（作成済みならそのパスを返す）"""
+    if os.path.exists(os.path.join(path, "model_index.json")):
+        return path
+
+    import torch
+    from diffusers import StableDiffusionXLPipeline, UNet2DConditionModel, AutoencoderKL, EulerDiscreteScheduler
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTextModelWithProjection, CLIPTokenizer
+
+    print(f"🧪 ベンチマーク用極小モデル作成: {path}")
+    torch.manual_seed(0)
+
+    unet = UNet2DConditionModel(
+        block_out_channels=(32, 64),
+        layers_per_block=1,
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        attention_head_dim=(2, 4),
+        use_linear_projection=True,
+        addition_embed_type="text_time",
+        addition_time_embed_dim=8,
+        transformer_layers_per_block=(1, 1),
+        projection_class_embeddings_input_dim=80,
+        cross_attention_dim=64,
+        norm_num_groups=16
+    )
+    vae = AutoencoderKL(
+        block_out_channels=[16, 32],
+        in_channels=3,
+        out_channels=3,
+        down_block_types=["DownEncoderBlock2D", "DownEncoderBlock2D"],
+        up_block_types=["UpDecoderBlock2D", "UpDecoderBlock2D"],
+        latent_channels=4,
+        norm_num_groups=16,
+        sample_size=64
+    )
+    scheduler = EulerDiscreteScheduler(
+        beta_start=0.00085,
+        beta_end=0.012,
+        beta_schedule="scaled_linear",
+        steps_offset=1,
+        timestep_spacing="leading"
+    )
+    text_config = CLIPTextConfig(
+        bos_token_id=0,
+        eos_token_id=2,
+        hidden_size=32,
+        intermediate_size=37,
+        layer_norm_eps=1e-05,
+        num_attention_heads=4,
+        num_hidden_layers=2,
+        pad_token_id=1,
+        vocab_size=1000,
+        hidden_act="gelu",
+        projection_dim=32
+    )
+
+    # 文字単位の最小語彙（実モデルのトークナイザーは不要）
+    vocab = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+    for char in TOKENIZER_CHARS:
+        vocab[char] = len(vocab)
+        vocab[f"{char}</w>"] = len(vocab)
+
+    with tempfile.TemporaryDirectory() as tokenizer_dir:
+        vocab_file = os.path.join(tokenizer_dir, "vocab.json")
+        merges_file = os.path.join(tokenizer_dir, "merges.txt")
+        with open(vocab_file, 'w', encoding='utf-8') as f:
+            json.dump(vocab, f)
+        with open(merges_file, 'w', encoding='utf-8') as f:
+            f.write("#version: 0.2\n")
+        tokenizer = CLIPTokenizer(vocab_file, merges_file, model_max_length=77)
+
+        pipe = StableDiffusionXLPipeline(
+            vae=vae,
+            text_encoder=CLIPTextModel(text_config),
+            text_encoder_2=CLIPTextModelWithProjection(text_config),
+            tokenizer=tokenizer,
+            tokenizer_2=tokenizer,
+            unet=unet,
+            scheduler=scheduler
+        )
+        # 実モデルと同じ .bin 形式で保存
+        pipe.save_pretrained(path, safe_serialization=False)
+
+    # transformers 5 はテキストエンコーダーを常に safetensors で保存するため .bin に変換
+    from safetensors.torch import load_file
+
+    for name in ("text_encoder", "text_encoder_2"):
+        safetensors_path = os.path.join(path, name, "model.safetensors")
+        if os.path.exists(safetensors_path):
+            torch.save(load_file(safetensors_path), os.path.join(path, name, "pytorch_model.bin"))
+            os.remove(safetensors_path)
+
+    return path
@@ -0,0 +1,39 @@
+"""
+ContentFlow Stable Diffusion 共通モジュール
+各生成スクリプト・常駐サーバーから共有されるパイプライン生成・画像生成処理
+generator・client は初回アクセス時に読み込む（python -m contentflow_sd.metrics 等の実行時に
+パッケージ経由で同じモジュールが二重に読み込まれないようにするため）
+"""
+
+import importlib
+
+from .settings import MODEL_PATH, OUTPUT_BASE_DIR, DEFAULT_PARAMETERS, HUMAN_PREVENTION_PROMPT
+
+_LAZY_EXPORTS = {
+    "LocalGenerator": "generator",
+    "build_request": "generator",
+    "derive_seed": "generator",
+    "RemoteGenerator": "client",
+    "get_generator": "client",
+}
+
+__all__ = [
+    "MODEL_PATH",
+    "OUTPUT_BASE_DIR",
+    "DEFAULT_PARAMETERS",
+    "HUMAN_PREVENTION_PROMPT",
+    "LocalGenerator",
+    "RemoteGenerator",
+    "build_request",
+    "derive_seed",
+    "get_generator",
+]
+
+
+def __getattr__(name):
+    """generator・client のエクスポートを初回アクセス時に読み込む"""
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
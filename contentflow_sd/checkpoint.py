@@ -0,0 +1,127 @@
+"""
+生成途中チェックポイント
+N ステップごと（および中断要求時）に、途中の潜在変数・スケジューラー位置・乱数生成器の状態を
+出力ディレクトリの .checkpoints/ に保存し、再開時は img2img の denoising_start で残りのステップだけを実行する
+
+チェックポイントは生成入力のキャッシュキーで識別するため、プロンプトやパラメータが変わったものは使われない。
+1次のスケジューラー（Euler等）では中断しなかった場合と同じ画像になる。マルチステップ系（DPM++ 2M等）は
+履歴を引き継がないため、再開直後のステップのみ1次で計算される。
+"""
+
+import os
+import json
+from typing import Dict, Any, List, Optional, Callable
+
+from .settings import CHECKPOINT_DIR_NAME
+
+CHECKPOINT_VERSION = 1
+
+
+class GenerationInterrupted(Exception):
+    """中断要求によりチェックポイントを保存して生成を停止した"""
+
+
+def checkpoint_path(request: Dict[str, Any]) -> str:
+    """リクエストのチェックポイントファイルパス"""
+    name = request.get("filename_prefix") or request["position"]
+    if request.get("variation") is not None:
+        name = f"{name}-{request['variation']:03d}"
+    return os.path.join(request["output_dir"], CHECKPOINT_DIR_NAME, f"{name}.pt")
+
+
+def save_checkpoint(path: str, data: Dict[str, Any]) -> None:
+    """チェックポイントを一時ファイル経由で保存"""
+    import torch
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(data, temp_path)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(request: Dict[str, Any], key: str, scheduler) -> Optional[Dict[str, Any]]:
+    """再開可能なチェックポイント（入力・スケジューラーが一致するもののみ）"""
+    import torch
+
+    path = checkpoint_path(request)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+    except Exception as e:
+        print(f"⚠️ チェックポイント読み込みエラー（最初から生成します）: {e}")
+        return None
+
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("key") != key:
+        print(f"⚠️ 生成入力が変わったためチェックポイントを使いません ({request['position']})")
+        return None
+    if checkpoint.get("scheduler") != type(scheduler).__name__ or \
+            checkpoint.get("scheduler_config") != json.dumps(dict(scheduler.config), sort_keys=True, default=str):
+        print(f"⚠️ スケジューラーが変わったためチェックポイントを使いません ({request['position']})")
+        return None
+
+    return checkpoint
+
+
+def remove_checkpoint(request: Dict[str, Any]) -> None:
+    """完了した画像のチェックポイント削除"""
+    path = checkpoint_path(request)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def denoising_start(checkpoint: Dict[str, Any], scheduler) -> float:
+    """チェックポイント直後のタイムステップから再開する denoising_start
+
+    最後に完了したタイムステップを境界にすることで、ステップ数が1000を割り切らない場合も
+    残りのタイムステップ列が中断前と完全に一致する。
+    """
+    return 1.0 - checkpoint["timestep"] / scheduler.config.num_train_timesteps
+
+
+class StepCheckpointer:
+    """callback_on_step_end で定期保存・中断要求時の保存と停止を行う（every=None なら保存せず停止のみ）"""
+
+    def __init__(self, requests: List[Dict[str, Any]], keys: List[str], generators: List[Any],
+                 every: Optional[int], total_steps: int, should_stop: Callable[[], bool], start_step: int = 0):
+        self.requests = requests
+        self.keys = keys
+        self.generators = generators
+        self.every = every
+        self.total_steps = total_steps
+        self.should_stop = should_stop
+        self.start_step = start_step
+
+    def on_step_end(self, pipe, step_index: int, timestep, callback_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """diffusers の callback_on_step_end"""
+        step = self.start_step + step_index + 1
+
+        if self.should_stop():
+            if self.every is not None and step < self.total_steps:
+                self.save(pipe, step, timestep, callback_kwargs["latents"])
+            raise GenerationInterrupted(f"ステップ {step}/{self.total_steps} で中断")
+
+        if self.every and step % self.every == 0 and step < self.total_steps:
+            self.save(pipe, step, timestep, callback_kwargs["latents"])
+        return callback_kwargs
+
+    def save(self, pipe, step: int, timestep, latents) -> None:
+        """バッチ内の画像ごとにチェックポイントを保存"""
+        scheduler_config = json.dumps(dict(pipe.scheduler.config), sort_keys=True, default=str)
+        for index, (request, key, generator) in enumerate(zip(self.requests, self.keys, self.generators)):
+            try:
+                save_checkpoint(checkpoint_path(request), {
+                    "version": CHECKPOINT_VERSION,
+                    "key": key,
+                    "position": request["position"],
+                    "step": step,
+                    "total_steps": self.total_steps,
+                    "timestep": float(timestep),
+                    "latents": latents[index:index + 1].detach().to("cpu").clone(),
+                    "generator_state": generator.get_state(),
+                    "scheduler": type(pipe.scheduler).__name__,
+                    "scheduler_config": scheduler_config
+                })
+            except Exception as e:
+                print(f"⚠️ チェックポイント保存エラー ({request['position']}): {e}")
@@ -0,0 +1,170 @@
+"""
+常駐生成サーバー用クライアント
+サーバーが起動していればHTTP経由で生成し、なければプロセス内でモデルをロードする
+"""
+
+import os
+import json
+import threading
+import urllib.request
+import urllib.error
+from typing import Dict, Any, List, Optional
+
+from .settings import MODEL_PATH, DEVICE, SERVER_HOST, SERVER_PORT, PROGRESS_MIN_INTERVAL
+from .generator import LocalGenerator
+from .progress import ProgressCallback
+
+
+def server_url(host: str = SERVER_HOST, port: int = SERVER_PORT) -> str:
+    """常駐サーバーのベースURL"""
+    return f"http://{host}:{port}"
+
+
+class RemoteGenerator:
+    """常駐生成サーバーへのシンクライアント（LocalGeneratorと同じインターフェース）"""
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or server_url()
+        self.progress_callback: Optional[ProgressCallback] = None
+
+    def set_progress_callback(self, callback: Optional[ProgressCallback]) -> None:
+        """デノイズステップ進捗の通知先を設定（生成中はサーバーの /progress をポーリング）"""
+        self.progress_callback = callback
+
+    def _poll_progress(self, done: threading.Event) -> None:
+        last = None
+        while not done.wait(PROGRESS_MIN_INTERVAL):
+            try:
+                with urllib.request.urlopen(f"{self.base_url}/progress", timeout=1.0) as response:
+                    progress = json.loads(response.read().decode('utf-8')).get("progress")
+            except (urllib.error.URLError, OSError, ValueError):
+                continue
+            if progress and progress != last:
+                last = progress
+                try:
+                    self.progress_callback(progress)
+                except Exception as e:
+                    print(f"⚠️ 進捗通知エラー: {e}")
+
+    def health(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        """サーバー状態取得（未起動ならNone）"""
+        try:
+            with urllib.request.urlopen(f"{self.base_url}/health", timeout=timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+    def is_available(self) -> bool:
+        """サーバー起動確認"""
+        health = self.health()
+        return bool(health and health.get("status") == "ready")
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """サーバー側のプロンプト埋め込みキャッシュ統計"""
+        health = self.health()
+        return health.get("embedding_cache") if health else None
+
+    def stage_stats(self) -> Optional[Dict[str, Any]]:
+        """サーバー側の段階別計測集計"""
+        health = self.health()
+        return health.get("stages") if health else None
+
+    def flush(self) -> Dict[str, str]:
+        """サーバー側のバックグラウンド書き込み完了待ち（保存に失敗した出力パス → エラー）"""
+        try:
+            return self._post("/flush", {}).get("failures", {})
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"⚠️ 生成サーバー通信エラー（書き込み完了待ち）: {e}")
+            return {}
+
+    def interrupt(self) -> None:
+        """サーバーで実行中の生成を中断（チェックポイント保存後に中断結果が返る）"""
+        try:
+            self._post("/interrupt", {})
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"⚠️ 生成サーバー通信エラー（中断要求）: {e}")
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        # 生成中は別スレッドで進捗を取得
+        done = threading.Event()
+        if self.progress_callback is not None and path.startswith("/generate"):
+            threading.Thread(target=self._poll_progress, args=(done,), daemon=True).start()
+
+        try:
+            # 生成は数分かかるためタイムアウトなし
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read().decode('utf-8'))
+        finally:
+            done.set()
+
+    def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """単一画像生成（結果の出力パスは呼び出し側の作業ディレクトリ基準に戻す）"""
+        try:
+            result = self._post("/generate", self._absolute(request))
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return self._error(request, e)
+
+        return self._relative(request, result)
+
+    def generate_batch(self, requests: List[Dict[str, Any]], max_batch_size: int = 4) -> List[Dict[str, Any]]:
+        """複数画像のバッチ生成"""
+        try:
+            response = self._post("/generate-batch", {
+                "requests": [self._absolute(request) for request in requests],
+                "max_batch_size": max_batch_size
+            })
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return [self._error(request, e) for request in requests]
+
+        return [self._relative(request, result) for request, result in zip(requests, response["results"])]
+
+    @staticmethod
+    def _absolute(request: Dict[str, Any]) -> Dict[str, Any]:
+        # サーバーの作業ディレクトリに依存しないよう絶対パスで送る
+        absolute = dict(request, output_dir=os.path.abspath(request["output_dir"]))
+        if request.get("init_image"):
+            absolute["init_image"] = os.path.abspath(request["init_image"])
+        return absolute
+
+    @staticmethod
+    def _relative(request: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        if result.get("success") and not os.path.isabs(request["output_dir"]):
+            result["output_path"] = os.path.join(request["output_dir"], result["filename"])
+        return result
+
+    @staticmethod
+    def _error(request: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        print(f"❌ 生成サーバー通信エラー ({request['position']}): {error}")
+        return {
+            "success": False,
+            "error": f"生成サーバー通信エラー: {error}",
+            "position": request["position"]
+        }
+
+
+def get_generator(model_path: str = MODEL_PATH, torch_dtype=None, device: str = DEVICE, use_server: bool = True,
+                  memory_profile: Optional[str] = None):
+    """常駐サーバーがあればRemoteGenerator、なければLocalGeneratorを返す
+
+    memory_profile はプロセス内でロードする場合のみ使う（常駐サーバーには各リクエストの parameters.memory_profile で伝える）
+    """
+    if use_server:
+        remote = RemoteGenerator()
+        health = remote.health()
+        if health and health.get("status") == "ready":
+            if health.get("model_path") != model_path:
+                print(f"⚠️ 常駐サーバーのモデルが異なります: {health.get('model_path')}")
+            else:
+                print(f"🔌 常駐生成サーバーを使用: {remote.base_url}")
+                return remote
+
+    # 結果キャッシュで全て再利用できる再実行ではモデルをロードしない
+    return LocalGenerator.from_model(model_path, torch_dtype=torch_dtype, device=device, memory_profile=memory_profile,
+                                     lazy=True)
@@ -0,0 +1,193 @@
+"""
+締め切り付き生成の計画（ワーカーのタイムアウト内に全シーンを収める）
+残り時間を残り枚数で割った1枚あたりの予算から、画像ごとのステップ数（任意で解像度・スケジューラー）を決める。
+所要時間は「1枚あたりの固定時間 + ステップ数 × 1メガピクセル・1ステップあたりの秒数 × メガピクセル」で見積もり、
+初期値は性能履歴ストア（perf_store.py）の同じモデルの直近の生成、記録がなければ metrics.jsonl の直近のデノイズ・VAEデコード区間、
+1枚生成するごとに実測値で更新して再計画する
+"""
+
+import os
+import json
+import math
+import time
+import statistics
+from typing import Dict, Any, List, Optional
+
+from .settings import (
+    DEFAULT_PARAMETERS, METRICS_EVENTS_FILE, DEADLINE_MARGIN, DEADLINE_MIN_STEPS, DEADLINE_MIN_SCALE,
+    DEADLINE_SCHEDULER, DEADLINE_HISTORY_EVENTS, PERF_STORE_ENABLED
+)
+from .samplers import speed_parameters
+from .perf_store import PerformanceStore
+
+# 実測値の反映率（指数移動平均）
+MEASUREMENT_WEIGHT = 0.5
+
+# 履歴の読み込み範囲（ファイル末尾から）
+HISTORY_TAIL_BYTES = 256 * 1024
+
+
+def megapixels(width: int, height: int) -> float:
+    """画素数（メガピクセル）"""
+    return width * height / 1_000_000
+
+
+def effective_parameters(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """速度プロファイル・デフォルト値を展開した生成パラメータ（LocalGenerator.resolve_parameters と同じ優先順位）"""
+    _, profile_parameters = speed_parameters(parameters.get("speed_profile"))
+    params = dict(DEFAULT_PARAMETERS)
+    params.update(profile_parameters)
+    params.update(parameters)
+    return params
+
+
+def load_history(events_file: str = METRICS_EVENTS_FILE, limit: int = DEADLINE_HISTORY_EVENTS,
+                 model: Optional[str] = None) -> Dict[str, Any]:
+    """直近の生成の1メガピクセル・1ステップあたりの秒数と1枚あたりの固定時間（中央値）"""
+    if PERF_STORE_ENABLED and model:
+        history = PerformanceStore().history(model, limit)
+        if history:
+            return history
+
+    try:
+        with open(events_file, 'rb') as f:
+            f.seek(max(0, os.path.getsize(events_file) - HISTORY_TAIL_BYTES))
+            lines = f.read().decode('utf-8', errors='replace').splitlines()[-limit:]
+    except OSError:
+        return {}
+
+    per_step: List[float] = []
+    overheads: List[float] = []
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(event, dict) or event.get("error"):
+            continue
+        if event.get("stage") == "denoise" and event.get("secondsPerStep") and event.get("width") and event.get("height"):
+            images = event.get("images") or 1
+            per_step.append(event["secondsPerStep"] / images / megapixels(event["width"], event["height"]))
+        elif event.get("stage") == "vae_decode" and event.get("seconds") is not None:
+            overheads.append(event["seconds"])
+
+    history: Dict[str, Any] = {}
+    if per_step:
+        history["seconds_per_step_mp"] = statistics.median(per_step)
+        history["samples"] = len(per_step)
+    if overheads:
+        history["overhead"] = statistics.median(overheads)
+    return history
+
+
+class DeadlinePlanner:
+    """締め切り（time.monotonic 基準）までの生成計画"""
+
+    def __init__(self, deadline: float, resize: bool = False, scheduler: bool = False,
+                 margin: float = DEADLINE_MARGIN, min_steps: int = DEADLINE_MIN_STEPS,
+                 history: Optional[Dict[str, Any]] = None, model: Optional[str] = None):
+        self.deadline = deadline
+        self.resize = resize
+        self.scheduler = scheduler
+        self.margin = margin
+        self.min_steps = min_steps
+        history = load_history(model=model) if history is None else history
+        self.seconds_per_step_mp: Optional[float] = history.get("seconds_per_step_mp")
+        self.overhead: float = history.get("overhead", 0.0)
+        self.history_samples = history.get("samples", 0)
+        self.measurements = 0
+        self.plans: List[Dict[str, Any]] = []
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        """計画に使える残り時間（秒、保存・結果書き込み用の余白を除く）"""
+        return self.deadline - time.monotonic() - self.margin
+
+    def estimate(self, steps: int, width: int, height: int, images: int = 1) -> Optional[float]:
+        """所要時間の見積もり（秒、実測・履歴がなければ None）"""
+        if self.seconds_per_step_mp is None:
+            return None
+        return images * (self.overhead + steps * self.seconds_per_step_mp * megapixels(width, height))
+
+    def plan(self, name: str, parameters: Dict[str, Any], images: int = 1,
+             remaining_images: int = 1) -> Optional[Dict[str, Any]]:
+        """残り時間に収まる生成パラメータ（parameters の上書き、締め切りまでに生成できなければ None）"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            print(f"⏰ {name}: 締め切りを過ぎたため生成しません")
+            self.skipped.append(name)
+            return None
+
+        params = effective_parameters(parameters)
+        steps, width, height = params["num_inference_steps"], params["width"], params["height"]
+        budget = remaining * images / max(images, remaining_images)
+
+        planned = dict(parameters)
+        estimate = self.estimate(steps, width, height, images)
+        if estimate is not None and estimate > budget:
+            per_step = self.seconds_per_step_mp * megapixels(width, height) * images
+            fitted = int((budget - self.overhead * images) / per_step) if per_step > 0 else steps
+            steps = max(min(steps, fitted), min(steps, self.min_steps))
+
+            if self.resize and self.estimate(steps, width, height, images) > budget:
+                # 最小ステップ数でも収まらない場合は縦横比を保って解像度を下げる（8の倍数）
+                pixel_budget = (budget / images - self.overhead) / (steps * self.seconds_per_step_mp)
+                scale = max(DEADLINE_MIN_SCALE, min(1.0, math.sqrt(max(pixel_budget, 0) * 1_000_000 / (width * height))))
+                width = max(64, int(width * scale) // 8 * 8)
+                height = max(64, int(height * scale) // 8 * 8)
+
+            estimate = self.estimate(steps, width, height, images)
+            if estimate > remaining:
+                # 1枚あたりの予算でなく残り時間全体にも収まらない
+                print(f"⏰ {name}: 残り{remaining:.0f}秒に収まらないため生成しません（見積もり {estimate:.0f}秒）")
+                self.skipped.append(name)
+                return None
+
+            planned.update(num_inference_steps=steps, width=width, height=height)
+            if self.scheduler and steps < params["num_inference_steps"] and not parameters.get("scheduler"):
+                planned["scheduler"] = DEADLINE_SCHEDULER
+            print(f"⏱️ {name}: 残り{remaining:.0f}秒 / {remaining_images}枚 → "
+                  f"{params['num_inference_steps']}→{steps}ステップ、{width}x{height}"
+                  f"{'、' + planned['scheduler'] if planned.get('scheduler') else ''}（見積もり {estimate:.0f}秒）")
+
+        self.plans.append({
+            "name": name,
+            "images": images,
+            "steps": steps,
+            "width": width,
+            "height": height,
+            "scheduler": planned.get("scheduler", params.get("scheduler", "default")),
+            "requestedSteps": params["num_inference_steps"],
+            "estimatedSeconds": round(estimate, 1) if estimate is not None else None,
+            "remainingSeconds": round(remaining, 1)
+        })
+        return planned
+
+    def record(self, parameters: Dict[str, Any], seconds: float, images: int = 1) -> None:
+        """生成した画像の実測時間で見積もりを更新（直近の plan の結果として記録）"""
+        params = effective_parameters(parameters)
+        per_image = seconds / max(1, images)
+        # 固定時間の見積もりが大きすぎても実測の半分はステップ時間として扱う
+        step_seconds = max(per_image - self.overhead, per_image / 2)
+        measured = step_seconds / (params["num_inference_steps"] * megapixels(params["width"], params["height"]))
+
+        if self.measurements == 0 or self.seconds_per_step_mp is None:
+            # 最初の実測値は別の実行・デバイスの履歴より優先
+            self.seconds_per_step_mp = measured
+        else:
+            self.seconds_per_step_mp += MEASUREMENT_WEIGHT * (measured - self.seconds_per_step_mp)
+        self.measurements += 1
+
+        if self.plans:
+            self.plans[-1]["actualSeconds"] = round(seconds, 1)
+
+    def summary(self) -> Dict[str, Any]:
+        """生成結果（generation_result.json の stats.deadline）に記録する計画と実績"""
+        return {
+            "remainingSeconds": round(self.remaining() + self.margin, 1),
+            "marginSeconds": self.margin,
+            "historySamples": self.history_samples,
+            "secondsPerStepPerMegapixel": round(self.seconds_per_step_mp, 4) if self.seconds_per_step_mp else None,
+            "plans": self.plans,
+            "skipped": self.skipped
+        }
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+レスポンシブ画像派生ファイル生成
+生成済みPNGから srcset 用の WebP/AVIF（複数幅）、OGP用クロップ、LQIPプレースホルダーを作成し、
+セッションごとのマニフェスト（<セッション>/derivatives/manifest.json）に記録する
+
+Usage:
+    python -m contentflow_sd.derivatives --session article-250830-065814
+    python -m contentflow_sd.derivatives --all                      # 既存全セッションのバックフィル
+    python -m contentflow_sd.derivatives --all --widths 640,1200 --formats webp
+
+マニフェストのパスはすべてセッションディレクトリ基準の相対パス。
+派生ファイルは元画像より新しければ再生成しない（--force で常に再生成）。
+"""
+
+import os
+import io
+import sys
+import json
+import glob
+import base64
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from .settings import (
+    OUTPUT_BASE_DIR, DERIVATIVE_DIR_NAME, DERIVATIVE_WIDTHS, DERIVATIVE_FORMATS,
+    OG_IMAGE_SIZE, OG_IMAGE_QUALITY, LQIP_WIDTH
+)
+
+MANIFEST_FILE = "manifest.json"
+
+
+def default_config() -> Dict[str, Any]:
+    """派生ファイル設定（settings の値）"""
+    return {
+        "widths": list(DERIVATIVE_WIDTHS),
+        "formats": dict(DERIVATIVE_FORMATS),
+        "og_size": list(OG_IMAGE_SIZE),
+        "og_quality": OG_IMAGE_QUALITY,
+        "lqip_width": LQIP_WIDTH
+    }
+
+
+def supported_formats(formats: Dict[str, int]) -> Dict[str, int]:
+    """このPillowで書き出せる形式のみ残す"""
+    from PIL import features
+
+    available = {}
+    for name, quality in formats.items():
+        if features.check(name):
+            available[name] = quality
+        else:
+            print(f"⚠️ {name.upper()} 非対応のPillowのためスキップします")
+    return available
+
+
+def _up_to_date(path: str, source_mtime: float) -> bool:
+    return os.path.exists(path) and os.path.getmtime(path) >= source_mtime
+
+
+def _save(image, path: str, **options) -> None:
+    # 書き込み途中のファイルを残さないよう一時ファイル経由で保存
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(temp_path, **options)
+    os.replace(temp_path, path)
+
+
+def build_derivatives(source_path: str, config: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+    """1枚の元画像から派生ファイルを作成してマニフェスト項目を返す（プロセスプールで実行）"""
+    from PIL import Image, ImageOps
+
+    session_dir = os.path.dirname(source_path)
+    output_dir = os.path.join(session_dir, DERIVATIVE_DIR_NAME)
+    os.makedirs(output_dir, exist_ok=True)
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    source_mtime = os.path.getmtime(source_path)
+    created = 0
+
+    with Image.open(source_path) as source:
+        image = source.convert("RGB")
+
+    width, height = image.size
+    entry: Dict[str, Any] = {
+        "source": os.path.basename(source_path),
+        "width": width,
+        "height": height,
+        "bytes": os.path.getsize(source_path),
+        "srcset": {}
+    }
+
+    # srcset: 元画像より大きい幅には拡大しない
+    widths = sorted({min(w, width) for w in config["widths"]})
+    for format_name, quality in config["formats"].items():
+        variants = []
+        for target_width in widths:
+            target_height = round(height * target_width / width)
+            filename = f"{stem}-{target_width}w.{format_name}"
+            path = os.path.join(output_dir, filename)
+
+            if force or not _up_to_date(path, source_mtime):
+                resized = image if target_width == width else image.resize((target_width, target_height), Image.LANCZOS)
+                _save(resized, path, format=format_name.upper(), quality=quality)
+                created += 1
+
+            variants.append({
+                "width": target_width,
+                "height": target_height,
+                "path": f"{DERIVATIVE_DIR_NAME}/{filename}",
+                "bytes": os.path.getsize(path)
+            })
+        entry["srcset"][format_name] = variants
+
+    # OGP: 中央クロップ（SNSクローラー互換のためJPEG）
+    og_width, og_height = config["og_size"]
+    og_filename = f"{stem}-og.jpg"
+    og_path = os.path.join(output_dir, og_filename)
+    if force or not _up_to_date(og_path, source_mtime):
+        og_image = ImageOps.fit(image, (og_width, og_height), Image.LANCZOS)
+        _save(og_image, og_path, format="JPEG", quality=config["og_quality"], optimize=True, progressive=True)
+        created += 1
+    entry["og"] = {
+        "width": og_width,
+        "height": og_height,
+        "path": f"{DERIVATIVE_DIR_NAME}/{og_filename}",
+        "bytes": os.path.getsize(og_path)
+    }
+
+    # LQIP: 極小WebPのdata URIと平均色（CSS背景用）
+    lqip_width = config["lqip_width"]
+    thumbnail = image.resize((lqip_width, max(1, round(height * lqip_width / width))), Image.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="WEBP", quality=30)
+    entry["lqip"] = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+    entry["placeholderColor"] = "#{:02x}{:02x}{:02x}".format(*image.resize((1, 1), Image.BOX).getpixel((0, 0)))
+
+    entry["created"] = created
+    return entry
+
+
+def source_images(session_dir: str) -> List[str]:
+    """セッション直下の生成画像（プレビュー・派生ファイルは除く）"""
+    return sorted(glob.glob(os.path.join(session_dir, "*.png")))
+
+
+def latest_by_position(filenames: List[str]) -> Dict[str, str]:
+    """ポジションごとの最新画像（統合スクリプトと同じくファイル名の降順で先頭）"""
+    positions: Dict[str, str] = {}
+    for filename in sorted(filenames, reverse=True):
+        positions.setdefault(filename.split("-")[0], filename)
+    return positions
+
+
+def manifest_path(session_dir: str) -> str:
+    """セッションのマニフェストパス"""
+    return os.path.join(session_dir, DERIVATIVE_DIR_NAME, MANIFEST_FILE)
+
+
+def write_manifest(session_dir: str, entries: Dict[str, Dict[str, Any]], config: Dict[str, Any]) -> str:
+    """セッションのマニフェスト保存"""
+    path = manifest_path(session_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    manifest = {
+        "sessionId": os.path.basename(os.path.normpath(session_dir)),
+        "generatedAt": datetime.now().isoformat(),
+        "config": {key: value for key, value in config.items() if key != "lqip_width"},
+        "positions": latest_by_position(list(entries)),
+        "images": entries
+    }
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return path
+
+
+def process_sessions(session_dirs: List[str], config: Optional[Dict[str, Any]] = None, force: bool = False,
+                     workers: Optional[int] = None) -> Dict[str, Any]:
+    """複数セッションの派生ファイルを1つのプロセスプールで作成し、セッションごとにマニフェストを書く"""
+    config = dict(config or default_config())
+    config["formats"] = supported_formats(config["formats"])
+
+    tasks = [(session_dir, source) for session_dir in session_dirs for source in source_images(session_dir)]
+    summary = {"sessions": len(session_dirs), "images": len(tasks), "created": 0, "failed": 0, "manifests": []}
+    if not tasks:
+        return summary
+
+    entries: Dict[str, Dict[str, Dict[str, Any]]] = {session_dir: {} for session_dir in session_dirs}
+    max_workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (session_dir, source, executor.submit(build_derivatives, source, config, force))
+            for session_dir, source in tasks
+        ]
+        for session_dir, source, future in futures:
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"❌ 派生ファイル作成エラー ({source}): {e}")
+                summary["failed"] += 1
+                continue
+            summary["created"] += entry.pop("created")
+            entries[session_dir][entry["source"]] = entry
+
+    for session_dir in session_dirs:
+        if entries[session_dir]:
+            summary["manifests"].append(write_manifest(session_dir, entries[session_dir], config))
+
+    return summary
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='レスポンシブ画像派生ファイル生成（WebP/AVIF・OGP・LQIP）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--session', action='append', help='対象セッションID（複数指定可）')
+    target.add_argument('--all', action='store_true', help='全セッションをバックフィル')
+    parser.add_argument('--base-dir', default=OUTPUT_BASE_DIR, help=f'生成画像ディレクトリ（デフォルト: {OUTPUT_BASE_DIR}）')
+    parser.add_argument('--widths', help=f'srcset幅（カンマ区切り、デフォルト: {",".join(map(str, DERIVATIVE_WIDTHS))}）')
+    parser.add_argument('--formats', help=f'出力形式（カンマ区切り、デフォルト: {",".join(DERIVATIVE_FORMATS)}）')
+    parser.add_argument('--workers', type=int, help='プロセス数（デフォルト: CPUコア数）')
+    parser.add_argument('--force', action='store_true', help='既存の派生ファイルも再生成')
+
+    args = parser.parse_args()
+
+    config = default_config()
+    try:
+        if args.widths:
+            config["widths"] = [int(width) for width in args.widths.split(",") if width.strip()]
+        if args.formats:
+            names = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+            config["formats"] = {name: DERIVATIVE_FORMATS.get(name, 75) for name in names}
+    except ValueError as e:
+        parser.error(f"幅の指定が無効です: {e}")
+
+    if args.all:
+        session_dirs = sorted(
+            path for path in glob.glob(os.path.join(args.base_dir, "*"))
+            if os.path.isdir(path)
+        )
+    else:
+        session_dirs = [os.path.join(args.base_dir, session_id) for session_id in args.session]
+        missing = [path for path in session_dirs if not os.path.isdir(path)]
+        if missing:
+            print(f"❌ セッションディレクトリが見つかりません: {', '.join(missing)}")
+            sys.exit(1)
+
+    print(f"🖼️ 派生ファイル生成開始: {len(session_dirs)}セッション")
+    start_time = datetime.now()
+    summary = process_sessions(session_dirs, config, force=args.force, workers=args.workers)
+    elapsed = (datetime.now() - start_time).total_seconds()
+
+    print(f"✅ 完了: 元画像 {summary['images']}枚 / 新規派生ファイル {summary['created']}件 / 失敗 {summary['failed']}件 ({elapsed:.1f}秒)")
+    for path in summary["manifests"]:
+        print(f"📄 {path}")
+
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+実行デバイスの自動判定とCPU実行の最適化
+DEVICE="auto"（デフォルト）は CUDA → MPS → CPU の順に利用可能なものを選ぶ。
+CPU では bfloat16（CPUがネイティブ対応している場合）または float32、channels-last のメモリ配置、
+スレッド数の調整、SDPA アテンションを使う（MPS / CUDA は従来どおり float16）
+
+Usage:
+    python -m contentflow_sd.device                          # 判定結果を表示
+    python -m contentflow_sd.device --benchmark              # CPU設定（精度・メモリ配置・スレッド数）の比較
+    python -m contentflow_sd.device --benchmark --steps 5 --threads 4,8
+
+環境変数:
+    CONTENTFLOW_DEVICE       auto / cpu / mps / cuda
+    CONTENTFLOW_CPU_DTYPE    auto / bfloat16 / float32
+    CONTENTFLOW_CPU_THREADS  0 で利用可能なCPU数
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from .settings import (
+    MODEL_PATH, DEVICE, CPU_DTYPE, CPU_THREADS, CPU_CHANNELS_LAST, DEFAULT_PARAMETERS, STATUS_EVENTS_DIR
+)
+
+# CPUのネイティブbfloat16命令（ない場合の bfloat16 はエミュレーションで float32 より遅い）
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+
+def detect_device(preferred: Optional[str] = None) -> str:
+    """実行デバイスの判定（指定デバイスが使えなければ利用可能なものに切り替える）"""
+    import torch
+
+    preferred = preferred or DEVICE
+    available = {
+        "cuda": torch.cuda.is_available(),
+        "mps": hasattr(torch.backends, "mps") and torch.backends.mps.is_available(),
+        "cpu": True
+    }
+
+    if preferred != "auto":
+        device_type = preferred.split(":")[0]
+        if available.get(device_type):
+            return preferred
+        print(f"⚠️ デバイス {preferred} は利用できません。自動判定に切り替えます")
+
+    for device in ("cuda", "mps", "cpu"):
+        if available[device]:
+            return device
+    return "cpu"
+
+
+def cpu_supports_bf16() -> bool:
+    """CPUがbfloat16をネイティブ実行できるか（Linuxの /proc/cpuinfo で判定）"""
+    try:
+        with open("/proc/cpuinfo", 'r') as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = line.split(":", 1)[1].split()
+                    return any(flag in flags for flag in BF16_CPU_FLAGS)
+    except OSError:
+        pass
+    return False
+
+
+def default_dtype(device: str, cpu_dtype: Optional[str] = None):
+    """デバイスの既定精度（GPU系は float16、CPUは設定または自動判定）"""
+    import torch
+
+    if not device.startswith("cpu"):
+        return torch.float16
+
+    cpu_dtype = cpu_dtype or CPU_DTYPE
+    if cpu_dtype == "auto":
+        cpu_dtype = "bfloat16" if cpu_supports_bf16() else "float32"
+    if cpu_dtype not in ("bfloat16", "float32"):
+        raise ValueError(f"CPUの精度は bfloat16 / float32 のいずれか: {cpu_dtype}")
+    return getattr(torch, cpu_dtype)
+
+
+def cpu_count() -> int:
+    """このプロセスが使えるCPU数（コンテナ・taskset の制限を反映）"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configure_cpu_threads(threads: Optional[int] = None) -> int:
+    """推論（演算子内並列）のスレッド数を設定"""
+    import torch
+
+    threads = threads or CPU_THREADS or cpu_count()
+    torch.set_num_threads(threads)
+    return threads
+
+
+def optimize_pipeline(pipe, device: str, channels_last: Optional[bool] = None, threads: Optional[int] = None) -> Dict[str, Any]:
+    """デバイスに合わせたパイプラインの最適化（適用内容を返す）"""
+    import torch
+    import torch.nn.functional as F
+
+    applied: Dict[str, Any] = {"device": device, "dtype": str(pipe.unet.dtype).replace("torch.", "")}
+
+    # SDPA（メモリ効率の良い融合アテンション）を明示
+    if hasattr(F, "scaled_dot_product_attention"):
+        from diffusers.models.attention_processor import AttnProcessor2_0
+
+        pipe.unet.set_attn_processor(AttnProcessor2_0())
+        pipe.vae.set_attn_processor(AttnProcessor2_0())
+        applied["attention"] = "sdpa"
+
+    if device.startswith("cpu"):
+        applied["threads"] = configure_cpu_threads(threads)
+        channels_last = CPU_CHANNELS_LAST if channels_last is None else channels_last
+        # 畳み込みが中心の UNet / VAE は channels-last の方が oneDNN で速い
+        memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        pipe.unet.to(memory_format=memory_format)
+        pipe.vae.to(memory_format=memory_format)
+        applied["channels_last"] = channels_last
+
+    return applied
+
+
+def measure_configuration(model_path: str, dtype: str, channels_last: bool, threads: int,
+                          steps: int, width: int, height: int) -> Dict[str, Any]:
+    """1つのCPU設定を現在のプロセスで計測（ウォームアップ1ステップ後に計測）"""
+    import time
+    from .generator import LocalGenerator
+    from .metrics import peak_rss
+
+    configure_cpu_threads(threads)
+    generator = LocalGenerator.from_model(
+        model_path, torch_dtype=default_dtype("cpu", dtype), device="cpu",
+        use_embedding_cache=False, use_result_cache=False, background_write=False
+    )
+    optimize_pipeline(generator.pipe, "cpu", channels_last=channels_last, threads=threads)
+    generator.pipe.set_progress_bar_config(disable=True)
+
+    output_dir = tempfile.mkdtemp(prefix="sd-cpu-bench-")
+
+    def request(position: str, num_steps: int) -> Dict[str, Any]:
+        return {
+            "prompt": "modern minimalist workspace, natural light, wooden desk, plants",
+            "negative_prompt": "person, people, text, watermark",
+            "parameters": {"width": width, "height": height, "num_inference_steps": num_steps, "seed": 1},
+            "position": position,
+            "output_dir": output_dir,
+            "force": True
+        }
+
+    generator.generate(request("warmup", 1))
+    started = time.perf_counter()
+    result = generator.generate(request("measure", steps))
+    elapsed = time.perf_counter() - started
+    if not result["success"]:
+        raise RuntimeError(result.get("error"))
+
+    return {
+        "dtype": dtype,
+        "channelsLast": channels_last,
+        "threads": threads,
+        "imageSeconds": round(elapsed, 2),
+        "secondsPerStep": round(elapsed / steps, 3),
+        "imagesPerHour": round(3600 / elapsed, 1),
+        "peakRssMB": round(peak_rss() / (1024 * 1024), 1)
+    }
+
+
+def run_benchmark(model_path: str, dtypes: List[str], thread_counts: List[int], steps: int,
+                  width: int, height: int) -> List[Dict[str, Any]]:
+    """CPU設定の組み合わせを1つずつ別プロセスで計測（スレッド数は起動時に固定するため）"""
+    measurements = []
+    for dtype in dtypes:
+        for channels_last in (True, False):
+            for threads in thread_counts:
+                label = f"{dtype} / {'channels-last' if channels_last else 'contiguous'} / {threads}スレッド"
+                print(f"▶️ {label}")
+                with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                    result_path = f.name
+                command = [sys.executable, "-m", "contentflow_sd.device", "--measure", "--model-path", model_path,
+                           "--dtype", dtype, "--threads", str(threads), "--steps", str(steps),
+                           "--width", str(width), "--height", str(height), "--output", result_path]
+                if not channels_last:
+                    command.append("--no-channels-last")
+                try:
+                    completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+                    if completed.returncode != 0:
+                        measurements.append({"dtype": dtype, "channelsLast": channels_last, "threads": threads,
+                                             "error": f"exit {completed.returncode}"})
+                        continue
+                    with open(result_path, 'r', encoding='utf-8') as f:
+                        measurement = json.load(f)
+                    print(f"   {measurement['secondsPerStep']}秒/ステップ / ピークRSS {measurement['peakRssMB']}MB")
+                    measurements.append(measurement)
+                finally:
+                    os.remove(result_path)
+    return measurements
+
+
+def format_table(measurements: List[Dict[str, Any]]) -> str:
+    """計測結果のMarkdown表（速い順）"""
+    lines = [
+        "| 精度 | メモリ配置 | スレッド | 秒/ステップ | 1枚 (秒) | 画像/時 | ピークRSS (MB) |",
+        "|---|---|---:|---:|---:|---:|---:|"
+    ]
+    succeeded = sorted((m for m in measurements if "error" not in m), key=lambda m: m["secondsPerStep"])
+    for m in succeeded:
+        layout = "channels-last" if m["channelsLast"] else "contiguous"
+        lines.append(f"| {m['dtype']} | {layout} | {m['threads']} | {m['secondsPerStep']} | {m['imageSeconds']} "
+                     f"| {m['imagesPerHour']} | {m['peakRssMB']} |")
+    for m in measurements:
+        if "error" in m:
+            layout = "channels-last" if m["channelsLast"] else "contiguous"
+            lines.append(f"| {m['dtype']} | {layout} | {m['threads']} | 失敗 ({m['error']}) | | | |")
+    return "\n".join(lines)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='実行デバイスの判定・CPU設定の比較')
+    parser.add_argument('--benchmark', action='store_true', help='CPU設定（精度 × メモリ配置 × スレッド数）を計測して比較表を表示')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--dtypes', default="float32,bfloat16", help='比較する精度（カンマ区切り、デフォルト: float32,bfloat16）')
+    parser.add_argument('--threads', help='比較するスレッド数（カンマ区切り、デフォルト: 利用可能なCPU数とその半分）')
+    parser.add_argument('--steps', type=int, default=DEFAULT_PARAMETERS["num_inference_steps"], help='推論ステップ数')
+    parser.add_argument('--width', type=int, default=DEFAULT_PARAMETERS["width"], help='画像幅')
+    parser.add_argument('--height', type=int, default=DEFAULT_PARAMETERS["height"], help='画像高さ')
+    parser.add_argument('--output', help='計測結果JSONの保存先')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--dtype', help=argparse.SUPPRESS)
+    parser.add_argument('--no-channels-last', action='store_true', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.measure:
+        result = measure_configuration(args.model_path, args.dtype, not args.no_channels_last, int(args.threads),
+                                       args.steps, args.width, args.height)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    device = detect_device()
+    print(f"🖥️ 実行デバイス: {device}（設定: {DEVICE}）")
+    print(f"🔢 既定の精度: {str(default_dtype(device)).replace('torch.', '')}")
+    print(f"🧵 利用可能なCPU: {cpu_count()} / ネイティブbfloat16: {'あり' if cpu_supports_bf16() else 'なし'}")
+
+    if not args.benchmark:
+        return
+
+    if args.threads:
+        thread_counts = [int(value) for value in args.threads.split(",")]
+    else:
+        thread_counts = sorted({cpu_count(), max(1, cpu_count() // 2)}, reverse=True)
+    dtypes = [value.strip() for value in args.dtypes.split(",")]
+
+    print(f"\n⏱️ CPU設定比較: {args.width}x{args.height} / {args.steps}ステップ")
+    measurements = run_benchmark(args.model_path, dtypes, thread_counts, args.steps, args.width, args.height)
+    print(f"\n{format_table(measurements)}")
+
+    best = min((m for m in measurements if "error" not in m), key=lambda m: m["secondsPerStep"], default=None)
+    if best:
+        print(f"\n🏆 最速: {best['dtype']} / {'channels-last' if best['channelsLast'] else 'contiguous'} / "
+              f"{best['threads']}スレッド（{best['secondsPerStep']}秒/ステップ）")
+
+    output = args.output or os.path.join(STATUS_EVENTS_DIR, f"cpu-benchmark-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "modelPath": args.model_path,
+            "width": args.width,
+            "height": args.height,
+            "steps": args.steps,
+            "cpuCount": cpu_count(),
+            "nativeBf16": cpu_supports_bf16(),
+            "measuredAt": datetime.now().isoformat(),
+            "best": best,
+            "configurations": measurements
+        }, f, ensure_ascii=False, indent=2)
+    print(f"📄 結果保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
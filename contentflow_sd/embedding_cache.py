@@ -0,0 +1,181 @@
+"""
+プロンプト埋め込みキャッシュ
+SDXLの2つのテキストエンコーダー出力（prompt_embeds / pooled_prompt_embeds）を
+モデルID＋テキスト完全一致をキーにメモリとディスク（LRU）へ保存する
+
+CLIPの埋め込みは文脈依存のため、スタイル接尾辞だけを切り出して再利用することはできない。
+共通のネガティブプロンプトや同一プロンプトの再生成・バリエーションでヒットする。
+キャッシュにないテキスト（スタイル違いのバリエーション等）はバッチ内でまとめて1回でエンコードする。
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Callable, Optional
+
+from .settings import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MEMORY_ENTRIES
+
+
+class PromptEmbeddingCache:
+    """テキストエンコーダー出力のLRUキャッシュ（メモリ＋ディスク）"""
+
+    def __init__(self, model_id: str, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # エンコード直前に呼ぶ（解放したテキストエンコーダーの再ロード用）
+        self.before_encode: Optional[Callable[[], None]] = None
+
+    def key(self, text: str) -> str:
+        """キャッシュキー（モデルID＋テキスト完全一致）"""
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.safetensors")
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _load(self, key: str, device, dtype):
+        from safetensors.torch import load_file
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            tensors = load_file(path)
+        except Exception as e:
+            print(f"⚠️ 埋め込みキャッシュ読み込みエラー（再計算します）: {e}")
+            return None
+
+        # LRU順序は最終アクセス時刻で管理
+        os.utime(path)
+        return {name: tensor.to(device=device, dtype=dtype) for name, tensor in tensors.items()}
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        from safetensors.torch import save_file
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            save_file({name: tensor.detach().to("cpu").contiguous() for name, tensor in entry.items()}, temp_path)
+            os.replace(temp_path, path)
+            self._evict()
+        except Exception as e:
+            print(f"⚠️ 埋め込みキャッシュ保存エラー: {e}")
+
+    def _evict(self) -> None:
+        """ディスク上のエントリ数が上限を超えたら最終アクセスが古い順に削除"""
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".safetensors")
+        ]
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _lookup(self, key: str, device, dtype) -> Optional[Dict[str, Any]]:
+        """メモリ・ディスクのキャッシュ検索（ヒット統計を更新）"""
+        if key in self.memory:
+            self.hits += 1
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        entry = self._load(key, device, dtype)
+        if entry is not None:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def encode(self, pipe, text: str) -> Dict[str, Any]:
+        """単一テキストの埋め込み取得（キャッシュになければエンコード）"""
+        return self.encode_many(pipe, [text])[0]
+
+    def encode_many(self, pipe, texts: List[str]) -> List[Dict[str, Any]]:
+        """複数テキストの埋め込み取得（キャッシュにないものは1回のエンコードでまとめて計算）"""
+        import torch
+
+        device = pipe._execution_device
+        dtype = pipe.text_encoder_2.dtype if pipe.text_encoder_2 is not None else pipe.unet.dtype
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for text in texts:
+            if text in entries or text in missing:
+                # 同じ呼び出し内の重複はエンコード済みのものを使う
+                self.hits += 1
+                continue
+            entry = self._lookup(self.key(text), device, dtype)
+            if entry is None:
+                missing.append(text)
+            else:
+                entries[text] = entry
+
+        if missing:
+            self.misses += len(missing)
+            if self.before_encode is not None:
+                self.before_encode()
+            # テキストエンコーダーは77トークン固定長にパディングするため、まとめてエンコードしても結果は変わらない
+            with torch.no_grad():
+                prompt_embeds, _, pooled_prompt_embeds, _ = pipe.encode_prompt(
+                    prompt=missing,
+                    device=device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=False
+                )
+            for index, text in enumerate(missing):
+                key = self.key(text)
+                entry = {
+                    "prompt_embeds": prompt_embeds[index:index + 1].clone(),
+                    "pooled_prompt_embeds": pooled_prompt_embeds[index:index + 1].clone()
+                }
+                self._store(key, entry)
+                self._remember(key, entry)
+                entries[text] = entry
+
+        return [entries[text] for text in texts]
+
+    def pipeline_kwargs(self, pipe, prompts: List[str], negative_prompts: List[str]) -> Dict[str, Any]:
+        """パイプラインに渡す埋め込み引数（prompt / negative_prompt 文字列の代わり）"""
+        import torch
+
+        entries = self.encode_many(pipe, prompts + negative_prompts)
+        positives, negatives = entries[:len(prompts)], entries[len(prompts):]
+
+        return {
+            "prompt_embeds": torch.cat([entry["prompt_embeds"] for entry in positives]),
+            "pooled_prompt_embeds": torch.cat([entry["pooled_prompt_embeds"] for entry in positives]),
+            "negative_prompt_embeds": torch.cat([entry["prompt_embeds"] for entry in negatives]),
+            "negative_pooled_prompt_embeds": torch.cat([entry["pooled_prompt_embeds"] for entry in negatives])
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット・ミス統計"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory)
+        }
@@ -0,0 +1,648 @@
+"""
+画像生成処理（ロード済みパイプラインを使用）
+
+生成リクエストは以下のキーを持つ辞書:
+    prompt, negative_prompt, parameters, position, description, output_dir,
+    filename_prefix（省略時はposition）, variation（省略可）, session_id（省略時は出力ディレクトリ名）,
+    force（Trueなら結果キャッシュを使わず再生成）, init_image（指定時はこの画像を元にimg2imgで生成）,
+    checkpoint_every（Nステップごとに途中経過を保存）, resume（途中経過があればそこから再開）
+parameters.seed 未指定時はセッションIDとポジションから決定的に導出する
+parameters.speed_profile（速度プロファイル）のステップ数・スケジューラー等は parameters の明示値が優先する
+init_image 指定時は parameters.strength（ノイズ付加の強さ 0〜1）で元画像をどこまで描き直すかを決める
+結果は BackgroundImageGenerator.generate_image と同じ形式の辞書
+生成した画像ごとの条件・段階別時間・ピークメモリは性能履歴ストア（perf_store.py）に記録する
+画像の保存はバックグラウンドで行われるため、出力ファイルを使う前に flush() で書き込み完了を待つこと
+from_model(lazy=True) ではパイプラインを最初に生成が必要になった時点でロードする（結果キャッシュの照合はロード不要）
+"""
+
+import os
+import glob
+import time
+import hashlib
+from functools import partial
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from .settings import (
+    MODEL_PATH, DEVICE, DEFAULT_PARAMETERS, HUMAN_PREVENTION_PROMPT, REFINE_STRENGTH, MEMORY_PROFILES,
+    PERF_STORE_ENABLED
+)
+from .pipeline import load_pipeline
+from .embedding_cache import PromptEmbeddingCache
+from .result_cache import ResultCache, cache_inputs, cache_key, png_metadata, read_png_key
+from .writer import ImageWriter, write_png
+from .metrics import get_metrics, instrument_pipeline, span, peak_rss, torch_memory
+from .samplers import (
+    speed_parameters, resolve_speed_profile, default_scheduler_name, get_scheduler, apply_scheduler, apply_adapter
+)
+from .progress import StepProgress, ProgressCallback
+from .checkpoint import (
+    GenerationInterrupted, StepCheckpointer, load_checkpoint, remove_checkpoint, denoising_start
+)
+
+
+def derive_seed(session_id: str, position: str, variation: Optional[int] = None) -> int:
+    """セッションID・ポジション（・バリエーション番号）から決定的なシードを導出"""
+    source = f"{session_id}:{position}" if variation is None else f"{session_id}:{position}:{variation}"
+    return int(hashlib.sha256(source.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def build_request(prompt_data: Dict[str, Any], output_dir: str, human_prevention: bool = True,
+                  session_id: Optional[str] = None) -> Dict[str, Any]:
+    """記事JSONの imagePrompts 要素から生成リクエストを構築"""
+    full_prompt = f"{prompt_data['prompt']}, {prompt_data['style']}"
+
+    negative_prompt = prompt_data['negativePrompt']
+    if human_prevention:
+        negative_prompt = f"{negative_prompt}, {HUMAN_PREVENTION_PROMPT}"
+
+    request = {
+        "prompt": full_prompt,
+        "negative_prompt": negative_prompt,
+        "parameters": prompt_data.get('parameters', {}),
+        "position": prompt_data['position'],
+        "description": prompt_data.get('description', ''),
+        "output_dir": output_dir
+    }
+    if session_id:
+        request["session_id"] = session_id
+    return request
+
+
+def build_filename(request: Dict[str, Any]) -> str:
+    """出力ファイル名生成"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    prefix = request.get("filename_prefix") or request["position"]
+
+    if request.get("variation") is not None:
+        return f"{prefix}-{request['variation']:03d}-{timestamp}.png"
+    return f"{prefix}-{timestamp}.png"
+
+
+def find_existing_output(output_dir: str, position: str) -> Optional[str]:
+    """ポジションの既存の有効な画像（最新のもの）"""
+    from PIL import Image
+
+    for path in sorted(glob.glob(os.path.join(output_dir, f"{position}-*.png")), reverse=True):
+        try:
+            with Image.open(path) as image:
+                image.verify()
+        except Exception:
+            continue
+        return path
+    return None
+
+
+def batch_key(params: Dict[str, Any]) -> Tuple:
+    """同一パイプライン呼び出しにまとめられるパラメータの組"""
+    return (params["width"], params["height"], params["num_inference_steps"], params["guidance_scale"],
+            params.get("strength"), params.get("memory_profile"), params.get("scheduler"), params.get("adapter"))
+
+
+def chain_callbacks(callbacks):
+    """複数の callback_on_step_end を順に呼ぶ1つのコールバックにまとめる"""
+    def on_step_end(pipe, step_index, timestep, callback_kwargs):
+        for callback in callbacks:
+            callback_kwargs = callback(pipe, step_index, timestep, callback_kwargs)
+        return callback_kwargs
+    return on_step_end
+
+
+def is_out_of_memory(error: Exception) -> bool:
+    """メモリ不足エラー判定（CUDA / MPS / CPU）"""
+    message = str(error).lower()
+    return "out of memory" in message or "failed to allocate" in message
+
+
+def release_memory():
+    """メモリ不足後のキャッシュ解放"""
+    import gc
+    import torch
+
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if hasattr(torch, "mps") and torch.backends.mps.is_available():
+        torch.mps.empty_cache()
+
+
+def error_result(request: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+    """生成失敗時の結果辞書"""
+    print(f"❌ 画像生成エラー ({request.get('position')}): {error}")
+    return {
+        "success": False,
+        "error": str(error),
+        "position": request.get("position")
+    }
+
+
+class LocalGenerator:
+    """プロセス内にロードしたパイプラインで画像生成"""
+
+    def __init__(self, pipe, model_path: str = MODEL_PATH, embedding_cache: Optional[PromptEmbeddingCache] = None,
+                 result_cache: Optional[ResultCache] = None, writer: Optional[ImageWriter] = None,
+                 perf_store=None, pipe_loader: Optional[Callable[[], Any]] = None, memory_profile: Optional[str] = None):
+        """pipe が None の場合は pipe_loader で初回の生成時にロードする（全て生成済みならロードしない）"""
+        # memory・perf_store は python -m で実行できるモジュールのため使用時に import（パッケージ経由の二重読み込みを避ける）
+        from .memory import resolve_profile
+
+        self._pipe = None
+        self.pipe_loader = pipe_loader
+        self.model_path = model_path
+        self.memory_profile = getattr(pipe, "_contentflow_memory_profile", None) or resolve_profile(memory_profile)
+        self.embedding_cache = embedding_cache
+        if embedding_cache is not None:
+            embedding_cache.before_encode = self.ensure_text_encoders
+        self.result_cache = result_cache
+        self.writer = writer
+        self.perf_store = perf_store  # perf_store.PerformanceStore（None なら記録しない）
+        self.img2img_pipe = None
+        self.progress: Optional[StepProgress] = None
+        self.interrupt_requested = False
+        self.requests_served = 0
+        self.batches_run = 0
+        if pipe is not None:
+            self._set_pipe(pipe)
+        # 結果キャッシュキーのスケジューラー名（差し替え後も同梱のスケジューラーで識別、設定ファイルがなければロードして取得）
+        self.default_scheduler = default_scheduler_name(model_path) or type(get_scheduler(self.pipe, "default")).__name__
+
+    @property
+    def pipe(self):
+        """ロード済みパイプライン（遅延ロードの場合は初回アクセス時にロード）"""
+        if self._pipe is None:
+            self._set_pipe(self.pipe_loader())
+        return self._pipe
+
+    def load(self):
+        """パイプラインをロード（ロード済みなら何もしない）"""
+        return self.pipe
+
+    @property
+    def loaded(self) -> bool:
+        """パイプラインがロード済みか"""
+        return self._pipe is not None
+
+    def _set_pipe(self, pipe) -> None:
+        """パイプラインの計測・進捗表示の設定"""
+        self._pipe = pipe
+        instrument_pipeline(pipe)
+        if self.progress is not None:
+            pipe.set_progress_bar_config(disable=True)
+
+    @classmethod
+    def from_model(cls, model_path: str = MODEL_PATH, torch_dtype=None, device: str = DEVICE,
+                   use_embedding_cache: bool = True, use_result_cache: bool = True,
+                   background_write: bool = True, memory_profile: Optional[str] = None,
+                   lazy: bool = False) -> "LocalGenerator":
+        """モデルをロードしてジェネレーター作成（lazy 指定時は結果キャッシュにない画像の生成時に初めてロード）"""
+        loader = partial(load_pipeline, model_path, torch_dtype=torch_dtype, device=device, memory_profile=memory_profile)
+        pipe = None if lazy else loader()
+        embedding_cache = PromptEmbeddingCache(model_path) if use_embedding_cache else None
+        result_cache = ResultCache() if use_result_cache else None
+        writer = ImageWriter() if background_write else None
+        perf_store = None
+        if PERF_STORE_ENABLED:
+            from .perf_store import PerformanceStore
+
+            perf_store = PerformanceStore()
+        return cls(pipe, model_path, embedding_cache, result_cache, writer, perf_store,
+                   pipe_loader=loader, memory_profile=memory_profile)
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """プロンプト埋め込みキャッシュ統計"""
+        return self.embedding_cache.stats() if self.embedding_cache else None
+
+    def stage_stats(self) -> Optional[Dict[str, Any]]:
+        """段階別（モデルロード・テキストエンコード・デノイズ・VAEデコード・保存）の計測集計"""
+        return get_metrics().summary() or None
+
+    def set_progress_callback(self, callback: Optional[ProgressCallback]) -> None:
+        """デノイズステップ進捗の通知先を設定（設定中はtqdm出力を抑制）"""
+        self.progress = StepProgress(callback) if callback else None
+        for pipe in (self._pipe, self.img2img_pipe):
+            if pipe is not None:
+                pipe.set_progress_bar_config(disable=callback is not None)
+
+    def pipelines(self) -> List[Any]:
+        """重みを共有するロード済みパイプライン（先頭がオフロードフックを持つメイン）"""
+        return [pipe for pipe in (self._pipe, self.img2img_pipe) if pipe is not None]
+
+    def ensure_text_encoders(self) -> None:
+        """解放済みのテキストエンコーダーを再ロード（プロンプトのエンコード前に呼ぶ）"""
+        from .memory import text_encoders_loaded, load_text_encoders
+
+        if not text_encoders_loaded(self.pipe):
+            load_text_encoders(self.pipelines(), self.model_path)
+
+    def apply_memory_profile(self, name: Optional[str]) -> str:
+        """画像ごとのメモリプロファイル（未指定なら実行単位のもの）を適用"""
+        from .memory import resolve_profile, apply_memory_profile
+
+        name = resolve_profile(name or self.memory_profile)
+        apply_memory_profile(self.pipe, name)
+        return name
+
+    def apply_speed_profile(self, params: Dict[str, Any]) -> None:
+        """画像ごとのスケジューラー・LoRAアダプターを適用（キャッシュ済みのものに差し替え）"""
+        resolve_speed_profile(params["speed_profile"])
+        apply_scheduler(self.pipelines(), params.get("scheduler"))
+        apply_adapter(self.pipe, params.get("adapter"))
+
+    def interrupt(self) -> None:
+        """次のステップ終了時にチェックポイントを保存して生成を止める（シグナルハンドラーから呼ぶ）"""
+        self.interrupt_requested = True
+
+    def flush(self) -> Dict[str, str]:
+        """バックグラウンド書き込みの完了待ち（保存に失敗した出力パス → エラー）"""
+        return self.writer.flush() if self.writer else {}
+
+    def resolve_parameters(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """デフォルト値・シードを補完した生成パラメータ"""
+        requested = request.get("parameters") or {}
+        speed_profile, profile_parameters = speed_parameters(requested.get("speed_profile"))
+
+        params = dict(DEFAULT_PARAMETERS)
+        params.update(profile_parameters)
+        params.update(requested)
+        params["speed_profile"] = speed_profile
+        if params.get("scheduler") == "default":
+            params.pop("scheduler")
+
+        if params.get("seed") is None:
+            session_id = request.get("session_id") or os.path.basename(os.path.normpath(request["output_dir"]))
+            params["seed"] = derive_seed(session_id, request["position"], request.get("variation"))
+
+        if request.get("init_image") and params.get("strength") is None:
+            params["strength"] = REFINE_STRENGTH
+
+        return params
+
+    def cache_inputs(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """結果キャッシュキーの元になる生成入力"""
+        init_image = request.get("init_image")
+        if init_image:
+            # 元画像は内容（PNGのキャッシュキー）で識別し、なければパスで代用
+            init_image = read_png_key(init_image) or os.path.abspath(init_image)
+
+        # メモリプロファイルは生成内容を変えないためキーに含めない
+        # 速度プロファイルは展開後のステップ数・スケジューラー・アダプターで識別する
+        params = self.resolve_parameters(request)
+        params.pop("memory_profile", None)
+        params.pop("speed_profile")
+
+        return cache_inputs(
+            self.model_path,
+            request,
+            params,
+            self.default_scheduler,
+            init_image
+        )
+
+    def img2img_pipeline(self):
+        """ロード済みの重みを共有するimg2imgパイプライン（初回のみ構築）"""
+        if self.img2img_pipe is None:
+            from diffusers import StableDiffusionXLImg2ImgPipeline
+
+            self.img2img_pipe = StableDiffusionXLImg2ImgPipeline(**self.pipe.components)
+            self.img2img_pipe.set_progress_bar_config(**getattr(self.pipe, "_progress_bar_config", {}))
+            instrument_pipeline(self.img2img_pipe)
+        return self.img2img_pipe
+
+    def lookup_cached(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """同一入力の生成済み画像があれば結果を返す（force指定時は常に再生成）"""
+        if self.result_cache is None or request.get("force"):
+            return None
+
+        inputs = self.cache_inputs(request)
+        key = cache_key(inputs)
+        output_path = self.result_cache.lookup(key, request["output_dir"])
+        if output_path is None:
+            return None
+
+        params = self.resolve_parameters(request)
+        print(f"♻️ 生成済み画像を再利用 ({request['position']}): {output_path}")
+        return {
+            "success": True,
+            "output_path": output_path,
+            "filename": os.path.basename(output_path),
+            "generation_time": 0.0,
+            "position": request["position"],
+            "description": request.get("description", ""),
+            "seed": inputs["seed"],
+            "speed_profile": params["speed_profile"],
+            "scheduler": params.get("scheduler", "default"),
+            "steps": params["num_inference_steps"],
+            "cached": True,
+            "cache_key": key
+        }
+
+    def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """単一画像生成"""
+        return self.generate_batch([request], max_batch_size=1)[0]
+
+    def generate_batch(self, requests: List[Dict[str, Any]], max_batch_size: int = 4) -> List[Dict[str, Any]]:
+        """複数画像をまとめて生成（パラメータが同じものを1回のパイプライン呼び出しに集約）
+
+        結果はリクエストと同じ順序で返す。メモリ不足時はバッチサイズを半減して再試行する。
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        # 前回の呼び出しの終了後に届いた中断要求は持ち越さない
+        self.interrupt_requested = False
+
+        # img2img の元画像（直前に生成したプレビュー等）は書き込み完了後に読む
+        if self.writer is not None and any(request.get("init_image") for request in requests):
+            self.writer.wait()
+
+        groups: Dict[Tuple, List[int]] = {}
+        resumes: List[Tuple[int, Dict[str, Any]]] = []
+        for index, request in enumerate(requests):
+            # 不正なリクエスト（position・output_dir の欠落等）はその1件だけ失敗にし、他のリクエストは生成する
+            try:
+                cached = self.lookup_cached(request)
+                if cached is not None:
+                    results[index] = cached
+                    continue
+                if request.get("resume") and not request.get("init_image"):
+                    # 途中経過は同じスケジューラーで保存したものだけ使う
+                    scheduler = get_scheduler(self.pipe, self.resolve_parameters(request).get("scheduler"))
+                    checkpoint = load_checkpoint(request, cache_key(self.cache_inputs(request)), scheduler)
+                    if checkpoint is not None:
+                        resumes.append((index, checkpoint))
+                        continue
+                groups.setdefault(batch_key(self.resolve_parameters(request)), []).append(index)
+            except Exception as e:
+                results[index] = error_result(request, e)
+
+        try:
+            # チェックポイントからの再開は途中ステップが画像ごとに異なるため1枚ずつ
+            for index, checkpoint in resumes:
+                print(f"⏯️ チェックポイントから再開 ({requests[index]['position']}): "
+                      f"ステップ {checkpoint['step']}/{checkpoint['total_steps']}")
+                try:
+                    results[index] = self._generate_chunk([requests[index]], checkpoint)[0]
+                except GenerationInterrupted:
+                    raise
+                except Exception as e:
+                    results[index] = error_result(requests[index], e)
+
+            for indices in groups.values():
+                batch_size = max(1, max_batch_size)
+                pending = list(indices)
+
+                while pending:
+                    chunk = pending[:batch_size]
+                    try:
+                        chunk_results = self._generate_chunk([requests[i] for i in chunk])
+                    except GenerationInterrupted:
+                        raise
+                    except Exception as e:
+                        if is_out_of_memory(e) and batch_size > 1:
+                            batch_size = max(1, batch_size // 2)
+                            print(f"⚠️ メモリ不足のためバッチサイズを {batch_size} に縮小して再試行")
+                            release_memory()
+                            continue
+                        chunk_results = [error_result(requests[i], e) for i in chunk]
+
+                    for index, result in zip(chunk, chunk_results):
+                        results[index] = result
+                    pending = pending[len(chunk):]
+
+        except GenerationInterrupted as e:
+            self.interrupt_requested = False
+            print(f"⏸️ 生成を中断しました: {e}")
+            for index, request in enumerate(requests):
+                if results[index] is None:
+                    results[index] = {
+                        "success": False,
+                        "interrupted": True,
+                        "error": f"中断: {e}",
+                        "position": request["position"]
+                    }
+
+        return results
+
+    def _generate_chunk(self, requests: List[Dict[str, Any]],
+                        checkpoint: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """同一パラメータのリクエスト群を1回のパイプライン呼び出しで生成（checkpoint 指定時はその続きから）"""
+        import torch
+
+        params = self.resolve_parameters(requests[0])
+        seeds = [self.resolve_parameters(request)["seed"] for request in requests]
+        stages_before = self.stage_seconds()
+        start_time = time.time()
+
+        prompts = [request["prompt"] for request in requests]
+        negative_prompts = [request.get("negative_prompt", "") for request in requests]
+        # 同一プロンプトのバリエーションは1回分の埋め込みを num_images_per_prompt で複製（シードは画像ごと）
+        images_per_prompt = len(requests) if len(set(zip(prompts, negative_prompts))) == 1 else 1
+        if images_per_prompt > 1:
+            prompts, negative_prompts = prompts[:1], negative_prompts[:1]
+
+        memory_profile = self.apply_memory_profile(params.get("memory_profile"))
+        self.apply_speed_profile(params)
+
+        if self.embedding_cache is not None:
+            with span("text_encode", images=len(requests)):
+                text_inputs = self.embedding_cache.pipeline_kwargs(self.pipe, prompts, negative_prompts)
+            # 埋め込みを得た後はデノイズ中に不要なテキストエンコーダーを解放
+            if MEMORY_PROFILES[memory_profile].get("unload_text_encoders"):
+                from .memory import unload_text_encoders
+
+                unload_text_encoders(self.pipelines())
+        else:
+            # 埋め込みキャッシュなしではパイプライン内でエンコードするため解放できない
+            self.ensure_text_encoders()
+            text_inputs = {"prompt": prompts, "negative_prompt": negative_prompts}
+
+        # 画像ごとのシード（CPU生成器でデバイス間の再現性を確保）
+        generators = [torch.Generator("cpu").manual_seed(seed) for seed in seeds]
+
+        callbacks = []
+        if self.progress is not None:
+            total_steps = params["num_inference_steps"]
+            if requests[0].get("init_image"):
+                total_steps = int(total_steps * params["strength"])
+            elif checkpoint is not None:
+                total_steps = checkpoint["total_steps"] - checkpoint["step"]
+            self.progress.begin([request["position"] for request in requests], total_steps)
+            callbacks.append(self.progress.on_step_end)
+
+        if not requests[0].get("init_image"):
+            # 2次のスケジューラーはステップ境界が異なるため途中保存せず、中断要求での停止のみ行う
+            every = max(int(request.get("checkpoint_every") or 0) for request in requests)
+            checkpointer = StepCheckpointer(
+                requests,
+                [cache_key(self.cache_inputs(request)) for request in requests],
+                generators,
+                every if getattr(self.pipe.scheduler, "order", 1) == 1 else None,
+                params["num_inference_steps"],
+                lambda: self.interrupt_requested,
+                start_step=checkpoint["step"] if checkpoint is not None else 0
+            )
+            callbacks.append(checkpointer.on_step_end)
+
+        step_kwargs = {}
+        if callbacks:
+            step_kwargs["callback_on_step_end"] = chain_callbacks(callbacks)
+
+        # デノイズループ（VAEデコード・キャッシュなし時のテキストエンコードは内側の区間として別計上）
+        with span("denoise", images=len(requests), positions=[request["position"] for request in requests],
+                  width=params["width"], height=params["height"]) as denoise_fields:
+            if checkpoint is not None:
+                # 途中の潜在変数を img2img に渡し、最後に完了したタイムステップの次から再開
+                generators[0].set_state(checkpoint["generator_state"])
+                pipe = self.img2img_pipeline()
+                images = pipe(
+                    **text_inputs,
+                    image=checkpoint["latents"].to(device=self.pipe._execution_device, dtype=self.pipe.unet.dtype),
+                    denoising_start=denoising_start(checkpoint, pipe.scheduler),
+                    num_inference_steps=params["num_inference_steps"],
+                    guidance_scale=params["guidance_scale"],
+                    num_images_per_prompt=images_per_prompt,
+                    generator=generators,
+                    **step_kwargs
+                ).images
+            elif requests[0].get("init_image"):
+                pipe = self.img2img_pipeline()
+                images = pipe(
+                    **text_inputs,
+                    image=[self._load_init_image(request["init_image"], params) for request in requests],
+                    strength=params["strength"],
+                    num_inference_steps=params["num_inference_steps"],
+                    guidance_scale=params["guidance_scale"],
+                    num_images_per_prompt=images_per_prompt,
+                    generator=generators,
+                    **step_kwargs
+                ).images
+            else:
+                pipe = self.pipe
+                images = pipe(
+                    **text_inputs,
+                    width=params["width"],
+                    height=params["height"],
+                    num_inference_steps=params["num_inference_steps"],
+                    guidance_scale=params["guidance_scale"],
+                    num_images_per_prompt=images_per_prompt,
+                    generator=generators,
+                    **step_kwargs
+                ).images
+            denoise_fields["steps"] = getattr(pipe, "num_timesteps", 0)
+
+        batch_time = time.time() - start_time
+        self.batches_run += 1
+
+        if not requests[0].get("init_image"):
+            for request in requests:
+                remove_checkpoint(request)
+
+        if len(requests) > 1:
+            print(f"📦 バッチ生成 {len(requests)}枚: {batch_time:.2f}秒 ({batch_time / len(requests):.2f}秒/枚)")
+
+        results = []
+        for request, image, seed in zip(requests, images, seeds):
+            output_dir = request["output_dir"]
+            os.makedirs(output_dir, exist_ok=True)
+
+            filename = build_filename(request)
+            output_path = os.path.join(output_dir, filename)
+
+            result = {
+                "success": True,
+                "output_path": output_path,
+                "filename": filename,
+                "generation_time": batch_time / len(requests),
+                "position": request["position"],
+                "description": request.get("description", ""),
+                "seed": seed,
+                "speed_profile": params["speed_profile"],
+                "scheduler": params.get("scheduler", "default"),
+                "steps": params["num_inference_steps"],
+                "batch_id": self.batches_run,
+                "batch_size": len(requests),
+                "batch_time": batch_time
+            }
+
+            pnginfo = None
+            on_saved = None
+            if self.result_cache is not None:
+                inputs = self.cache_inputs(request)
+                key = cache_key(inputs)
+                pnginfo = png_metadata(key, inputs)
+                # 書き込み・検証が済んでからインデックスに登録
+                on_saved = partial(self.result_cache.record, key, output_path, request["position"])
+                result["cache_key"] = key
+
+            if self.writer is not None:
+                self.writer.submit(image, output_path, pnginfo=pnginfo, on_saved=on_saved)
+            else:
+                write_png(image, output_path, pnginfo)
+                if on_saved is not None:
+                    on_saved()
+
+            self.requests_served += 1
+            results.append(result)
+
+        self.record_performance(requests, results, params, memory_profile, stages_before,
+                                denoise_fields.get("steps") or params["num_inference_steps"])
+        return results
+
+    @staticmethod
+    def stage_seconds() -> Dict[str, float]:
+        """段階ごとの累計秒数（1回の生成の前後の差分で段階別時間を求める）"""
+        return {stage: entry["seconds"] for stage, entry in get_metrics().summary().items()}
+
+    def record_performance(self, requests: List[Dict[str, Any]], results: List[Dict[str, Any]], params: Dict[str, Any],
+                           memory_profile: str, stages_before: Dict[str, float], steps: int) -> None:
+        """生成した画像ごとの条件・段階別時間（バッチ全体を枚数で割った値）・ピークメモリを性能履歴に記録"""
+        if self.perf_store is None:
+            return
+        from .perf_store import model_name
+
+        images = len(requests)
+        stages = {stage: round((seconds - stages_before.get(stage, 0.0)) / images, 3)
+                  for stage, seconds in self.stage_seconds().items()}
+        denoise = stages.get("denoise")
+        torch_peak = torch_memory().get("peak_allocated")
+        dtype = str(self.pipe.unet.dtype).replace("torch.", "")
+
+        rows = []
+        for request, result in zip(requests, results):
+            rows.append({
+                "source": "generator",
+                "session_id": request.get("session_id") or os.path.basename(os.path.normpath(request["output_dir"])),
+                "position": request["position"],
+                "variation": request.get("variation"),
+                "model": model_name(self.model_path),
+                "device": str(self.pipe._execution_device),
+                "dtype": dtype,
+                "width": params["width"],
+                "height": params["height"],
+                "steps": steps,
+                "scheduler": result["scheduler"],
+                "speed_profile": result["speed_profile"],
+                "memory_profile": memory_profile,
+                "seed": result["seed"],
+                "batch_size": images,
+                "total_seconds": result["generation_time"],
+                "text_encode_seconds": stages.get("text_encode"),
+                "denoise_seconds": denoise,
+                "vae_decode_seconds": stages.get("vae_decode"),
+                "seconds_per_step": denoise / steps if denoise and steps else None,
+                "peak_rss_mb": round(peak_rss() / 1024 / 1024, 1),
+                "torch_peak_mb": round(torch_peak / 1024 / 1024, 1) if torch_peak else None,
+                "output_path": result["output_path"]
+            })
+
+        try:
+            self.perf_store.record(rows)
+        except Exception as e:
+            # 履歴の記録失敗で生成自体は失敗させない
+            print(f"⚠️ 性能履歴の記録エラー: {e}")
+
+    @staticmethod
+    def _load_init_image(path: str, params: Dict[str, Any]):
+        """img2img用の元画像を出力サイズに拡大して読み込み"""
+        from PIL import Image
+
+        with Image.open(path) as image:
+            return image.convert("RGB").resize((params["width"], params["height"]), Image.LANCZOS)
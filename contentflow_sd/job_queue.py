@@ -0,0 +1,217 @@
+"""
+ファイルベースのジョブキュー（lib/job-queue.ts と同じディレクトリ構成・Job JSON形式）
+data/jobs/{pending,processing,completed,failed}/<ジョブID>.json
+
+ジョブの取得は pending → processing への os.rename で行う。rename は同一ファイルシステム上で原子的なため、
+複数のワーカー（Python・Node）が同時に取得しようとしても成功するのは1つだけになる。
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+JOB_QUEUE_DIR = "data/jobs"
+JOB_STATES = ("pending", "processing", "completed", "failed")
+
+
+def iso_now() -> str:
+    """JavaScript の Date.toISOString() と同じ形式の現在時刻"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def write_job_file(path: str, job: Dict[str, Any]) -> None:
+    """Job JSONを一時ファイル経由で書き込み（TS側と同じ2スペースインデント）"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+class JobQueue:
+    """ジョブキューのPython実装"""
+
+    def __init__(self, base_dir: str = JOB_QUEUE_DIR):
+        self.dirs = {state: os.path.join(base_dir, state) for state in JOB_STATES}
+
+    def initialize(self) -> None:
+        """キューディレクトリ作成"""
+        for directory in self.dirs.values():
+            os.makedirs(directory, exist_ok=True)
+
+    def job_path(self, state: str, job_id: str) -> str:
+        """状態ディレクトリ内のジョブファイルパス"""
+        return os.path.join(self.dirs[state], f"{job_id}.json")
+
+    def pending_jobs(self) -> List[str]:
+        """待機中ジョブのファイル名（古い順）"""
+        directory = self.dirs["pending"]
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+        def created(name: str) -> float:
+            try:
+                return os.path.getmtime(os.path.join(directory, name))
+            except OSError:
+                return float("inf")
+
+        return sorted(names, key=lambda name: (created(name), name))
+
+    def claim_next(self, types: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """次のジョブを原子的に取得して processing に移す（対象がなければNone）"""
+        for name in self.pending_jobs():
+            pending_path = os.path.join(self.dirs["pending"], name)
+
+            # 種類だけ先に確認し、扱えないジョブは取得しない
+            try:
+                with open(pending_path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                # 書き込み途中の可能性があるため次回に回す
+                continue
+            if types and job.get("type") not in types:
+                continue
+
+            processing_path = os.path.join(self.dirs["processing"], name)
+            try:
+                os.rename(pending_path, processing_path)
+            except FileNotFoundError:
+                # 他のワーカーが先に取得した
+                continue
+
+            # 取得後に読み直す（確認後にリトライ情報が更新されている場合がある）
+            try:
+                with open(processing_path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                # 読めないジョブは processing に残さず failed に移して次のジョブへ
+                self._fail_unreadable(name, e)
+                continue
+            job["status"] = "processing"
+            job["startedAt"] = iso_now()
+            write_job_file(processing_path, job)
+            return job
+
+        return None
+
+    def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> None:
+        """ジョブ完了（結果は data.result に記録）"""
+        job["status"] = "completed"
+        job["completedAt"] = iso_now()
+        if result:
+            job["data"]["result"] = result
+
+        write_job_file(self.job_path("completed", job["id"]), job)
+        self._remove_processing(job["id"])
+        print(f"✅ ジョブ完了: {job['id']}")
+
+    def fail(self, job: Dict[str, Any], error: str) -> None:
+        """ジョブ失敗（最大リトライ回数まではキューに戻す）"""
+        job["retryCount"] = job.get("retryCount", 0) + 1
+        job["error"] = error
+
+        if job["retryCount"] < job.get("maxRetries", 3):
+            job["status"] = "pending"
+            write_job_file(self.job_path("pending", job["id"]), job)
+            print(f"🔄 ジョブ再試行 {job['retryCount']}/{job.get('maxRetries', 3)}: {job['id']}")
+        else:
+            job["status"] = "failed"
+            job["completedAt"] = iso_now()
+            write_job_file(self.job_path("failed", job["id"]), job)
+            print(f"❌ ジョブ失敗（リトライ上限）: {job['id']}")
+
+        self._remove_processing(job["id"])
+
+    def release(self, job: Dict[str, Any]) -> None:
+        """中断したジョブをリトライ回数を増やさずキューに戻す"""
+        job["status"] = "pending"
+        job.pop("startedAt", None)
+        write_job_file(self.job_path("pending", job["id"]), job)
+        self._remove_processing(job["id"])
+        print(f"⏸️ ジョブをキューに戻しました: {job['id']}")
+
+    def add(self, job_id: str, job_type: str, data: Dict[str, Any], max_retries: int = 3) -> Dict[str, Any]:
+        """ジョブをキューに追加"""
+        job = {
+            "id": job_id,
+            "type": job_type,
+            "status": "pending",
+            "data": data,
+            "createdAt": iso_now(),
+            "retryCount": 0,
+            "maxRetries": max_retries
+        }
+        write_job_file(self.job_path("pending", job_id), job)
+        return job
+
+    def heartbeat(self, job: Dict[str, Any]) -> None:
+        """処理中ジョブの更新時刻を更新（requeue_stale で停止扱いされないように）"""
+        try:
+            os.utime(self.job_path("processing", job["id"]), None)
+        except OSError:
+            pass
+
+    def requeue_stale(self, max_age: float) -> List[str]:
+        """一定時間更新のない処理中ジョブ（停止したワーカーのもの）をキューに戻す"""
+        requeued = []
+        directory = self.dirs["processing"]
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return requeued
+
+        now = time.time()
+        for name in names:
+            processing_path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(processing_path) < max_age:
+                    continue
+                os.rename(processing_path, os.path.join(self.dirs["pending"], name))
+            except OSError:
+                continue
+            requeued.append(os.path.splitext(name)[0])
+        return requeued
+
+    def stats(self) -> Dict[str, int]:
+        """状態ごとのジョブ数"""
+        counts = {}
+        for state, directory in self.dirs.items():
+            try:
+                counts[state] = sum(1 for name in os.listdir(directory) if name.endswith(".json"))
+            except FileNotFoundError:
+                counts[state] = 0
+        return counts
+
+    def _fail_unreadable(self, name: str, error: Exception) -> None:
+        """取得後に読み込めなかったジョブファイルを failed に移す（元の内容は data.raw に残す）"""
+        job_id = os.path.splitext(name)[0]
+        try:
+            with open(self.job_path("processing", job_id), 'r', encoding='utf-8', errors='replace') as f:
+                raw = f.read()
+        except OSError:
+            raw = None
+
+        job = {
+            "id": job_id,
+            "status": "failed",
+            "data": {"raw": raw},
+            "error": f"ジョブファイルを読み込めません: {error}",
+            "completedAt": iso_now(),
+            "retryCount": 0,
+            "maxRetries": 0
+        }
+        write_job_file(self.job_path("failed", job_id), job)
+        self._remove_processing(job_id)
+        print(f"❌ ジョブファイル破損: {job_id} ({error})")
+
+    def _remove_processing(self, job_id: str) -> None:
+        path = self.job_path("processing", job_id)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+画像生成ジョブワーカー（Python）
+data/jobs/pending の image-generation ジョブをプロセス内のパイプラインで直接生成する
+（Node ワーカー → Python スクリプト起動の経路を通らず、モデルのロードは最初に生成が必要になった時点の1回のみ）
+
+Usage:
+    python -m contentflow_sd.job_worker              # キューを監視し続ける
+    python -m contentflow_sd.job_worker --once       # 待機中ジョブを処理し終えたら終了
+    python -m contentflow_sd.job_worker --checkpoint-every 10
+
+ジョブは os.rename で原子的に取得するため、複数のワーカーを並行して起動できる。
+Sanity へのアップロードは image-upload ジョブとしてキューに追加し、Node ワーカーが処理する。
+SIGTERM を受けると生成中の画像をチェックポイント保存し、ジョブをキューに戻して終了する。
+"""
+
+import os
+import json
+import time
+import uuid
+import signal
+import argparse
+from typing import Dict, Any, List
+
+from .settings import MODEL_PATH, OUTPUT_BASE_DIR, CHECKPOINT_INTERVAL
+from .writer import apply_write_failures
+from .job_queue import JobQueue, JOB_QUEUE_DIR
+from .validation import validate_prompt_config
+
+POLL_INTERVAL = 5.0  # lib/job-queue.ts のワーカーと同じ5秒
+
+
+class JobWorker:
+    """image-generation ジョブを処理するワーカー"""
+
+    def __init__(self, generator, queue: JobQueue, batch_size: int = 1,
+                 checkpoint_every: int = CHECKPOINT_INTERVAL, upload: bool = True):
+        self.generator = generator
+        self.queue = queue
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.upload = upload
+        self.stopping = False
+        self.jobs_processed = 0
+
+    def stop(self) -> None:
+        """生成中の画像をチェックポイント保存して停止（シグナルハンドラーから呼ぶ）"""
+        self.stopping = True
+        self.generator.interrupt()
+
+    def write_prompt_config(self, job: Dict[str, Any]) -> str:
+        """Node ワーカーと同じプロンプト設定ファイル（data/jobs/configs/<ジョブID>.json）"""
+        job_data = job["data"]
+        config = {
+            "prompts": job_data["prompts"],
+            "article_info": {
+                "title": job_data.get("title", ""),
+                "estimated_scenes": len(job_data["prompts"]),
+                "style": job_data.get("style", ""),
+                "theme": "auto-generated"
+            }
+        }
+        # モデルで生成を始める前に不正なプロンプト（重複ポジション・範囲外のパラメータ等）で失敗させる
+        errors = validate_prompt_config(config)["errors"]
+        if errors:
+            raise ValueError(f"プロンプト設定が無効です: {'; '.join(errors)}")
+        config_path = os.path.join(os.path.dirname(self.queue.dirs["pending"]), "configs", f"{job['id']}.json")
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        return config_path
+
+    def build_requests(self, job: Dict[str, Any], output_dir: str) -> List[Dict[str, Any]]:
+        """ジョブのプロンプトから生成リクエストを作成（scripts/auto-sd-generator.py と同じ形式）"""
+        requests = []
+        for prompt_config in job["data"]["prompts"]:
+            parameters = {}
+            if prompt_config.get("seed") is not None:
+                parameters["seed"] = prompt_config["seed"]
+            requests.append({
+                "prompt": prompt_config["prompt"],
+                "negative_prompt": prompt_config.get("negative_prompt", ""),
+                "parameters": parameters,
+                "position": prompt_config["name"],
+                "description": prompt_config.get("description", ""),
+                "output_dir": output_dir,
+                "filename_prefix": prompt_config["filename_prefix"],
+                "variation": 1,
+                "session_id": job["id"],
+                "checkpoint_every": self.checkpoint_every,
+                "resume": True
+            })
+        return requests
+
+    def process(self, job: Dict[str, Any]) -> None:
+        """1件のジョブを生成し、結果に応じて完了・失敗・キューへの差し戻しを記録"""
+        print(f"🎨 ジョブ処理開始: {job['id']} ({len(job['data'].get('prompts', []))}枚)")
+        start_time = time.time()
+
+        try:
+            config_path = self.write_prompt_config(job)
+            output_dir = os.path.join(OUTPUT_BASE_DIR, job["id"])
+            os.makedirs(output_dir, exist_ok=True)
+
+            # 生成中も処理中ファイルを更新し、停止したワーカーのジョブと区別できるようにする
+            self.generator.set_progress_callback(lambda progress: self.queue.heartbeat(job))
+            try:
+                requests = self.build_requests(job, output_dir)
+                results = self.generator.generate_batch(requests, max_batch_size=self.batch_size)
+            finally:
+                self.generator.set_progress_callback(None)
+
+            if any(result.get("interrupted") for result in results):
+                self.generator.flush()
+                self.queue.release(job)
+                return
+
+            apply_write_failures(results, self.generator.flush())
+            failed = [result for result in results if not result["success"]]
+            if failed:
+                raise RuntimeError(f"{len(failed)}枚の生成に失敗: {failed[0].get('error', '')}")
+
+            result = {
+                "generatedFiles": [result["output_path"] for result in results],
+                "outputDir": output_dir,
+                "configPath": config_path,
+                "seeds": {result["position"]: result["seed"] for result in results},
+                "generationTime": round(time.time() - start_time, 1),
+                "worker": f"python:{os.getpid()}"
+            }
+
+            if self.upload and job["data"].get("articleId"):
+                upload_job = self.queue.add(str(uuid.uuid4()), "image-upload", {
+                    "articleId": job["data"]["articleId"],
+                    "outputDir": output_dir,
+                    "generationJobId": job["id"]
+                })
+                result["uploadJobId"] = upload_job["id"]
+
+            self.queue.complete(job, result)
+            self.jobs_processed += 1
+
+        except Exception as e:
+            print(f"❌ ジョブ処理エラー: {job['id']}: {e}")
+            self.queue.fail(job, str(e))
+
+    def run(self, once: bool = False, poll_interval: float = POLL_INTERVAL) -> int:
+        """キューを処理（once=True なら待機中ジョブがなくなった時点で終了）"""
+        while not self.stopping:
+            job = self.queue.claim_next(types=["image-generation"])
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            self.process(job)
+        return self.jobs_processed
+
+
+def main():
+    """メイン処理"""
+    from .client import get_generator
+
+    parser = argparse.ArgumentParser(description='画像生成ジョブワーカー（data/jobs を直接処理）')
+    parser.add_argument('--queue-dir', default=JOB_QUEUE_DIR, help=f'ジョブキューディレクトリ（デフォルト: {JOB_QUEUE_DIR}）')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--no-server', action='store_true', help='常駐生成サーバーを使わずプロセス内でモデルをロード')
+    parser.add_argument('--batch-size', type=int, default=1, help='1回のパイプライン呼び出しでまとめて生成する最大枚数（デフォルト: 1）')
+    parser.add_argument('--once', action='store_true', help='待機中ジョブを処理し終えたら終了')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help=f'キュー確認間隔（秒、デフォルト: {POLL_INTERVAL}）')
+    parser.add_argument('--requeue-stale', type=float, metavar='MINUTES',
+                        help='指定分数以上更新のない処理中ジョブ（停止したワーカーのもの）を起動時にキューに戻す')
+    parser.add_argument('--no-upload', action='store_true', help='Sanityアップロード用の image-upload ジョブを追加しない')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_INTERVAL,
+                        help=f'途中経過を保存するステップ間隔（デフォルト: {CHECKPOINT_INTERVAL}、0でSIGTERM時のみ保存）')
+
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue_dir)
+    queue.initialize()
+
+    if args.requeue_stale:
+        for job_id in queue.requeue_stale(args.requeue_stale * 60):
+            print(f"🔁 停止したワーカーのジョブをキューに戻しました: {job_id}")
+
+    print(f"🤖 画像生成ジョブワーカー起動 (PID: {os.getpid()})")
+    print(f"📋 キュー状況: {queue.stats()}")
+
+    generator = get_generator(args.model_path, use_server=not args.no_server)
+    worker = JobWorker(generator, queue, batch_size=args.batch_size, checkpoint_every=args.checkpoint_every,
+                       upload=not args.no_upload)
+
+    def shutdown(signum, frame):
+        print(f"\n🛑 シグナル {signum} を受信しました。現在のジョブを中断して停止します...")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    processed = worker.run(once=args.once, poll_interval=args.poll_interval)
+    print(f"👋 ワーカー停止: {processed}件のジョブを処理しました")
+
+
+if __name__ == "__main__":
+    main()
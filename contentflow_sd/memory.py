@@ -0,0 +1,281 @@
+"""
+メモリプロファイル（1600x896 の SDXL が OOM キラーで落ちるホスト向けの省メモリ実行）
+settings.MEMORY_PROFILES の設定（アテンション分割・VAEスライス/タイル・CPUオフロード・テキストエンコーダー解放）を
+ロード済みパイプラインに適用する。プロファイルは実行単位（--memory-profile / CONTENTFLOW_MEMORY_PROFILE）と
+プロンプトの parameters.memory_profile で指定でき、切り替え時は差分のみ適用する
+
+Usage:
+    python -m contentflow_sd.memory --benchmark                      # 全プロファイルのピークメモリと生成時間の比較表
+    python -m contentflow_sd.memory --benchmark --profiles default,low --steps 10
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from .settings import MODEL_PATH, DEVICE, MEMORY_PROFILES, MEMORY_PROFILE, DEFAULT_PARAMETERS, STATUS_EVENTS_DIR
+
+
+def resolve_profile(name: Optional[str]) -> str:
+    """プロファイル名の検証（未指定なら既定のプロファイル）"""
+    name = name or MEMORY_PROFILE
+    if name not in MEMORY_PROFILES:
+        raise ValueError(f"不明なメモリプロファイル: {name}（{', '.join(MEMORY_PROFILES)}）")
+    return name
+
+
+def apply_memory_profile(pipe, name: Optional[str], device=None, force: bool = False) -> None:
+    """パイプラインにメモリプロファイルを適用（前回のプロファイルとの差分のみ、force 指定時はデバイス配置をやり直す）"""
+    import torch
+
+    name = resolve_profile(name)
+    current_name = getattr(pipe, "_contentflow_memory_profile", None)
+    if current_name == name and not force:
+        return
+
+    device = str(device or getattr(pipe, "_contentflow_device", None) or pipe.device)
+    profile = MEMORY_PROFILES[name]
+    previous = MEMORY_PROFILES.get(current_name, {})
+
+    # CPU実行ではオフロード先と実行デバイスが同じため、オフロードは行わない
+    offload = profile.get("offload")
+    if offload and torch.device(device).type == "cpu":
+        offload = None
+
+    current_offload = getattr(pipe, "_contentflow_offload", None)
+    if force or offload != current_offload:
+        if current_offload:
+            pipe.remove_all_hooks()
+        if offload == "model":
+            pipe.enable_model_cpu_offload(device=device)
+        elif offload == "sequential":
+            pipe.enable_sequential_cpu_offload(device=device)
+        else:
+            pipe.to(device)
+        pipe._contentflow_offload = offload
+
+    if profile.get("attention_slicing") != previous.get("attention_slicing"):
+        if profile.get("attention_slicing"):
+            pipe.enable_attention_slicing()
+        else:
+            pipe.disable_attention_slicing()
+
+    if profile.get("vae_slicing") != previous.get("vae_slicing"):
+        if profile.get("vae_slicing"):
+            pipe.vae.enable_slicing()
+        else:
+            pipe.vae.disable_slicing()
+
+    if profile.get("vae_tiling") != previous.get("vae_tiling"):
+        if profile.get("vae_tiling"):
+            pipe.vae.enable_tiling()
+        else:
+            pipe.vae.disable_tiling()
+
+    pipe._contentflow_device = device
+    pipe._contentflow_memory_profile = name
+    if current_name is not None and current_name != name:
+        print(f"🧮 メモリプロファイル切り替え: {current_name} → {name}")
+
+
+def text_encoders_loaded(pipe) -> bool:
+    """テキストエンコーダーがロードされているか"""
+    return pipe.text_encoder is not None and pipe.text_encoder_2 is not None
+
+
+def unload_text_encoders(pipes: List[Any]) -> None:
+    """テキストエンコーダーを解放（pipes[0] はオフロードフックを持つメインのパイプライン）"""
+    from .generator import release_memory
+
+    if not text_encoders_loaded(pipes[0]):
+        return
+
+    for pipe in pipes:
+        pipe.text_encoder = None
+        pipe.text_encoder_2 = None
+
+    # モデルオフロードのフックがエンコーダーを参照し続けるため、エンコーダー抜きで掛け直す
+    if getattr(pipes[0], "_contentflow_offload", None):
+        apply_memory_profile(pipes[0], pipes[0]._contentflow_memory_profile, force=True)
+    release_memory()
+
+
+def load_text_encoders(pipes: List[Any], model_path: str) -> None:
+    """解放したテキストエンコーダーをモデルディレクトリから再ロード"""
+    from transformers import CLIPTextModel, CLIPTextModelWithProjection
+    from .pipeline import weights_source
+
+    if text_encoders_loaded(pipes[0]):
+        return
+
+    print("🔤 テキストエンコーダー再ロード中...")
+    dtype = pipes[0].unet.dtype
+    source, use_safetensors = weights_source(model_path)
+    text_encoder = CLIPTextModel.from_pretrained(source, subfolder="text_encoder", torch_dtype=dtype,
+                                                 use_safetensors=use_safetensors)
+    text_encoder_2 = CLIPTextModelWithProjection.from_pretrained(source, subfolder="text_encoder_2", torch_dtype=dtype,
+                                                                 use_safetensors=use_safetensors)
+    for pipe in pipes:
+        pipe.text_encoder = text_encoder
+        pipe.text_encoder_2 = text_encoder_2
+
+    # デバイスへの配置・オフロードフックをやり直す
+    apply_memory_profile(pipes[0], getattr(pipes[0], "_contentflow_memory_profile", None), force=True)
+
+
+def measure_profile(profile: str, model_path: str, device: str, steps: int, width: int, height: int) -> Dict[str, Any]:
+    """1プロファイルを現在のプロセスで計測（ロード → 2枚生成、2枚目はテキストエンコーダー解放後の状態）"""
+    import time
+    import torch
+    from .generator import LocalGenerator
+    from .metrics import peak_rss
+
+    # 埋め込みキャッシュを含め、前のプロファイルの計測結果を使わないよう一時ディレクトリで実行
+    model_path = os.path.abspath(model_path)
+    output_dir = tempfile.mkdtemp(prefix=f"memory-{profile}-")
+    os.chdir(output_dir)
+    load_started = time.perf_counter()
+    generator = LocalGenerator.from_model(
+        model_path,
+        device=device,
+        memory_profile=profile,
+        use_result_cache=False,
+        background_write=False
+    )
+    load_time = time.perf_counter() - load_started
+    rss_after_load = peak_rss()
+
+    timings = []
+    for index in range(2):
+        request = {
+            "prompt": "modern minimalist workspace with laptop, natural morning light",
+            "negative_prompt": "text, watermark",
+            "parameters": {"width": width, "height": height, "num_inference_steps": steps, "seed": index},
+            "position": f"memory-{index}",
+            "output_dir": "output",
+            "force": True
+        }
+        started = time.perf_counter()
+        result = generator.generate(request)
+        if not result["success"]:
+            raise RuntimeError(result.get("error"))
+        timings.append(time.perf_counter() - started)
+
+    measurement = {
+        "profile": profile,
+        "settings": MEMORY_PROFILES[profile],
+        "modelLoadSeconds": round(load_time, 2),
+        "firstImageSeconds": round(timings[0], 2),
+        "imageSeconds": round(timings[1], 2),
+        "secondsPerStep": round(timings[1] / steps, 3),
+        "peakRssMB": round(peak_rss() / (1024 * 1024), 1),
+        "rssAfterLoadMB": round(rss_after_load / (1024 * 1024), 1)
+    }
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        measurement["peakTorchAllocatedMB"] = round(torch.cuda.max_memory_allocated() / (1024 * 1024), 1)
+    if hasattr(torch, "mps") and torch.backends.mps.is_available():
+        measurement["torchDriverAllocatedMB"] = round(torch.mps.driver_allocated_memory() / (1024 * 1024), 1)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return measurement
+
+
+def run_benchmark(profiles: List[str], model_path: str, device: str, steps: int, width: int, height: int) -> List[Dict[str, Any]]:
+    """プロファイルごとに別プロセスで計測（ピークRSSをプロファイル間で独立させる）"""
+    measurements = []
+    for profile in profiles:
+        print(f"\n▶️ {profile}: {MEMORY_PROFILES[profile] or '最適化なし'}")
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            result_path = f.name
+        command = [sys.executable, "-m", "contentflow_sd.memory", "--measure", profile, "--model-path", model_path,
+                   "--device", device, "--steps", str(steps), "--width", str(width), "--height", str(height),
+                   "--output", result_path]
+        try:
+            completed = subprocess.run(command)
+            if completed.returncode != 0:
+                # OOMキラーによる強制終了（-9）も結果として残す
+                measurements.append({"profile": profile, "settings": MEMORY_PROFILES[profile],
+                                     "error": f"exit {completed.returncode}"})
+                continue
+            with open(result_path, 'r', encoding='utf-8') as f:
+                measurements.append(json.load(f))
+        finally:
+            os.remove(result_path)
+    return measurements
+
+
+def format_table(measurements: List[Dict[str, Any]]) -> str:
+    """計測結果のMarkdown表"""
+    lines = [
+        "| プロファイル | ピークRSS (MB) | ロード (秒) | 1枚目 (秒) | 2枚目 (秒) | 秒/ステップ |",
+        "|---|---:|---:|---:|---:|---:|"
+    ]
+    for m in measurements:
+        if "error" in m:
+            lines.append(f"| {m['profile']} | 失敗 ({m['error']}) | | | | |")
+            continue
+        lines.append(f"| {m['profile']} | {m['peakRssMB']} | {m['modelLoadSeconds']} | {m['firstImageSeconds']} "
+                     f"| {m['imageSeconds']} | {m['secondsPerStep']} |")
+    return "\n".join(lines)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='メモリプロファイルのピークメモリ・生成時間比較')
+    parser.add_argument('--benchmark', action='store_true', help='全プロファイル（または --profiles）を計測して比較表を表示')
+    parser.add_argument('--profiles', help=f'計測するプロファイル（カンマ区切り、デフォルト: {",".join(MEMORY_PROFILES)}）')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--device', default=DEVICE, help=f'実行デバイス（デフォルト: {DEVICE}）')
+    parser.add_argument('--steps', type=int, default=DEFAULT_PARAMETERS["num_inference_steps"], help='推論ステップ数')
+    parser.add_argument('--width', type=int, default=DEFAULT_PARAMETERS["width"], help='画像幅')
+    parser.add_argument('--height', type=int, default=DEFAULT_PARAMETERS["height"], help='画像高さ')
+    parser.add_argument('--output', help='計測結果JSONの保存先')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.measure:
+        result = measure_profile(args.measure, args.model_path, args.device, args.steps, args.width, args.height)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    profiles = [name.strip() for name in args.profiles.split(",")] if args.profiles else list(MEMORY_PROFILES)
+    for name in profiles:
+        try:
+            resolve_profile(name)
+        except ValueError as e:
+            parser.error(str(e))
+
+    print(f"🧮 メモリプロファイル比較: {args.width}x{args.height} / {args.steps}ステップ / {args.device}")
+    measurements = run_benchmark(profiles, args.model_path, args.device, args.steps, args.width, args.height)
+
+    print(f"\n{format_table(measurements)}")
+
+    output = args.output or os.path.join(STATUS_EVENTS_DIR, f"memory-profiles-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "modelPath": args.model_path,
+            "device": args.device,
+            "width": args.width,
+            "height": args.height,
+            "steps": args.steps,
+            "measuredAt": datetime.now().isoformat(),
+            "profiles": measurements
+        }, f, ensure_ascii=False, indent=2)
+    print(f"📄 結果保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
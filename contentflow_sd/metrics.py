@@ -0,0 +1,310 @@
+"""
+段階別の計測（時間・メモリ）
+モデルロード・テキストエンコード・デノイズループ・VAEデコード・画像エンコード・ディスク書き込みを区間（span）として計測し、
+1区間1行のJSONL（logs/image-generation/metrics.jsonl）と Prometheus の textfile collector 形式
+（logs/metrics/contentflow_sd_<プロセス名>.prom）に出力する
+
+区間の時間は入れ子の内側の区間を除いた排他時間（デノイズループの時間にVAEデコードは含まれない）。
+メモリは区間終了時のRSS・区間中の増減・プロセスのピークRSSと、torch のアロケーター統計（CUDA / MPS のみ）。
+textfile はプロセスごとに別ファイルで、一時ファイル → rename で置き換えるため node_exporter が書きかけを読まない。
+CONTENTFLOW_METRICS=0 で無効化できる。
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from .settings import METRICS_ENABLED, METRICS_EVENTS_FILE, METRICS_TEXTFILE_DIR
+
+METRIC_PREFIX = "contentflow_sd"
+MB = 1024 * 1024
+
+
+def process_name() -> str:
+    """実行中のスクリプト名（textfile のファイル名と process ラベルに使う）"""
+    name = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+    return "".join(char if char.isalnum() or char in "-_" else "_" for char in name)
+
+
+def current_rss() -> Optional[int]:
+    """現在のRSS（バイト、/proc がない環境ではNone）"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> int:
+    """プロセス開始以降のピークRSS（バイト）"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def torch_memory() -> Dict[str, int]:
+    """torch アロケーターの使用量（torch 読み込み済みかつ CUDA / MPS の場合のみ）"""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return {}
+
+    try:
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            return {
+                "allocated": torch.cuda.memory_allocated(),
+                "reserved": torch.cuda.memory_reserved(),
+                "peak_allocated": torch.cuda.max_memory_allocated()
+            }
+        if hasattr(torch, "mps") and torch.backends.mps.is_available():
+            return {
+                "allocated": torch.mps.current_allocated_memory(),
+                "reserved": torch.mps.driver_allocated_memory()
+            }
+    except Exception:
+        pass
+    return {}
+
+
+def escape_label(value: str) -> str:
+    """Prometheus のラベル値エスケープ"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics:
+    """区間計測の集計と出力"""
+
+    def __init__(self, events_file: str = METRICS_EVENTS_FILE, textfile_dir: Optional[str] = METRICS_TEXTFILE_DIR,
+                 enabled: bool = METRICS_ENABLED, process: Optional[str] = None):
+        self.events_file = events_file
+        self.textfile_dir = textfile_dir
+        self.enabled = enabled
+        self.process = process or process_name()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.steps = 0
+        self.images = 0
+
+    def configure(self, process: Optional[str] = None, textfile_dir: Optional[str] = None) -> None:
+        """プロセス名・textfile 出力先を変更（fork したワーカーが親と別ファイルに書くため）"""
+        with self.lock:
+            if process:
+                self.process = process
+                self.stages = {}
+                self.steps = 0
+                self.images = 0
+            if textfile_dir is not None:
+                self.textfile_dir = textfile_dir
+
+    @property
+    def textfile(self) -> Optional[str]:
+        """Prometheus textfile のパス"""
+        if not self.textfile_dir:
+            return None
+        return os.path.join(self.textfile_dir, f"{METRIC_PREFIX}_{self.process}.prom")
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        """区間を計測（with 内で返される辞書に steps・images などの項目を追加できる）
+
+        同じ段階の区間が入れ子になった場合（キャッシュ経由のエンコード等）は外側の1区間として扱う。
+        """
+        stack = self.local.__dict__.setdefault("stack", [])
+        if not self.enabled or (stack and stack[-1]["stage"] == stage):
+            yield fields
+            return
+
+        frame = {"stage": stage, "children": 0.0, "rss": current_rss(), "started": time.perf_counter()}
+        stack.append(frame)
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame["started"]
+            if stack:
+                stack[-1]["children"] += elapsed
+            try:
+                self.record(stage, elapsed - frame["children"], elapsed, frame["rss"], fields)
+            except Exception as e:
+                # 計測の失敗で生成を止めない
+                print(f"⚠️ 計測記録エラー ({stage}): {e}")
+
+    def record(self, stage: str, seconds: float, total_seconds: float, rss_before: Optional[int],
+               fields: Dict[str, Any]) -> None:
+        """区間の結果を集計してJSONL・textfile に出力"""
+        rss = current_rss()
+        peak = peak_rss()
+        allocator = torch_memory()
+
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "process": self.process,
+            "pid": os.getpid(),
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "totalSeconds": round(total_seconds, 4),
+            "peakRssMB": round(peak / MB, 1)
+        }
+        if rss is not None:
+            event["rssMB"] = round(rss / MB, 1)
+            if rss_before is not None:
+                event["rssDeltaMB"] = round((rss - rss_before) / MB, 1)
+        if allocator:
+            event["torchAllocatedMB"] = round(allocator["allocated"] / MB, 1)
+            event["torchReservedMB"] = round(allocator["reserved"] / MB, 1)
+        if fields.get("steps"):
+            event["secondsPerStep"] = round(seconds / fields["steps"], 4)
+        event.update(fields)
+
+        with self.lock:
+            totals = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "errors": 0})
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["last_seconds"] = seconds
+            totals["peak_rss"] = peak
+            if rss is not None:
+                totals["rss"] = rss
+                if rss_before is not None:
+                    totals["rss_delta"] = rss - rss_before
+            if allocator:
+                totals["torch"] = allocator
+            if "error" in fields:
+                totals["errors"] += 1
+            if fields.get("steps"):
+                totals["steps"] = totals.get("steps", 0) + fields["steps"]
+                totals["seconds_per_step"] = seconds / fields["steps"]
+                self.steps += fields["steps"]
+            if stage == "denoise" and "error" not in fields:
+                self.images += fields.get("images", 0)
+
+            self._append_event(event)
+            self._write_textfile()
+
+    def summary(self) -> Dict[str, Any]:
+        """段階ごとの集計（生成統計・ヘルスチェック用）"""
+        with self.lock:
+            summary = {}
+            for stage, totals in self.stages.items():
+                entry = {
+                    "calls": totals["calls"],
+                    "seconds": round(totals["seconds"], 3),
+                    "peak_rss_mb": round(totals["peak_rss"] / MB, 1)
+                }
+                if "seconds_per_step" in totals:
+                    entry["steps"] = totals["steps"]
+                    entry["seconds_per_step"] = round(totals["seconds"] / totals["steps"], 4)
+                if "rss" in totals:
+                    entry["rss_mb"] = round(totals["rss"] / MB, 1)
+                summary[stage] = entry
+            return summary
+
+    def _append_event(self, event: Dict[str, Any]) -> None:
+        directory = os.path.dirname(os.path.abspath(self.events_file))
+        os.makedirs(directory, exist_ok=True)
+        line = json.dumps(event, ensure_ascii=False, separators=(',', ':'), default=str) + "\n"
+        # 1行1回の write で追記（複数プロセスが同じファイルに書いても行が混ざらない）
+        fd = os.open(self.events_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _write_textfile(self) -> None:
+        path = self.textfile
+        if path is None:
+            return
+
+        lines = []
+
+        def metric(name: str, metric_type: str, help_text: str, samples) -> None:
+            samples = list(samples)
+            if not samples:
+                return
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{escape_label(str(label))}"'
+                                      for key, label in [("process", self.process)] + labels)
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+
+        stages = sorted(self.stages.items())
+        metric("stage_seconds_total", "counter", "Exclusive time spent in each generation stage.",
+               (([("stage", stage)], float(totals["seconds"])) for stage, totals in stages))
+        metric("stage_calls_total", "counter", "Number of completed spans per stage.",
+               (([("stage", stage)], totals["calls"]) for stage, totals in stages))
+        metric("stage_errors_total", "counter", "Number of spans per stage that raised an exception.",
+               (([("stage", stage)], totals["errors"]) for stage, totals in stages))
+        metric("stage_last_seconds", "gauge", "Exclusive time of the most recent span per stage.",
+               (([("stage", stage)], float(totals["last_seconds"])) for stage, totals in stages))
+        metric("stage_seconds_per_step", "gauge", "Seconds per denoise step in the most recent span.",
+               (([("stage", stage)], float(totals["seconds_per_step"])) for stage, totals in stages
+                if "seconds_per_step" in totals))
+        metric("stage_rss_bytes", "gauge", "Resident set size at the end of the most recent span per stage.",
+               (([("stage", stage)], totals["rss"]) for stage, totals in stages if "rss" in totals))
+        metric("stage_rss_delta_bytes", "gauge", "RSS change during the most recent span per stage.",
+               (([("stage", stage)], totals["rss_delta"]) for stage, totals in stages if "rss_delta" in totals))
+        metric("stage_torch_allocated_bytes", "gauge", "Torch allocator memory at the end of the most recent span.",
+               (([("stage", stage)], totals["torch"]["allocated"]) for stage, totals in stages if "torch" in totals))
+        metric("stage_torch_reserved_bytes", "gauge", "Torch allocator reserved memory at the end of the most recent span.",
+               (([("stage", stage)], totals["torch"]["reserved"]) for stage, totals in stages if "torch" in totals))
+        metric("denoise_steps_total", "counter", "Denoise steps executed.", [([], self.steps)])
+        metric("images_total", "counter", "Images produced by completed denoise spans.", [([], self.images)])
+        metric("peak_rss_bytes", "gauge", "Peak resident set size of the process.", [([], peak_rss())])
+        metric("last_span_timestamp_seconds", "gauge", "Unix time of the most recent span.", [([], time.time())])
+
+        os.makedirs(self.textfile_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+
+def format_stages(summary: Dict[str, Any]) -> str:
+    """段階別集計の1行表示（時間の長い順）"""
+    parts = []
+    for stage, entry in sorted(summary.items(), key=lambda item: -item[1]["seconds"]):
+        text = f"{stage} {entry['seconds']:.1f}秒"
+        if "seconds_per_step" in entry:
+            text += f" ({entry['seconds_per_step']:.2f}秒/ステップ)"
+        parts.append(text)
+    return " / ".join(parts)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """プロセス共通の計測インスタンス"""
+    return _metrics
+
+
+def span(stage: str, **fields):
+    """プロセス共通の計測インスタンスで区間を計測"""
+    return _metrics.span(stage, **fields)
+
+
+def instrument_pipeline(pipe) -> None:
+    """パイプライン内部のテキストエンコード・VAEデコードを区間として計測（同じパイプラインには1回だけ）"""
+    def wrap(owner, attribute: str, stage: str) -> None:
+        original = getattr(owner, attribute)
+        if getattr(original, "_contentflow_stage", None):
+            return
+
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return original(*args, **kwargs)
+
+        wrapper._contentflow_stage = stage
+        setattr(owner, attribute, wrapper)
+
+    wrap(pipe, "encode_prompt", "text_encode")
+    if getattr(pipe, "vae", None) is not None:
+        wrap(pipe.vae, "decode", "vae_decode")
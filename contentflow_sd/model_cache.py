@@ -0,0 +1,331 @@
+"""
+モデルのsafetensors変換キャッシュ
+.bin（pickle）形式の重みを一度だけ safetensors に変換して MODEL_CACHE_DIR に保存し、
+以降のロードはメモリマップで行う（起動のたびに全重みを unpickle しない）。
+キャッシュはモデルディレクトリの絶対パスと重みファイルのサイズ・更新時刻で識別し、モデルを更新すると作り直す。
+重みの精度は元のまま変換する（ロード時の torch_dtype でこれまでどおり変換される）
+
+Usage:
+    python -m contentflow_sd.model_cache                   # 変換（変換済みなら何もしない）
+    python -m contentflow_sd.model_cache --status          # キャッシュの状態を表示
+    python -m contentflow_sd.model_cache --benchmark       # .bin / キャッシュのコールド・ウォーム起動時間を比較
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from .settings import MODEL_PATH, MODEL_CACHE_DIR, DEVICE, DEFAULT_PARAMETERS, STATUS_EVENTS_DIR
+
+CACHE_MANIFEST = "contentflow-model-cache.json"
+WEIGHT_PREFIXES = ("pytorch_model", "diffusion_pytorch_model")
+
+
+def is_weight_file(filename: str) -> bool:
+    """変換対象の .bin 重みファイル（シャード・インデックスを含む）"""
+    return filename.startswith(WEIGHT_PREFIXES) and (filename.endswith(".bin") or filename.endswith(".bin.index.json"))
+
+
+def safetensors_name(filename: str) -> str:
+    """.bin 重みファイル名に対応する safetensors のファイル名（transformers / diffusers の命名規則）"""
+    index_suffix = ".index.json" if filename.endswith(".index.json") else ""
+    name = filename[:-len(".bin" + index_suffix)]
+    if name.startswith("pytorch_model"):
+        name = "model" + name[len("pytorch_model"):]
+    return f"{name}.safetensors{index_suffix}"
+
+
+def weight_files(model_path: str) -> List[str]:
+    """モデルディレクトリ内の .bin 重みファイル（相対パス）"""
+    files = []
+    for root, _, filenames in os.walk(model_path):
+        for filename in filenames:
+            if is_weight_file(filename):
+                files.append(os.path.relpath(os.path.join(root, filename), model_path))
+    return sorted(files)
+
+
+def source_key(model_path: str) -> str:
+    """モデルディレクトリの絶対パスと重みファイルのサイズ・更新時刻から作るキャッシュキー"""
+    model_path = os.path.abspath(model_path)
+    entries = [model_path]
+    for relative in weight_files(model_path):
+        stat = os.stat(os.path.join(model_path, relative))
+        entries.append(f"{relative}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(entries).encode('utf-8')).hexdigest()
+
+
+def cache_path(model_path: str, cache_dir: str = MODEL_CACHE_DIR) -> str:
+    """モデルに対応するキャッシュディレクトリ"""
+    name = os.path.basename(os.path.normpath(model_path))
+    return os.path.join(cache_dir, f"{name}-{source_key(model_path)[:16]}")
+
+
+def cached_model_path(model_path: str, cache_dir: str = MODEL_CACHE_DIR) -> Optional[str]:
+    """変換済みのキャッシュがあればそのパス（元の重みが更新されていれば None）"""
+    if not weight_files(model_path):
+        return None
+    path = cache_path(model_path, cache_dir)
+    if os.path.exists(os.path.join(path, CACHE_MANIFEST)):
+        return path
+    return None
+
+
+def save_safetensors(state_dict: Dict[str, Any], path: str) -> None:
+    """state_dict を safetensors で保存（ストレージを共有するテンソルは複製）"""
+    from safetensors.torch import save_file
+
+    seen = set()
+    tensors = {}
+    for name, tensor in state_dict.items():
+        pointer = (tensor.untyped_storage().data_ptr(), tensor.storage_offset())
+        tensors[name] = tensor.clone().contiguous() if pointer in seen else tensor.contiguous()
+        seen.add(pointer)
+    save_file(tensors, path, metadata={"format": "pt"})
+
+
+def convert_model(model_path: str, cache_dir: str = MODEL_CACHE_DIR) -> str:
+    """.bin 重みを safetensors に変換してキャッシュに保存（変換済みならそのパスを返す）"""
+    import torch
+
+    model_path = os.path.abspath(model_path)
+    cached = cached_model_path(model_path, cache_dir)
+    if cached:
+        print(f"✅ 変換済み: {cached}")
+        return cached
+
+    files = weight_files(model_path)
+    if not files:
+        raise ValueError(f".bin 形式の重みがありません（safetensors のモデルはそのままロードできます）: {model_path}")
+
+    target = cache_path(model_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    # 変換途中のディレクトリを使わないよう、一時ディレクトリで作成してから rename
+    work_dir = tempfile.mkdtemp(prefix=".converting-", dir=cache_dir)
+    start_time = time.time()
+    try:
+        for root, _, filenames in os.walk(model_path):
+            relative_dir = os.path.relpath(root, model_path)
+            os.makedirs(os.path.join(work_dir, relative_dir), exist_ok=True)
+            for filename in filenames:
+                source = os.path.join(root, filename)
+                if not is_weight_file(filename):
+                    shutil.copy2(source, os.path.join(work_dir, relative_dir, filename))
+                    continue
+
+                destination = os.path.join(work_dir, relative_dir, safetensors_name(filename))
+                if filename.endswith(".index.json"):
+                    with open(source, 'r', encoding='utf-8') as f:
+                        index = json.load(f)
+                    index["weight_map"] = {name: safetensors_name(shard) for name, shard in index["weight_map"].items()}
+                    with open(destination, 'w', encoding='utf-8') as f:
+                        json.dump(index, f, indent=2)
+                    continue
+
+                print(f"🔄 変換中: {os.path.join(relative_dir, filename)}")
+                state_dict = torch.load(source, map_location="cpu", weights_only=True)
+                save_safetensors(state_dict, destination)
+                del state_dict
+
+        with open(os.path.join(work_dir, CACHE_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({
+                "source": model_path,
+                "key": source_key(model_path),
+                "files": files,
+                "convertedAt": datetime.now().isoformat(),
+                "conversionSeconds": round(time.time() - start_time, 1)
+            }, f, ensure_ascii=False, indent=2)
+
+        remove_stale_caches(model_path, cache_dir)
+        os.rename(work_dir, target)
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    print(f"✅ 変換完了 ({time.time() - start_time:.1f}秒): {target}")
+    return target
+
+
+def remove_stale_caches(model_path: str, cache_dir: str = MODEL_CACHE_DIR) -> None:
+    """同じモデルの古いキャッシュ（更新前の重みから変換したもの）を削除"""
+    name = os.path.basename(os.path.normpath(model_path))
+    for path in glob.glob(os.path.join(cache_dir, f"{name}-*")):
+        manifest = read_manifest(path)
+        if manifest and manifest.get("source") == os.path.abspath(model_path):
+            print(f"🗑️ 古いキャッシュを削除: {path}")
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """キャッシュの変換記録"""
+    try:
+        with open(os.path.join(path, CACHE_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def directory_size(path: str) -> int:
+    """ディレクトリ内のファイルサイズ合計"""
+    return sum(os.path.getsize(os.path.join(root, filename))
+               for root, _, filenames in os.walk(path) for filename in filenames)
+
+
+def evict_page_cache(path: str) -> None:
+    """ディレクトリ内のファイルをページキャッシュから追い出す（コールド起動の計測用、root権限不要）"""
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            fd = os.open(os.path.join(root, filename), os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def measure_startup(model_path: str, use_model_cache: bool, width: int, height: int) -> Dict[str, Any]:
+    """現在のプロセスでロードから最初のデノイズステップ完了までを計測"""
+    started = time.perf_counter()
+    import torch
+    from .pipeline import load_pipeline
+    from .metrics import peak_rss
+
+    import_time = time.perf_counter() - started
+    pipe = load_pipeline(model_path, device=DEVICE, use_model_cache=use_model_cache)
+    load_time = time.perf_counter() - started
+    pipe.set_progress_bar_config(disable=True)
+
+    first_step = {}
+
+    def on_step_end(pipe, step_index, timestep, callback_kwargs):
+        # 最初のステップで打ち切り（残りのステップ・VAEデコードは起動時間に含めない）
+        first_step.setdefault("seconds", time.perf_counter() - started)
+        pipe._interrupt = True
+        return callback_kwargs
+
+    pipe(
+        prompt="modern minimalist workspace, natural light",
+        width=width,
+        height=height,
+        num_inference_steps=DEFAULT_PARAMETERS["num_inference_steps"],
+        generator=torch.Generator("cpu").manual_seed(0),
+        callback_on_step_end=on_step_end,
+        output_type="latent"
+    )
+
+    return {
+        "importSeconds": round(import_time, 2),
+        "loadSeconds": round(load_time, 2),
+        "firstStepSeconds": round(first_step["seconds"], 2),
+        "peakRssMB": round(peak_rss() / (1024 * 1024), 1)
+    }
+
+
+def run_benchmark(model_path: str, width: int, height: int) -> List[Dict[str, Any]]:
+    """.bin / キャッシュそれぞれのコールド（ページキャッシュ破棄後）・ウォーム起動を別プロセスで計測"""
+    cached = cached_model_path(model_path) or convert_model(model_path)
+    measurements = []
+    for source, use_model_cache, path in ((".bin", False, model_path), ("safetensors", True, cached)):
+        for start in ("cold", "warm"):
+            if start == "cold":
+                evict_page_cache(path)
+            print(f"▶️ {source} / {start}")
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                result_path = f.name
+            command = [sys.executable, "-m", "contentflow_sd.model_cache", "--measure", source, "--model-path", model_path,
+                       "--width", str(width), "--height", str(height), "--output", result_path]
+            try:
+                completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+                if completed.returncode != 0:
+                    measurements.append({"source": source, "start": start, "error": f"exit {completed.returncode}"})
+                    continue
+                with open(result_path, 'r', encoding='utf-8') as f:
+                    measurement = json.load(f)
+            finally:
+                os.remove(result_path)
+            measurement.update({"source": source, "start": start})
+            print(f"   ロード {measurement['loadSeconds']}秒 / 最初のステップ {measurement['firstStepSeconds']}秒")
+            measurements.append(measurement)
+    return measurements
+
+
+def format_table(measurements: List[Dict[str, Any]]) -> str:
+    """計測結果のMarkdown表"""
+    lines = [
+        "| 重み | 起動 | import (秒) | ロード完了 (秒) | 最初のステップ (秒) | ピークRSS (MB) |",
+        "|---|---|---:|---:|---:|---:|"
+    ]
+    for m in measurements:
+        if "error" in m:
+            lines.append(f"| {m['source']} | {m['start']} | 失敗 ({m['error']}) | | | |")
+            continue
+        lines.append(f"| {m['source']} | {m['start']} | {m['importSeconds']} | {m['loadSeconds']} "
+                     f"| {m['firstStepSeconds']} | {m['peakRssMB']} |")
+    return "\n".join(lines)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='モデルのsafetensors変換キャッシュ作成・起動時間比較')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--status', action='store_true', help='キャッシュの状態を表示')
+    parser.add_argument('--benchmark', action='store_true', help='.bin / キャッシュのコールド・ウォーム起動時間（最初のステップまで）を比較')
+    parser.add_argument('--width', type=int, default=DEFAULT_PARAMETERS["width"], help='計測する画像幅')
+    parser.add_argument('--height', type=int, default=DEFAULT_PARAMETERS["height"], help='計測する画像高さ')
+    parser.add_argument('--output', help='計測結果JSONの保存先')
+    parser.add_argument('--measure', choices=[".bin", "safetensors"], help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.measure:
+        result = measure_startup(args.model_path, args.measure == "safetensors", args.width, args.height)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    if args.status:
+        cached = cached_model_path(args.model_path)
+        if cached:
+            manifest = read_manifest(cached)
+            print(f"✅ 変換済み: {cached}（{directory_size(cached) / (1024 ** 3):.2f}GB、{manifest['convertedAt']}）")
+        elif weight_files(args.model_path):
+            print(f"⚠️ 未変換（または重みが更新済み）: python -m contentflow_sd.model_cache --model-path {args.model_path}")
+        else:
+            print("ℹ️ .bin 形式の重みがないため変換は不要です")
+        return
+
+    if not args.benchmark:
+        try:
+            convert_model(args.model_path)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        return
+
+    print(f"⏱️ 起動時間比較: {args.model_path}（{args.width}x{args.height} の最初のステップまで）")
+    measurements = run_benchmark(args.model_path, args.width, args.height)
+    print(f"\n{format_table(measurements)}")
+
+    output = args.output or os.path.join(STATUS_EVENTS_DIR, f"model-cache-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "modelPath": args.model_path,
+            "width": args.width,
+            "height": args.height,
+            "measuredAt": datetime.now().isoformat(),
+            "startups": measurements
+        }, f, ensure_ascii=False, indent=2)
+    print(f"📄 結果保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
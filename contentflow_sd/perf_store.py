@@ -0,0 +1,529 @@
+"""
+生成性能の履歴ストア（SQLite）
+1枚ごとにセッション・ポジション・モデル・デバイス・解像度・ステップ数・スケジューラー・シード・
+段階別時間（テキストエンコード・デノイズ・VAEデコード）・ピークメモリを logs/image-generation/performance.sqlite3 に記録する。
+LocalGenerator が生成のたびに記録し、既存の状況ファイル・generation_result.json・ログ（tqdm の進捗）は --import で取り込む。
+レポートは期間ごとの s/it（1枚・1ステップあたりのデノイズ秒数）のパーセンタイルを表示し、直近期間の中央値が
+それ以前の期間の中央値より閾値以上遅ければ回帰として報告する。締め切り付き生成の見積もり（deadline.py）もこの履歴を使う
+
+Usage:
+    python -m contentflow_sd.perf_store                              # 週ごとの s/it と回帰判定
+    python -m contentflow_sd.perf_store --period day --since 2025-08-01
+    python -m contentflow_sd.perf_store --import                     # 既存の状況ファイル・結果JSON・ログを取り込み
+    python -m contentflow_sd.perf_store --import image-generation.log public/images/blog/auto-generated
+    python -m contentflow_sd.perf_store --fail-on-regression         # 直近期間に回帰があれば終了コード1
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import sqlite3
+import argparse
+import statistics
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from .settings import (
+    PERF_STORE_FILE, PERF_REGRESSION_THRESHOLD, PERF_BASELINE_PERIODS, STATUS_FILE, STATUS_EVENTS_DIR, OUTPUT_BASE_DIR
+)
+
+COLUMNS = (
+    "recorded_at", "source", "session_id", "position", "variation", "model", "device", "dtype",
+    "width", "height", "steps", "scheduler", "speed_profile", "memory_profile", "seed", "batch_size",
+    "total_seconds", "text_encode_seconds", "denoise_seconds", "vae_decode_seconds", "seconds_per_step",
+    "peak_rss_mb", "torch_peak_mb", "output_path", "record_key"
+)
+
+# 時間は1枚あたり（バッチ生成ではバッチ全体を枚数で割った値）、seconds_per_step は1枚・1ステップあたりのデノイズ秒数
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    session_id TEXT,
+    position TEXT,
+    variation INTEGER,
+    model TEXT,
+    device TEXT,
+    dtype TEXT,
+    width INTEGER,
+    height INTEGER,
+    steps INTEGER,
+    scheduler TEXT,
+    speed_profile TEXT,
+    memory_profile TEXT,
+    seed INTEGER,
+    batch_size INTEGER,
+    total_seconds REAL,
+    text_encode_seconds REAL,
+    denoise_seconds REAL,
+    vae_decode_seconds REAL,
+    seconds_per_step REAL,
+    peak_rss_mb REAL,
+    torch_peak_mb REAL,
+    output_path TEXT,
+    record_key TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS generations_recorded_at ON generations (recorded_at);
+CREATE INDEX IF NOT EXISTS generations_model ON generations (model, device, width, height);
+"""
+
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+
+# 既定の取り込み対象のログ（プロジェクトルート直下）
+DEFAULT_LOG_PATTERN = "*.log"
+
+FILENAME_TIMESTAMP = re.compile(r"(\d{8}_\d{6})\.png$")
+LOG_SESSION = re.compile(r"セッション\s*ID:\s*(\S+)")
+LOG_IMAGE_START = re.compile(r"🎨 画像生成開始:\s*(\S+)")
+LOG_HEADER_START = re.compile(r"ヘッダー画像生成開始")
+LOG_PROGRESS = re.compile(r"^\s*\d+%\|[^|]*\|\s*(\d+)/(\d+)\s*\[(?:(\d+):)?(\d+):(\d+)<")
+LOG_TIME = re.compile(r"生成時間:\s*([\d.]+)秒")
+LOG_OUTPUT = re.compile(r"保存先:\s*(\S+\.png)")
+LOG_RESOLUTION = re.compile(r"解像度:\s*(\d+)x(\d+)")
+
+
+def model_name(model_path: Optional[str]) -> Optional[str]:
+    """モデルの識別名（ディレクトリ名）"""
+    return os.path.basename(os.path.normpath(model_path)) if model_path else None
+
+
+def record_key(row: Dict[str, Any]) -> Optional[str]:
+    """同じ画像の重複記録を防ぐキー（出力ファイルがある場合のみ、取り込みと生成時の記録で共通）"""
+    if not row.get("output_path"):
+        return None
+    return f"{row.get('session_id') or ''}:{row.get('position') or ''}:{os.path.basename(row['output_path'])}"
+
+
+def filename_time(path: Optional[str]) -> Optional[str]:
+    """出力ファイル名の日時（build_filename の形式）"""
+    match = FILENAME_TIMESTAMP.search(path or "")
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat()
+
+
+def image_size(path: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """画像ファイルの解像度（ファイルがなければ None）"""
+    if not path or not os.path.exists(path):
+        return None, None
+    try:
+        from PIL import Image
+
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """パーセンタイル（線形補間、q は 0〜100）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class PerformanceStore:
+    """生成1枚1行の性能履歴"""
+
+    def __init__(self, path: str = PERF_STORE_FILE):
+        self.path = path
+
+    def connect(self) -> sqlite3.Connection:
+        """接続（初回はテーブルを作成、複数プロセスからの書き込みは WAL とロック待ちで直列化）"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def record(self, rows: List[Dict[str, Any]]) -> int:
+        """記録（同じ画像の記録が既にあれば無視）、追加した行数を返す"""
+        if not rows:
+            return 0
+        values = []
+        for row in rows:
+            row = dict(row, record_key=row.get("record_key") or record_key(row))
+            row.setdefault("recorded_at", datetime.now().isoformat())
+            values.append(tuple(row.get(column) for column in COLUMNS))
+
+        connection = self.connect()
+        try:
+            with connection:
+                before = connection.total_changes
+                connection.executemany(
+                    f"INSERT OR IGNORE INTO generations ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    values
+                )
+                return connection.total_changes - before
+        finally:
+            connection.close()
+
+    def rows(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """記録（古い順）"""
+        if not os.path.exists(self.path):
+            return []
+        conditions, parameters = [], []
+        if since:
+            conditions.append("recorded_at >= ?")
+            parameters.append(since)
+        if until:
+            conditions.append("recorded_at < ?")
+            parameters.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = self.connect()
+        try:
+            cursor = connection.execute(f"SELECT * FROM generations {where} ORDER BY recorded_at, id", parameters)
+            return [dict(row) for row in cursor]
+        finally:
+            connection.close()
+
+    def history(self, model: Optional[str] = None, limit: int = 200) -> Dict[str, Any]:
+        """直近の生成の1メガピクセル・1ステップあたりの秒数と1枚あたりの固定時間（deadline.load_history と同じ形式）"""
+        if not os.path.exists(self.path):
+            return {}
+        query = ("SELECT seconds_per_step, width, height, total_seconds, denoise_seconds FROM generations "
+                 "WHERE seconds_per_step IS NOT NULL AND width IS NOT NULL AND height IS NOT NULL")
+        parameters: List[Any] = []
+        if model:
+            query += " AND model = ?"
+            parameters.append(model_name(model))
+        query += " ORDER BY recorded_at DESC LIMIT ?"
+        parameters.append(limit)
+
+        try:
+            connection = self.connect()
+            try:
+                rows = connection.execute(query, parameters).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ 性能履歴の読み込みエラー: {e}")
+            return {}
+        if not rows:
+            return {}
+
+        history: Dict[str, Any] = {
+            "seconds_per_step_mp": statistics.median(
+                row["seconds_per_step"] / (row["width"] * row["height"] / 1_000_000) for row in rows
+            ),
+            "samples": len(rows)
+        }
+        overheads = [row["total_seconds"] - row["denoise_seconds"] for row in rows
+                     if row["total_seconds"] is not None and row["denoise_seconds"] is not None]
+        if overheads:
+            history["overhead"] = max(0.0, statistics.median(overheads))
+        return history
+
+
+# 既存ファイルの取り込み
+
+def status_rows(path: str) -> List[Dict[str, Any]]:
+    """状況ファイル（image-generation-status.json・セッション別スナップショット）の生成結果"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    generation = data.get("imageGeneration") if isinstance(data, dict) else None
+    if not isinstance(generation, dict) or not isinstance(generation.get("results"), list):
+        return []
+
+    rows = []
+    for result in generation["results"]:
+        if not isinstance(result, dict) or not result.get("success") or result.get("cached") or result.get("skipped"):
+            continue
+        output_path = result.get("output_path")
+        width, height = image_size(output_path)
+        batch_size = result.get("batch_size") or 1
+        rows.append({
+            "recorded_at": filename_time(output_path) or generation.get("startedAt"),
+            "source": "status",
+            "session_id": data.get("sessionId"),
+            "position": result.get("position"),
+            "width": width,
+            "height": height,
+            "steps": result.get("steps"),
+            "scheduler": result.get("scheduler"),
+            "speed_profile": result.get("speed_profile"),
+            "seed": result.get("seed"),
+            "batch_size": batch_size,
+            "total_seconds": result.get("generation_time"),
+            "output_path": output_path
+        })
+    return rows
+
+
+def result_rows(path: str) -> List[Dict[str, Any]]:
+    """auto-sd-generator の generation_result.json の生成結果"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("generated_files"), dict):
+        return []
+
+    stats = data.get("stats") or {}
+    timings = {timing["file"]: timing for timing in stats.get("image_timings", []) if isinstance(timing, dict)}
+    # 逐次生成では1枚ごとの時間が残らないため全体の平均で代用
+    successful = stats.get("successful_generations") or 0
+    average = stats["total_time"] / successful if successful and stats.get("total_time") else None
+    session_id = os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+    rows = []
+    for name, files in data["generated_files"].items():
+        seeds = (data.get("seeds") or {}).get(name, [])
+        profile = (data.get("speed_profiles") or {}).get(name, {})
+        for index, output_path in enumerate(files):
+            timing = timings.get(os.path.basename(output_path), {})
+            width, height = image_size(output_path)
+            rows.append({
+                "recorded_at": filename_time(output_path) or datetime.fromtimestamp(os.path.getmtime(path)).isoformat(),
+                "source": "result",
+                "session_id": session_id,
+                "position": name,
+                "variation": index + 1,
+                "width": width,
+                "height": height,
+                "steps": profile.get("steps"),
+                "scheduler": profile.get("scheduler"),
+                "speed_profile": profile.get("speed_profile"),
+                "seed": seeds[index] if index < len(seeds) else None,
+                "total_seconds": timing.get("generation_time", average),
+                "output_path": output_path
+            })
+    return rows
+
+
+def log_rows(path: str) -> List[Dict[str, Any]]:
+    """生成ログの画像ごとの時間・解像度と、tqdm の最終進捗（経過時間 ÷ ステップ数）から求めた s/it"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        # tqdm の \r 区切りの進捗も1行ずつに分かれる
+        lines = f.read().splitlines()
+
+    rows: List[Dict[str, Any]] = []
+    session_id = None
+    current: Optional[Dict[str, Any]] = None
+
+    def finish():
+        if current and current.get("total_seconds") is not None:
+            current.setdefault("recorded_at", datetime.fromtimestamp(os.path.getmtime(path)).isoformat())
+            rows.append(current)
+
+    for line in lines:
+        match = LOG_SESSION.search(line)
+        if match:
+            session_id = match.group(1)
+            continue
+        match = LOG_IMAGE_START.search(line)
+        if match or LOG_HEADER_START.search(line):
+            finish()
+            current = {"source": "log", "session_id": session_id, "position": match.group(1) if match else "header",
+                       "batch_size": 1}
+            continue
+        if current is None:
+            continue
+
+        match = LOG_PROGRESS.search(line)
+        if match:
+            done, total = int(match.group(1)), int(match.group(2))
+            elapsed = int(match.group(3) or 0) * 3600 + int(match.group(4)) * 60 + int(match.group(5))
+            if done == total and total > 0 and elapsed > 0:
+                current["steps"] = total
+                current["denoise_seconds"] = float(elapsed)
+                current["seconds_per_step"] = elapsed / total
+            continue
+        match = LOG_TIME.search(line)
+        if match:
+            current["total_seconds"] = float(match.group(1))
+            continue
+        match = LOG_OUTPUT.search(line)
+        if match:
+            current["output_path"] = match.group(1)
+            recorded_at = filename_time(match.group(1))
+            if recorded_at:
+                current["recorded_at"] = recorded_at
+            continue
+        match = LOG_RESOLUTION.search(line)
+        if match:
+            current["width"], current["height"] = int(match.group(1)), int(match.group(2))
+
+    finish()
+    return rows
+
+
+def collect_import_files(paths: List[str]) -> List[str]:
+    """取り込むファイル（ディレクトリは配下の generation_result.json と *.log）"""
+    if not paths:
+        paths = sorted(glob.glob(DEFAULT_LOG_PATTERN)) + [STATUS_FILE] + \
+            sorted(glob.glob(os.path.join(STATUS_EVENTS_DIR, "*.json"))) + [OUTPUT_BASE_DIR]
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.log"), recursive=True)))
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "generation_result.json"), recursive=True)))
+        elif os.path.exists(path):
+            files.append(path)
+    # ログ（s/it を含む）を先に取り込み、同じ画像の状況ファイル・結果JSONの記録は重複として無視させる
+    return sorted(dict.fromkeys(files), key=lambda file: not file.endswith(".log"))
+
+
+def import_files(store: PerformanceStore, files: List[str]) -> Dict[str, int]:
+    """既存ファイルの取り込み（ファイル → 追加した行数）"""
+    imported = {}
+    for path in files:
+        try:
+            if path.endswith(".log"):
+                rows = log_rows(path)
+            elif os.path.basename(path) == "generation_result.json":
+                rows = result_rows(path)
+            else:
+                rows = status_rows(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ 取り込みエラー（{path}）: {e}")
+            continue
+        imported[path] = store.record(rows)
+    return imported
+
+
+# レポート
+
+def group_label(row: Dict[str, Any], group_by: str) -> str:
+    """比較の単位（モデル・デバイス・解像度、resolution 指定時は解像度のみ）"""
+    resolution = f"{row['width']}x{row['height']}" if row.get("width") else "解像度不明"
+    if group_by == "resolution":
+        return resolution
+    return f"{row.get('model') or 'モデル不明'} / {row.get('device') or 'デバイス不明'} / {resolution}"
+
+
+def build_report(rows: List[Dict[str, Any]], period: str = "week", threshold: float = PERF_REGRESSION_THRESHOLD,
+                 baseline_periods: int = PERF_BASELINE_PERIODS, group_by: str = "all") -> Dict[str, Any]:
+    """グループ・期間ごとの s/it パーセンタイルと回帰判定"""
+    buckets: Dict[str, Dict[str, Dict[str, List[float]]]] = {}
+    for row in rows:
+        label = datetime.fromisoformat(row["recorded_at"]).strftime(PERIOD_FORMATS[period])
+        bucket = buckets.setdefault(group_label(row, group_by), {}).setdefault(label, {"s_it": [], "total": []})
+        if row.get("seconds_per_step") is not None:
+            bucket["s_it"].append(row["seconds_per_step"])
+        if row.get("total_seconds") is not None:
+            bucket["total"].append(row["total_seconds"])
+
+    groups = {}
+    regressions = []
+    for group, periods in sorted(buckets.items()):
+        entries = []
+        medians: List[float] = []
+        for label in sorted(periods):
+            values = periods[label]
+            entry = {
+                "period": label,
+                "images": max(len(values["s_it"]), len(values["total"])),
+                "p50": percentile(values["s_it"], 50),
+                "p90": percentile(values["s_it"], 90),
+                "p99": percentile(values["s_it"], 99),
+                "secondsPerImageP50": percentile(values["total"], 50)
+            }
+            if entry["p50"] is not None:
+                baseline = medians[-baseline_periods:]
+                if baseline:
+                    entry["baseline"] = statistics.median(baseline)
+                    entry["change"] = entry["p50"] / entry["baseline"] - 1
+                    entry["regression"] = entry["change"] > threshold
+                medians.append(entry["p50"])
+            entries.append(entry)
+
+        groups[group] = entries
+        latest = next((entry for entry in reversed(entries) if entry["p50"] is not None), None)
+        if latest is not None and latest.get("regression"):
+            regressions.append({"group": group, **latest})
+
+    return {
+        "period": period,
+        "threshold": threshold,
+        "baselinePeriods": baseline_periods,
+        "images": len(rows),
+        "groups": groups,
+        "regressions": regressions
+    }
+
+
+def format_seconds(value: Optional[float]) -> str:
+    """表の秒数表示（値がなければ -）"""
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """レポートの表示（グループごとの表）"""
+    print(f"📈 生成性能（{report['period']}ごと、s/it = 1枚・1ステップあたりのデノイズ秒数）: {report['images']}枚")
+    for group, entries in report["groups"].items():
+        print(f"\n### {group}")
+        print("| 期間 | 枚数 | s/it p50 | p90 | p99 | 秒/枚 p50 | 基準比 |")
+        print("|---|---:|---:|---:|---:|---:|---|")
+        for entry in entries:
+            change = ""
+            if "change" in entry:
+                change = f"{entry['change']:+.0%}{' ⚠️ 回帰' if entry['regression'] else ''}"
+            print(f"| {entry['period']} | {entry['images']} | {format_seconds(entry['p50'])} | {format_seconds(entry['p90'])} "
+                  f"| {format_seconds(entry['p99'])} | {format_seconds(entry['secondsPerImageP50'])} | {change} |")
+
+    if report["regressions"]:
+        print(f"\n❌ 直近期間の回帰（中央値が直前{report['baselinePeriods']}期間の基準より{report['threshold']:.0%}超遅い）:")
+        for regression in report["regressions"]:
+            print(f"  - {regression['group']}: {regression['period']} {regression['p50']:.2f} s/it "
+                  f"（基準 {regression['baseline']:.2f}、{regression['change']:+.0%}）")
+    else:
+        print("\n✅ 直近期間の回帰なし")
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='生成性能の履歴（SQLite）の取り込み・レポート')
+    parser.add_argument('--store', default=PERF_STORE_FILE, help=f'履歴ファイル（デフォルト: {PERF_STORE_FILE}）')
+    parser.add_argument('--import', dest='import_paths', nargs='*', metavar='PATH',
+                        help='既存の状況ファイル・generation_result.json・ログを取り込む（パス省略時は既定の場所）')
+    parser.add_argument('--period', choices=list(PERIOD_FORMATS), default='week', help='集計期間（デフォルト: week）')
+    parser.add_argument('--since', help='集計開始日（例: 2025-08-01）')
+    parser.add_argument('--group-by', choices=['all', 'resolution'], default='all',
+                        help='比較の単位（all: モデル・デバイス・解像度、resolution: 解像度のみ）')
+    parser.add_argument('--threshold', type=float, default=PERF_REGRESSION_THRESHOLD,
+                        help=f'回帰とみなす中央値の悪化率（デフォルト: {PERF_REGRESSION_THRESHOLD}）')
+    parser.add_argument('--baseline', type=int, default=PERF_BASELINE_PERIODS,
+                        help=f'基準にする直前の期間数（デフォルト: {PERF_BASELINE_PERIODS}）')
+    parser.add_argument('--json', action='store_true', help='レポートをJSONで出力')
+    parser.add_argument('--fail-on-regression', action='store_true', help='直近期間に回帰があれば終了コード1')
+
+    args = parser.parse_args()
+    store = PerformanceStore(args.store)
+
+    if args.import_paths is not None:
+        files = collect_import_files(args.import_paths)
+        if not files:
+            print("⚠️ 取り込むファイルがありません")
+            return
+        imported = import_files(store, files)
+        for path, count in imported.items():
+            print(f"📥 {path}: {count}件")
+        print(f"✅ 取り込み完了: {sum(imported.values())}件 → {args.store}")
+        return
+
+    rows = store.rows(since=args.since)
+    if not rows:
+        print(f"⚠️ 記録がありません（{args.store}）。--import で既存のログを取り込めます")
+        return
+
+    report = build_report(rows, args.period, args.threshold, args.baseline, args.group_by)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    if args.fail_on_regression and report["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
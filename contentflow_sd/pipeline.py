@@ -0,0 +1,61 @@
+"""
+Stable Diffusion XL パイプライン生成
+torch / diffusers は実際にパイプラインが必要になった時点で読み込む
+python -m で実行できる model_cache・device・memory も使用時に import する（パッケージ経由で二重に読み込まないため）
+"""
+
+import time
+from typing import Optional, Tuple
+
+from .settings import MODEL_PATH, DEVICE
+from .metrics import span
+
+
+def weights_source(model_path: str, use_safetensors: bool = False, use_model_cache: bool = True) -> Tuple[str, bool]:
+    """重みの読み込み元（safetensors変換キャッシュがあればそちらをメモリマップで読む）と use_safetensors"""
+    from .model_cache import cached_model_path
+
+    cached = cached_model_path(model_path) if use_model_cache else None
+    if cached:
+        return cached, True
+    return model_path, use_safetensors
+
+
+def load_pipeline(model_path: str = MODEL_PATH, torch_dtype=None, device: str = DEVICE, use_safetensors: bool = False,
+                  memory_profile: Optional[str] = None, use_model_cache: bool = True):
+    """Stable Diffusion XL パイプライン読み込み（デバイス自動判定・CPU最適化・メモリプロファイルに応じた配置）"""
+    from diffusers import StableDiffusionXLPipeline
+    from .device import detect_device, default_dtype, optimize_pipeline
+    from .memory import resolve_profile, apply_memory_profile
+    from .model_cache import weight_files
+
+    device = detect_device(device)
+    if torch_dtype is None:
+        torch_dtype = default_dtype(device)
+
+    print(f"📂 Stable Diffusionモデルロード中: {model_path}（{device} / {str(torch_dtype).replace('torch.', '')}）")
+    start_time = time.time()
+
+    source, use_safetensors = weights_source(model_path, use_safetensors, use_model_cache)
+    if source != model_path:
+        print(f"⚡ safetensors変換キャッシュから読み込み: {source}")
+    elif use_model_cache and not use_safetensors and weight_files(model_path):
+        print("💡 python -m contentflow_sd.model_cache で safetensors に変換すると起動が速くなります")
+
+    memory_profile = resolve_profile(memory_profile)
+    with span("model_load", model_path=model_path, device=str(device), memory_profile=memory_profile,
+              safetensors=use_safetensors):
+        pipe = StableDiffusionXLPipeline.from_pretrained(
+            source,
+            torch_dtype=torch_dtype,
+            use_safetensors=use_safetensors  # 変換キャッシュがなければ .bin 形式のため False
+        )
+        optimization = optimize_pipeline(pipe, device)
+        # オフロードするプロファイルでは全体をデバイスに載せない
+        apply_memory_profile(pipe, memory_profile, device)
+
+    if "threads" in optimization:
+        print(f"🧵 CPU最適化: {optimization['threads']}スレッド / channels-last: {'有効' if optimization.get('channels_last') else '無効'}")
+
+    print(f"✅ モデルロード完了 ({time.time() - start_time:.1f}秒、メモリプロファイル: {memory_profile})")
+    return pipe
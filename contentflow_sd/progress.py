@@ -0,0 +1,89 @@
+"""
+デノイズステップ単位の進捗
+パイプラインの callback_on_step_end から呼ばれ、ステップ番号・直近の秒/ステップ・画像の残り時間を
+一定間隔以上空けてコールバックへ通知する（ステップごとの処理は時刻の記録のみ）
+"""
+
+import time
+from collections import deque
+from typing import Dict, Any, List, Callable, Optional
+
+from .settings import PROGRESS_MIN_INTERVAL, PROGRESS_WINDOW
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+class StepProgress:
+    """ステップ進捗の計測と間引き通知"""
+
+    def __init__(self, callback: ProgressCallback, min_interval: float = PROGRESS_MIN_INTERVAL,
+                 window: int = PROGRESS_WINDOW):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.step_times: deque = deque(maxlen=window + 1)
+        self.positions: List[str] = []
+        self.total_steps = 0
+        self.started_at = 0.0
+        self.last_emit = 0.0
+
+    def begin(self, positions: List[str], total_steps: int) -> None:
+        """1回のパイプライン呼び出し（バッチ）の開始"""
+        self.positions = list(positions)
+        self.total_steps = total_steps
+        self.started_at = time.monotonic()
+        self.step_times.clear()
+        self.step_times.append(self.started_at)
+        self.last_emit = 0.0
+        self._emit(0, self.started_at)
+
+    def on_step_end(self, pipe, step_index: int, timestep, callback_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """diffusers の callback_on_step_end"""
+        now = time.monotonic()
+        self.step_times.append(now)
+
+        # img2img は strength に応じて実行ステップ数が減るため実際の値を使う
+        total_steps = getattr(pipe, "num_timesteps", None) or self.total_steps
+        if total_steps != self.total_steps:
+            self.total_steps = total_steps
+
+        step = step_index + 1
+        if now - self.last_emit >= self.min_interval or step >= self.total_steps:
+            self._emit(step, now)
+        return callback_kwargs
+
+    def seconds_per_step(self) -> Optional[float]:
+        """直近ウィンドウの平均秒/ステップ"""
+        if len(self.step_times) < 2:
+            return None
+        return (self.step_times[-1] - self.step_times[0]) / (len(self.step_times) - 1)
+
+    def _emit(self, step: int, now: float) -> None:
+        self.last_emit = now
+        seconds_per_step = self.seconds_per_step()
+        remaining = max(0, self.total_steps - step)
+
+        try:
+            self.callback({
+                "positions": self.positions,
+                "step": step,
+                "totalSteps": self.total_steps,
+                "secondsPerStep": round(seconds_per_step, 3) if seconds_per_step else None,
+                "elapsed": round(now - self.started_at, 1),
+                "imageEta": round(remaining * seconds_per_step, 1) if seconds_per_step else None
+            })
+        except Exception as e:
+            # 進捗通知の失敗で生成を止めない
+            print(f"⚠️ 進捗通知エラー: {e}")
+
+
+def session_eta(progress: Dict[str, Any], remaining_images: int, image_times: List[float]) -> Optional[float]:
+    """現在の画像の残り時間＋残り画像数×1枚あたりの時間（実績がなければステップ速度から推定）"""
+    if progress.get("imageEta") is None:
+        return None
+
+    if image_times:
+        per_image = sum(image_times) / len(image_times)
+    else:
+        per_image = (progress["secondsPerStep"] or 0) * progress["totalSteps"]
+
+    return round(progress["imageEta"] + remaining_images * per_image, 1)
@@ -0,0 +1,104 @@
+"""
+プログレッシブ生成（プレビュー → 仕上げ）
+1段目: 全ポジション×バリエーションを低解像度・少ステップでプレビュー生成
+2段目: 選択した候補のみ、プレビューを拡大した画像からimg2img（部分的な強さ）でフル解像度に仕上げる
+
+プレビューと仕上げは同じシードを使うため、構図はプレビューのまま細部だけが描き直される。
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from .settings import DEFAULT_PARAMETERS, PREVIEW_SCALE, PREVIEW_STEPS, REFINE_STRENGTH, PREVIEW_DIR_NAME
+
+MANIFEST_FILE = "previews.json"
+
+
+def _session_id(request: Dict[str, Any]) -> str:
+    # 出力先がプレビュー用ディレクトリに変わってもシードが変わらないよう元のセッションIDを固定
+    return request.get("session_id") or os.path.basename(os.path.normpath(request["output_dir"]))
+
+
+def preview_size(width: int, height: int, scale: float = PREVIEW_SCALE) -> Dict[str, int]:
+    """縦横比を保ったプレビューサイズ（8の倍数）"""
+    return {
+        "width": max(64, int(width * scale) // 8 * 8),
+        "height": max(64, int(height * scale) // 8 * 8)
+    }
+
+
+def preview_request(request: Dict[str, Any], scale: float = PREVIEW_SCALE, steps: int = PREVIEW_STEPS) -> Dict[str, Any]:
+    """フル解像度リクエストから対応するプレビューリクエストを作成"""
+    parameters = dict(DEFAULT_PARAMETERS)
+    parameters.update(request.get("parameters") or {})
+    parameters.update(preview_size(parameters["width"], parameters["height"], scale))
+    parameters["num_inference_steps"] = steps
+
+    prefix = request.get("filename_prefix") or request["position"]
+    return dict(
+        request,
+        parameters=parameters,
+        output_dir=os.path.join(request["output_dir"], PREVIEW_DIR_NAME),
+        filename_prefix=f"{prefix}-preview",
+        session_id=_session_id(request)
+    )
+
+
+def refine_request(request: Dict[str, Any], preview_path: str, strength: float = REFINE_STRENGTH) -> Dict[str, Any]:
+    """プレビュー画像を元にフル解像度で仕上げるリクエストを作成"""
+    parameters = dict(request.get("parameters") or {})
+    parameters["strength"] = strength
+    return dict(
+        request,
+        parameters=parameters,
+        init_image=preview_path,
+        session_id=_session_id(request)
+    )
+
+
+def parse_selection(text: Optional[str]) -> Dict[str, int]:
+    """--select 引数（例: hero=3,section1=1）をポジション → バリエーション番号に変換"""
+    selection: Dict[str, int] = {}
+    if not text:
+        return selection
+
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, variation = item.partition("=")
+        if not separator or not variation.strip().isdigit() or int(variation) < 1:
+            raise ValueError(f"選択指定が無効です: {item}（形式: ポジション=バリエーション番号）")
+        selection[name.strip()] = int(variation)
+    return selection
+
+
+def manifest_path(output_dir: str) -> str:
+    """プレビュー一覧ファイルのパス"""
+    return os.path.join(output_dir, PREVIEW_DIR_NAME, MANIFEST_FILE)
+
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    """前回のプレビュー一覧（なければ空）"""
+    try:
+        with open(manifest_path(output_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir: str, previews: Dict[str, List[Dict[str, Any]]], selected: Dict[str, int]) -> str:
+    """プレビュー一覧と選択結果を保存（selected を編集して再実行すれば選択を変更できる）"""
+    path = manifest_path(output_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "updatedAt": datetime.now().isoformat(),
+            "previews": previews,
+            "selected": selected
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return path
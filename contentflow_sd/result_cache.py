@@ -0,0 +1,163 @@
+"""
+生成結果キャッシュ（コンテンツアドレス）
+(モデルパス, プロンプト, ネガティブプロンプト, パラメータ, スケジューラー, シード[, img2img元画像]) のハッシュを
+PNGメタデータと auto-generated/result-index.json に記録し、同一入力の再生成をスキップする
+"""
+
+import os
+import json
+import fcntl
+import shutil
+import threading
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from .settings import RESULT_INDEX_FILE
+
+PNG_KEY_FIELD = "contentflow:cache_key"
+PNG_INPUT_FIELD = "contentflow:inputs"
+
+
+def cache_inputs(model_path: str, request: Dict[str, Any], params: Dict[str, Any], scheduler: str,
+                 init_image: Optional[str] = None) -> Dict[str, Any]:
+    """キャッシュキーの元になる生成入力（シードは parameters に含まれる）"""
+    inputs = {
+        "model_path": model_path,
+        "prompt": request["prompt"],
+        "negative_prompt": request.get("negative_prompt", ""),
+        "parameters": params,
+        "scheduler": scheduler,
+        "seed": params.get("seed")
+    }
+    # txt2imgのキーを変えないよう、img2imgの場合のみ元画像を含める
+    if init_image:
+        inputs["init_image"] = init_image
+    return inputs
+
+
+def cache_key(inputs: Dict[str, Any]) -> str:
+    """生成入力のハッシュ"""
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def read_png_key(path: str) -> Optional[str]:
+    """PNGメタデータからキャッシュキー取得"""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            return image.info.get(PNG_KEY_FIELD)
+    except Exception:
+        return None
+
+
+def png_metadata(key: str, inputs: Dict[str, Any]):
+    """保存時に埋め込むPNGメタデータ"""
+    from PIL.PngImagePlugin import PngInfo
+
+    info = PngInfo()
+    info.add_text(PNG_KEY_FIELD, key)
+    info.add_text(PNG_INPUT_FIELD, json.dumps(inputs, ensure_ascii=False))
+    return info
+
+
+class ResultCache:
+    """生成結果インデックス（キー → 出力ファイル）"""
+
+    def __init__(self, index_file: str = RESULT_INDEX_FILE):
+        self.index_file = os.path.abspath(index_file)
+        self.index_dir = os.path.dirname(self.index_file)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.loaded_mtime = None
+        # 画像書き込みスレッドからも記録されるため排他
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _reload(self, force: bool = False) -> None:
+        """他プロセスの更新を反映するため、インデックスが変わっていれば再読み込み"""
+        try:
+            mtime = os.path.getmtime(self.index_file)
+        except OSError:
+            return
+
+        if mtime == self.loaded_mtime and not force:
+            return
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            self.loaded_mtime = mtime
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 結果インデックス読み込みエラー: {e}")
+
+    def _save(self) -> None:
+        os.makedirs(self.index_dir, exist_ok=True)
+        temp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.index_file)
+        self.loaded_mtime = os.path.getmtime(self.index_file)
+
+    def lookup(self, key: str, output_dir: str) -> Optional[str]:
+        """キャッシュ済み出力の検索（他ディレクトリの結果は output_dir にリンク/コピー）"""
+        with self.lock:
+            return self._lookup(key, output_dir)
+
+    def _lookup(self, key: str, output_dir: str) -> Optional[str]:
+        self._reload()
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            cached_path = os.path.normpath(os.path.join(self.index_dir, entry["path"]))
+            # インデックスとPNGメタデータの両方が一致する場合のみ有効
+            if os.path.exists(cached_path) and read_png_key(cached_path) == key:
+                self.hits += 1
+                if os.path.abspath(os.path.dirname(cached_path)) == os.path.abspath(output_dir):
+                    return os.path.join(output_dir, os.path.basename(cached_path))
+                return self._link(cached_path, output_dir)
+
+        self.misses += 1
+        return None
+
+    def _link(self, cached_path: str, output_dir: str) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        target_path = os.path.join(output_dir, os.path.basename(cached_path))
+        if not os.path.exists(target_path):
+            try:
+                os.link(cached_path, target_path)
+            except OSError:
+                shutil.copy2(cached_path, target_path)
+        return target_path
+
+    @contextmanager
+    def _index_lock(self):
+        # 複数プロセス（ワーカープール等）が読み直し → 追記 → 保存する間に他の記録を失わないよう排他
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(f"{self.index_file}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def record(self, key: str, output_path: str, position: str) -> None:
+        """生成結果をインデックスに記録"""
+        with self.lock, self._index_lock():
+            self._reload(force=True)
+            self.entries[key] = {
+                "path": os.path.relpath(os.path.abspath(output_path), self.index_dir),
+                "position": position,
+                "createdAt": datetime.now().isoformat()
+            }
+            try:
+                self._save()
+            except OSError as e:
+                print(f"⚠️ 結果インデックス保存エラー: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット・ミス統計"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
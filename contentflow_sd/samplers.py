@@ -0,0 +1,108 @@
+"""
+サンプラー（スケジューラー）と速度プロファイル
+プロンプトの parameters.scheduler（settings.SCHEDULERS）と parameters.speed_profile（settings.SPEED_PROFILES）を
+ロード済みパイプラインに適用する。スケジューラーは名前ごとに1度だけ作成してキャッシュし、
+モデルを再ロードせずに差し替える。LoRAアダプター（LCM-LoRA 等）は初回使用時にロードする
+"""
+
+import os
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from .settings import SCHEDULERS, ADAPTERS, SPEED_PROFILES, SPEED_PROFILE
+
+# アダプター未設定で fallback に切り替えた旨は1プロファイルにつき1度だけ表示
+_fallback_warned = set()
+
+
+def speed_parameters(name: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """速度プロファイルの生成パラメータ（アダプター未設定なら fallback のプロファイル）
+
+    不明なプロファイル名はそのまま返し、生成時の resolve_speed_profile でエラーにする。
+    """
+    name = name or SPEED_PROFILE
+    profile = SPEED_PROFILES.get(name)
+    if profile is None:
+        return name, {}
+
+    adapter = profile.get("adapter")
+    if adapter and not ADAPTERS.get(adapter) and profile.get("fallback"):
+        if name not in _fallback_warned:
+            _fallback_warned.add(name)
+            print(f"⚠️ 速度プロファイル {name} のアダプター {adapter} が未設定のため {profile['fallback']} で生成します")
+        return speed_parameters(profile["fallback"])
+
+    return name, {key: value for key, value in profile.items() if key != "fallback"}
+
+
+def resolve_speed_profile(name: Optional[str]) -> str:
+    """速度プロファイル名の検証（未指定なら既定のプロファイル）"""
+    name = name or SPEED_PROFILE
+    if name not in SPEED_PROFILES:
+        raise ValueError(f"不明な速度プロファイル: {name}（{', '.join(SPEED_PROFILES)}）")
+    return name
+
+
+def resolve_scheduler(name: Optional[str]) -> str:
+    """スケジューラー名の検証（未指定ならモデル同梱のスケジューラー）"""
+    name = name or "default"
+    if name not in SCHEDULERS:
+        raise ValueError(f"不明なスケジューラー: {name}（{', '.join(SCHEDULERS)}）")
+    return name
+
+
+def default_scheduler_name(model_path: str) -> Optional[str]:
+    """モデル同梱のスケジューラーのクラス名（scheduler/scheduler_config.json から、パイプラインをロードせずに取得）"""
+    try:
+        with open(os.path.join(model_path, "scheduler", "scheduler_config.json"), 'r', encoding='utf-8') as f:
+            return json.load(f).get("_class_name")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def get_scheduler(pipe, name: Optional[str]):
+    """名前に対応するスケジューラー（初回のみモデルのスケジューラー設定から作成）"""
+    import diffusers
+
+    name = resolve_scheduler(name)
+    schedulers = getattr(pipe, "_contentflow_schedulers", None)
+    if schedulers is None:
+        schedulers = pipe._contentflow_schedulers = {"default": pipe.scheduler}
+    if name not in schedulers:
+        spec = SCHEDULERS[name]
+        scheduler_class = getattr(diffusers, spec["class"])
+        schedulers[name] = scheduler_class.from_config(schedulers["default"].config, **spec.get("config", {}))
+    return schedulers[name]
+
+
+def apply_scheduler(pipes: List[Any], name: Optional[str]) -> None:
+    """重みを共有するパイプライン群のスケジューラーを差し替え（pipes[0] がキャッシュを持つメイン）"""
+    scheduler = get_scheduler(pipes[0], name)
+    for pipe in pipes:
+        pipe.scheduler = scheduler
+
+
+def apply_adapter(pipe, name: Optional[str]) -> None:
+    """LoRAアダプターの有効化・無効化（初回使用時にロード）"""
+    current = getattr(pipe, "_contentflow_adapter", None)
+    if current == name:
+        return
+
+    if name:
+        loaded = getattr(pipe, "_contentflow_loaded_adapters", None)
+        if loaded is None:
+            loaded = pipe._contentflow_loaded_adapters = set()
+        if name not in loaded:
+            source = ADAPTERS.get(name)
+            if not source:
+                raise ValueError(f"アダプター {name} が設定されていません（{', '.join(ADAPTERS)}）")
+            print(f"🧩 LoRAアダプターロード中: {name} ({source})")
+            pipe.load_lora_weights(source, adapter_name=name)
+            loaded.add(name)
+        pipe.enable_lora()
+        pipe.set_adapters([name])
+    else:
+        pipe.disable_lora()
+
+    pipe._contentflow_adapter = name
+    print(f"🧩 LoRAアダプター: {name or 'なし'}")
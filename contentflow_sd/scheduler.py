@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+複数セッションの画像生成スケジューラー
+記事JSON群から (セッション, ポジション) の作業リストを作り、ヘッダー画像を優先して
+1プロセス（モデルのロードは1回）でまとめて生成する
+
+Usage:
+    python -m contentflow_sd.scheduler --articles "articles/processed/*.json"
+    python -m contentflow_sd.scheduler --job-dir jobs/pending --batch-size 2
+    python -m contentflow_sd.scheduler --articles "articles/*.json" --workers 4 --threads 4   # CPUワーカープール
+
+有効な画像が既にあるポジションはスキップする（--force で再生成）。途中で SIGTERM を受けた場合は
+生成中の画像をチェックポイント保存して止め、同じコマンドの再実行で続きから再開する。
+セッションごとの状況は logs/image-generation/<セッションID>.jsonl（イベント）と <セッションID>.json
+（スナップショット）に記録し、最後にスループット集計（画像/時、アイドル時間）を出力する。
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import signal
+import argparse
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from .settings import (
+    MODEL_PATH, OUTPUT_BASE_DIR, CHECKPOINT_INTERVAL, STATUS_EVENTS_DIR, POOL_THREADS_PER_WORKER,
+    MEMORY_PROFILES, MEMORY_PROFILE, SPEED_PROFILES, SPEED_PROFILE
+)
+from .generator import build_request, find_existing_output
+from .validation import validate_article
+from .writer import apply_write_failures
+from .status import StatusLog, session_snapshot_path, write_json_atomic
+from .metrics import format_stages
+
+# 優先して生成するポジション（記事公開に必要なヘッダー画像）
+PRIORITY_POSITIONS = ("header",)
+
+
+def load_session(article_file: str) -> Optional[Dict[str, Any]]:
+    """記事JSONからセッション情報を読み込み（画像プロンプトがなければNone）"""
+    try:
+        with open(article_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 記事ファイル読み込みエラー ({article_file}): {e}")
+        return None
+
+    if not isinstance(data, dict) or not data.get("imagePrompts"):
+        return None
+
+    # 不正な画像プロンプトを含む記事はモデルの処理に入る前に除外
+    errors = validate_article(data)["errors"]
+    if errors:
+        print(f"⚠️ 記事ファイルの画像プロンプトが無効なためスキップ ({article_file}):")
+        for error in errors:
+            print(f"   ❌ {error}")
+        return None
+
+    metadata = data.get("metadata") or {}
+    return {
+        "session_id": metadata.get("sessionId") or os.path.splitext(os.path.basename(article_file))[0],
+        "article_file": article_file,
+        "title": (data.get("article") or {}).get("title", ""),
+        "image_prompts": data["imagePrompts"]
+    }
+
+
+def load_sessions(article_files: List[str]) -> List[Dict[str, Any]]:
+    """記事JSON群からセッション一覧を作成（同じセッションIDは最初のものを使う）"""
+    sessions = []
+    seen = set()
+    for article_file in article_files:
+        session = load_session(article_file)
+        if session is None or session["session_id"] in seen:
+            continue
+        seen.add(session["session_id"])
+        sessions.append(session)
+    return sessions
+
+
+def position_priority(position: str) -> int:
+    """作業リストの優先度（小さいほど先）"""
+    return 0 if position in PRIORITY_POSITIONS else 1
+
+
+def build_work_list(sessions: List[Dict[str, Any]], output_base_dir: str = OUTPUT_BASE_DIR,
+                    force: bool = False) -> List[Dict[str, Any]]:
+    """全セッションの (セッション, ポジション) 作業リスト（ヘッダー優先、同順位はセッション・記事内の順）"""
+    items = []
+    for session_index, session in enumerate(sessions):
+        output_dir = os.path.join(output_base_dir, session["session_id"])
+        session["output_dir"] = output_dir
+        session["skipped"] = []
+
+        for prompt_index, prompt_data in enumerate(session["image_prompts"]):
+            existing = None if force else find_existing_output(output_dir, prompt_data["position"])
+            if existing:
+                session["skipped"].append((prompt_data, existing))
+                continue
+            items.append({
+                "session_id": session["session_id"],
+                "prompt_data": prompt_data,
+                "output_dir": output_dir,
+                "sort_key": (position_priority(prompt_data["position"]), session_index, prompt_index)
+            })
+
+    items.sort(key=lambda item: item["sort_key"])
+    return items
+
+
+class SessionScheduler:
+    """作業リストを1つのジェネレーターで順に生成し、セッションごとの状況を記録"""
+
+    def __init__(self, generator, sessions: List[Dict[str, Any]], items: List[Dict[str, Any]],
+                 batch_size: int = 1, force: bool = False, derivatives: bool = True,
+                 checkpoint_every: int = CHECKPOINT_INTERVAL, memory_profile: Optional[str] = None,
+                 speed_profile: Optional[str] = None):
+        self.generator = generator
+        self.memory_profile = memory_profile
+        self.speed_profile = speed_profile
+        self.sessions = {session["session_id"]: session for session in sessions}
+        self.items = items
+        self.batch_size = max(1, batch_size)
+        # ワーカープールでは全ワーカーに行き渡る数をまとめて渡す
+        self.chunk_size = self.batch_size * getattr(generator, "parallelism", 1)
+        self.force = force
+        self.derivatives = derivatives
+        self.checkpoint_every = checkpoint_every
+        self.interrupted = False
+        self.states: Dict[str, Dict[str, Any]] = {}
+
+    def interrupt(self) -> None:
+        """実行中の画像をチェックポイント保存して止める（シグナルハンドラーから呼ぶ）"""
+        self.interrupted = True
+        self.generator.interrupt()
+
+    def build_generation_request(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """作業項目の生成リクエスト（再実行で途中から再開できるよう常にチェックポイントを使う）"""
+        request = build_request(item["prompt_data"], item["output_dir"], session_id=item["session_id"])
+        request["force"] = self.force
+        request["checkpoint_every"] = self.checkpoint_every
+        request["resume"] = True
+        # 記事側の parameters.memory_profile / speed_profile を優先
+        for name, value in (("memory_profile", self.memory_profile), ("speed_profile", self.speed_profile)):
+            if value:
+                request["parameters"] = dict(request["parameters"])
+                request["parameters"].setdefault(name, value)
+        return request
+
+    def start_sessions(self) -> None:
+        """作業のあるセッションの状況を初期化（既存画像は結果として記録）"""
+        pending: Dict[str, int] = {}
+        for item in self.items:
+            pending[item["session_id"]] = pending.get(item["session_id"], 0) + 1
+
+        for session_id, count in pending.items():
+            session = self.sessions[session_id]
+            status = StatusLog(session_id, snapshot_file=session_snapshot_path(session_id))
+            status_data = {
+                "sessionId": session_id,
+                "status": "generating",
+                "imageGeneration": {
+                    "startedAt": datetime.now().isoformat(),
+                    "total": len(session["image_prompts"]),
+                    "completed": 0,
+                    "failed": 0,
+                    "results": []
+                }
+            }
+            self.states[session_id] = {"status": status, "data": status_data, "remaining": count}
+
+            status.emit("started", {
+                "total": status_data["imageGeneration"]["total"],
+                "positions": [prompt_data["position"] for prompt_data in session["image_prompts"]],
+                "scheduler": True
+            }, status_data)
+
+            for prompt_data, output_path in session["skipped"]:
+                self.record_result(session_id, {
+                    "success": True,
+                    "output_path": output_path,
+                    "filename": os.path.basename(output_path),
+                    "generation_time": 0.0,
+                    "position": prompt_data["position"],
+                    "description": prompt_data.get("description", ""),
+                    "seed": None,
+                    "skipped": True
+                }, pending=False)
+
+    def record_result(self, session_id: str, result: Dict[str, Any], pending: bool = True) -> None:
+        """結果をセッションの状況に記録"""
+        state = self.states[session_id]
+        generation = state["data"]["imageGeneration"]
+        generation["results"].append(result)
+        if result["success"]:
+            generation["completed"] += 1
+        else:
+            generation["failed"] += 1
+        if pending:
+            state["remaining"] -= 1
+
+        index = generation["completed"] + generation["failed"]
+        state["status"].emit("image", dict(result, index=index, total=generation["total"]), state["data"])
+
+    def finish_session(self, session_id: str) -> None:
+        """セッションの全画像の書き込み完了を待ち、派生ファイル作成・最終状況を確定"""
+        state = self.states[session_id]
+        generation = state["data"]["imageGeneration"]
+
+        # 書き込み失敗は他セッションの分も返るため、全セッションの結果に反映する
+        failures = self.generator.flush()
+        if failures:
+            for other_id, other in self.states.items():
+                other_generation = other["data"]["imageGeneration"]
+                if apply_write_failures(other_generation["results"], failures):
+                    other_generation["completed"] = sum(1 for result in other_generation["results"] if result["success"])
+                    other_generation["failed"] = len(other_generation["results"]) - other_generation["completed"]
+                    other["status"].emit("write_failed", {"failures": failures}, other["data"])
+
+        if self.derivatives and generation["completed"] > 0:
+            from .derivatives import process_sessions
+
+            try:
+                summary = process_sessions([self.sessions[session_id]["output_dir"]])
+                generation["derivatives"] = {
+                    "manifest": summary["manifests"][0] if summary["manifests"] else None,
+                    "created": summary["created"],
+                    "failed": summary["failed"]
+                }
+            except Exception as e:
+                print(f"⚠️ 派生ファイル作成エラー ({session_id}): {e}")
+
+        state["data"]["status"] = "completed" if generation["failed"] == 0 else "completed_with_errors"
+        generation["completedAt"] = datetime.now().isoformat()
+        state["status"].emit("completed", {
+            "status": state["data"]["status"],
+            "completed": generation["completed"],
+            "failed": generation["failed"]
+        }, state["data"])
+        print(f"🏁 セッション完了: {session_id} (成功 {generation['completed']} / 失敗 {generation['failed']})")
+
+    def finish_interrupted(self) -> None:
+        """未完了セッションを中断状態で確定"""
+        self.generator.flush()
+        for session_id, state in self.states.items():
+            if state["remaining"] <= 0:
+                continue
+            state["data"]["status"] = "interrupted"
+            state["data"]["imageGeneration"]["interruptedAt"] = datetime.now().isoformat()
+            state["status"].emit("interrupted", {"remaining": state["remaining"]}, state["data"])
+
+    def run(self) -> Dict[str, Any]:
+        """作業リストを処理し、スループット集計を返す"""
+        self.start_sessions()
+
+        started = time.monotonic()
+        busy = 0.0
+        headers_done_at = None
+        header_count = sum(1 for item in self.items if position_priority(item["prompt_data"]["position"]) == 0)
+        counts = {"generated": 0, "reused": 0, "failed": 0}
+
+        for start in range(0, len(self.items), self.chunk_size):
+            if self.interrupted:
+                break
+
+            chunk = self.items[start:start + self.chunk_size]
+            labels = ", ".join(f"{item['session_id']}/{item['prompt_data']['position']}" for item in chunk)
+            print(f"\n📊 進捗: {start + 1}-{start + len(chunk)}/{len(self.items)} - {labels}")
+
+            requests = [self.build_generation_request(item) for item in chunk]
+            call_started = time.monotonic()
+            results = self.generator.generate_batch(requests, max_batch_size=self.batch_size)
+            busy += time.monotonic() - call_started
+
+            finished_sessions = []
+            for item, result in zip(chunk, results):
+                if result.get("interrupted"):
+                    self.interrupted = True
+                    continue
+                if not result["success"]:
+                    counts["failed"] += 1
+                elif result.get("cached"):
+                    counts["reused"] += 1
+                else:
+                    counts["generated"] += 1
+
+                self.record_result(item["session_id"], result)
+                if self.states[item["session_id"]]["remaining"] == 0:
+                    finished_sessions.append(item["session_id"])
+
+            if headers_done_at is None and start + len(chunk) >= header_count:
+                headers_done_at = time.monotonic() - started
+
+            for session_id in finished_sessions:
+                self.finish_session(session_id)
+
+        if self.interrupted:
+            self.finish_interrupted()
+
+        wall = time.monotonic() - started
+        return {
+            "sessions": len(self.states),
+            "items": len(self.items),
+            "generated": counts["generated"],
+            "reused": counts["reused"],
+            "failed": counts["failed"],
+            "skipped": sum(len(session["skipped"]) for session in self.sessions.values()),
+            "interrupted": self.interrupted,
+            "wallSeconds": round(wall, 1),
+            "busySeconds": round(busy, 1),
+            "idleSeconds": round(max(0.0, wall - busy), 1),
+            "imagesPerHour": round(counts["generated"] * 3600 / wall, 1) if wall > 0 else None,
+            "headersCompletedAfter": round(headers_done_at, 1) if headers_done_at is not None and header_count else None
+        }
+
+
+def find_article_files(patterns: List[str], job_dirs: List[str]) -> List[str]:
+    """glob パターンとジョブディレクトリから記事JSON一覧を作成（順序は名前順＝作成順）"""
+    files = []
+    for pattern in patterns:
+        files.extend(sorted(glob.glob(pattern)))
+    for job_dir in job_dirs:
+        files.extend(sorted(glob.glob(os.path.join(job_dir, "*.json"))))
+
+    unique = []
+    for path in files:
+        if path not in unique:
+            unique.append(path)
+    return unique
+
+
+def main():
+    """メイン処理"""
+    from .client import get_generator
+
+    parser = argparse.ArgumentParser(description='複数セッションの画像生成スケジューラー（ヘッダー優先・モデルロード1回）')
+    parser.add_argument('--articles', action='append', default=[], help='記事JSONの glob パターン（複数指定可）')
+    parser.add_argument('--job-dir', action='append', default=[], help='記事JSONを置いたジョブディレクトリ（複数指定可）')
+    parser.add_argument('--base-dir', default=OUTPUT_BASE_DIR, help=f'生成画像ディレクトリ（デフォルト: {OUTPUT_BASE_DIR}）')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--no-server', action='store_true', help='常駐生成サーバーを使わずプロセス内でモデルをロード')
+    parser.add_argument('--batch-size', type=int, default=1, help='1回のパイプライン呼び出しでまとめて生成する最大枚数（デフォルト: 1）')
+    parser.add_argument('--force', action='store_true', help='有効な画像があるポジションも再生成')
+    parser.add_argument('--no-derivatives', action='store_true', help='WebP/AVIF・OGP・LQIP派生ファイルを作成しない')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_INTERVAL,
+                        help=f'途中経過を保存するステップ間隔（デフォルト: {CHECKPOINT_INTERVAL}、0でSIGTERM時のみ保存）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='CPUワーカープロセス数（2以上で重みを共有するワーカープールを使用、常駐サーバーは使わない）')
+    parser.add_argument('--threads', type=int, default=POOL_THREADS_PER_WORKER,
+                        help=f'ワーカーごとの torch スレッド数（デフォルト: {POOL_THREADS_PER_WORKER}）')
+    parser.add_argument('--memory-profile', choices=list(MEMORY_PROFILES),
+                        help=f'メモリプロファイル（デフォルト: {MEMORY_PROFILE}、記事の parameters.memory_profile が優先）')
+    parser.add_argument('--speed-profile', choices=list(SPEED_PROFILES),
+                        help=f'速度プロファイル（デフォルト: {SPEED_PROFILE}、記事の parameters.speed_profile が優先）')
+    parser.add_argument('--dry-run', action='store_true', help='作業リストを表示するだけで生成しない')
+
+    args = parser.parse_args()
+    if not args.articles and not args.job_dir:
+        parser.error("--articles または --job-dir を指定してください")
+
+    sessions = load_sessions(find_article_files(args.articles, args.job_dir))
+    items = build_work_list(sessions, args.base_dir, force=args.force)
+
+    print(f"🗂️ 対象セッション: {len(sessions)}件 / 生成待ち画像: {len(items)}枚")
+    up_to_date = [session["session_id"] for session in sessions
+                  if not any(item["session_id"] == session["session_id"] for item in items)]
+    if up_to_date:
+        print(f"⏭️ 生成済みのセッション: {len(up_to_date)}件")
+
+    if args.dry_run or not items:
+        for item in items:
+            print(f"  - {item['session_id']}/{item['prompt_data']['position']}")
+        sys.exit(0)
+
+    load_started = time.monotonic()
+    if args.workers > 1:
+        from .generator import LocalGenerator
+        from .worker_pool import WorkerPool
+
+        generator = WorkerPool(
+            LocalGenerator.from_model(args.model_path, device="cpu", memory_profile=args.memory_profile),
+            args.workers, args.threads
+        )
+    else:
+        generator = get_generator(args.model_path, use_server=not args.no_server, memory_profile=args.memory_profile)
+    load_time = time.monotonic() - load_started
+
+    scheduler = SessionScheduler(
+        generator, sessions, items,
+        batch_size=args.batch_size,
+        force=args.force,
+        derivatives=not args.no_derivatives,
+        checkpoint_every=args.checkpoint_every,
+        memory_profile=args.memory_profile,
+        speed_profile=args.speed_profile
+    )
+
+    def handle_sigterm(signum, frame):
+        print(f"\n🛑 シグナル {signum} を受信しました。チェックポイントを保存して中断します...")
+        scheduler.interrupt()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    summary = scheduler.run()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    summary["modelLoadSeconds"] = round(load_time, 1)
+    stage_stats = generator.stage_stats()
+    if stage_stats:
+        summary["stages"] = stage_stats
+    if args.workers > 1:
+        summary["workers"] = {"processes": args.workers, "threads": args.threads, "memory": generator.memory_summary()}
+        generator.close()
+
+    summary_path = os.path.join(STATUS_EVENTS_DIR, f"scheduler-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    write_json_atomic(summary_path, dict(summary, finishedAt=datetime.now().isoformat()))
+
+    print(f"\n📈 スループット集計")
+    print(f"🗂️ セッション: {summary['sessions']}件 / 作業: {summary['items']}枚")
+    print(f"✅ 生成: {summary['generated']}枚 / ♻️ 再利用: {summary['reused']}枚 / ⏭️ スキップ: {summary['skipped']}枚 / ❌ 失敗: {summary['failed']}枚")
+    print(f"⏱️ 経過: {summary['wallSeconds']}秒（生成 {summary['busySeconds']}秒 / アイドル {summary['idleSeconds']}秒）"
+          f" + モデルロード {summary['modelLoadSeconds']}秒")
+    if summary["imagesPerHour"] is not None:
+        print(f"🚀 スループット: {summary['imagesPerHour']} 枚/時")
+    if stage_stats:
+        print(f"⏱️ 段階別時間: {format_stages(stage_stats)}")
+    if summary["headersCompletedAfter"] is not None:
+        print(f"📰 全ヘッダー画像完了: 開始から {summary['headersCompletedAfter']}秒")
+    print(f"📄 {summary_path}")
+
+    if summary["interrupted"]:
+        print(f"⏸️ 中断しました。同じコマンドで続きから再開できます")
+        sys.exit(2)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+ContentFlow 常駐画像生成サーバー
+パイプラインを一度だけロードし、ループバックHTTPで生成リクエストを受け付ける
+
+Usage:
+    python -m contentflow_sd.server [--port 7861] [--model-path /path/to/model]
+
+Endpoints:
+    GET  /health          サーバー状態
+    GET  /progress        生成中のデノイズステップ進捗（生成していなければ progress は null）
+    POST /generate        生成リクエスト（contentflow_sd.generator 参照）→ 生成結果辞書
+    POST /generate-batch  {"requests": [...], "max_batch_size": 4} → {"results": [...]}
+    POST /flush           画像のバックグラウンド書き込み完了待ち → {"failures": {出力パス: エラー}}
+    POST /interrupt       実行中の生成をチェックポイント保存後に中断 → {"interrupted": true/false}
+"""
+
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .settings import MODEL_PATH, SERVER_HOST, SERVER_PORT, SERVER_PID_FILE, MEMORY_PROFILES, MEMORY_PROFILE
+from .generator import LocalGenerator
+
+
+class GenerationServer(ThreadingHTTPServer):
+    """ロード済みジェネレーターを保持するHTTPサーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address, generator: LocalGenerator):
+        super().__init__(address, GenerationRequestHandler)
+        self.generator = generator
+        # パイプラインはスレッドセーフではないため生成は直列化
+        self.generation_lock = threading.Lock()
+        self.started_at = datetime.now().isoformat()
+        self.busy = False
+        # クライアントが /progress で取得する最新のステップ進捗（tqdm出力は抑制される）
+        self.progress = None
+        generator.set_progress_callback(self.update_progress)
+
+    def update_progress(self, progress) -> None:
+        self.progress = progress
+
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    """生成リクエストハンドラー"""
+
+    server: GenerationServer
+
+    def log_message(self, format, *args):
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {format % args}")
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        if self.path == "/progress":
+            self._send_json(200, {
+                "busy": self.server.busy,
+                "progress": self.server.progress if self.server.busy else None
+            })
+            return
+
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        self._send_json(200, {
+            "status": "ready",
+            "busy": self.server.busy,
+            "model_path": self.server.generator.model_path,
+            "memory_profile": self.server.generator.memory_profile,
+            "started_at": self.server.started_at,
+            "requests_served": self.server.generator.requests_served,
+            "pending_writes": self.server.generator.writer.pending_count() if self.server.generator.writer else 0,
+            "embedding_cache": self.server.generator.cache_stats(),
+            "stages": self.server.generator.stage_stats(),
+            "pid": os.getpid()
+        })
+
+    def do_POST(self):
+        if self.path == "/flush":
+            # 生成とは独立して待てるためロック不要（書き込みは次の生成と並行して進む）
+            self._send_json(200, {"failures": self.server.generator.flush()})
+            return
+
+        if self.path == "/interrupt":
+            # 実行中の生成のみ停止（次のステップ終了時にチェックポイントを保存して中断結果を返す）
+            interrupted = self.server.busy
+            if interrupted:
+                self.server.generator.interrupt()
+            self._send_json(200, {"interrupted": interrupted})
+            return
+
+        if self.path not in ("/generate", "/generate-batch"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            payload = self._read_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {"success": False, "error": f"不正なリクエスト: {e}"})
+            return
+
+        requests = payload.get("requests", []) if self.path == "/generate-batch" else [payload]
+        for request in requests:
+            missing = [key for key in ("prompt", "position", "output_dir") if key not in request]
+            if missing:
+                self._send_json(400, {"success": False, "error": f"必須フィールドが不足: {', '.join(missing)}"})
+                return
+
+        with self.server.generation_lock:
+            self.server.busy = True
+            try:
+                print(f"🎨 生成リクエスト: {', '.join(request['position'] for request in requests)}")
+                if self.path == "/generate":
+                    response = self.server.generator.generate(payload)
+                else:
+                    response = {
+                        "results": self.server.generator.generate_batch(
+                            requests, max_batch_size=int(payload.get("max_batch_size", 4))
+                        )
+                    }
+            finally:
+                self.server.busy = False
+                self.server.progress = None
+
+        self._send_json(200, response)
+
+
+def write_pid_file():
+    """PIDファイル保存"""
+    with open(SERVER_PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+
+
+def remove_pid_file():
+    """PIDファイル削除"""
+    if os.path.exists(SERVER_PID_FILE):
+        os.remove(SERVER_PID_FILE)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='ContentFlow 常駐画像生成サーバー')
+    parser.add_argument('--host', default=SERVER_HOST, help=f'待ち受けホスト（デフォルト: {SERVER_HOST}）')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help=f'待ち受けポート（デフォルト: {SERVER_PORT}）')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--memory-profile', choices=list(MEMORY_PROFILES), default=MEMORY_PROFILE,
+                        help=f'メモリプロファイル（デフォルト: {MEMORY_PROFILE}、リクエストの parameters.memory_profile で画像ごとに変更可）')
+
+    args = parser.parse_args()
+
+    if args.host not in ("127.0.0.1", "localhost", "::1"):
+        print(f"❌ ループバックアドレス以外では起動できません: {args.host}")
+        sys.exit(1)
+
+    print("🚀 ContentFlow 常駐画像生成サーバー起動")
+    print("=" * 60)
+
+    generator = LocalGenerator.from_model(args.model_path, memory_profile=args.memory_profile)
+    server = GenerationServer((args.host, args.port), generator)
+
+    def shutdown(signum, frame):
+        print(f"\n🛑 シグナル {signum} を受信しました。サーバー停止中...")
+        # 生成中なら次のステップでチェックポイントを保存して止める
+        if server.busy:
+            generator.interrupt()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    write_pid_file()
+    print(f"✅ 待ち受け開始: http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        # 中断処理中の生成（チェックポイント保存）の完了を待つ
+        with server.generation_lock:
+            pass
+        if generator.writer is not None:
+            generator.writer.close()
+        remove_pid_file()
+        print("👋 サーバー停止完了")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+ContentFlow SD 共通設定
+"""
+
+import os
+
+# モデル・実行環境
+MODEL_PATH = "/Users/gotohiro/Documents/user/Products/AI/models/diffusers/juggernaut-xl"
+PYTHON_ENV = "/Users/gotohiro/Documents/user/Products/stable-diffusion-local/venv310/bin/python"
+DEVICE = os.environ.get("CONTENTFLOW_DEVICE", "auto")  # auto: CUDA → MPS（Apple Silicon）→ CPU の順に判定
+
+# CPU実行（DEVICE が cpu と判定された場合）
+CPU_DTYPE = os.environ.get("CONTENTFLOW_CPU_DTYPE", "auto")  # auto: ネイティブbfloat16対応CPUなら bfloat16、それ以外は float32
+CPU_THREADS = int(os.environ.get("CONTENTFLOW_CPU_THREADS", "0"))  # 0: 利用可能なCPU数
+CPU_CHANNELS_LAST = os.environ.get("CONTENTFLOW_CPU_CHANNELS_LAST", "1") != "0"
+
+# 出力先
+OUTPUT_BASE_DIR = "public/images/blog/auto-generated"
+RESULT_INDEX_FILE = os.path.join(OUTPUT_BASE_DIR, "result-index.json")  # 生成結果キャッシュのインデックス
+
+# 画像生成デフォルトパラメータ（16:9比率、8の倍数）
+DEFAULT_PARAMETERS = {
+    "width": 1600,
+    "height": 896,
+    "num_inference_steps": 25,
+    "guidance_scale": 7.5
+}
+
+# parameters の許容範囲（幅・高さは8の倍数、python -m contentflow_sd.validation と各生成スクリプトの事前検証）
+PARAMETER_LIMITS = {
+    "width": (64, 2048),
+    "height": (64, 2048),
+    "num_inference_steps": (1, 150),
+    "guidance_scale": (0.0, 30.0),
+    "strength": (0.0, 1.0),
+    "seed": (0, 2**32 - 1)
+}
+VALIDATION_DIRS = ["articles", "articles/processed", "data/jobs/configs"]
+
+# 超強化ネガティブプロンプト（人物描画完全防止）
+HUMAN_PREVENTION_PROMPT = "person, people, human, man, woman, face, realistic human features, portrait, character, figure, body, silhouette, sitting person, standing person, anyone, somebody, individual"
+
+# 常駐生成サーバー（ループバックのみ）
+SERVER_HOST = os.environ.get("CONTENTFLOW_SD_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("CONTENTFLOW_SD_PORT", "7861"))
+SERVER_PID_FILE = "sd-server.pid"
+
+# モデルのsafetensors変換キャッシュ（python -m contentflow_sd.model_cache で作成、メモリマップでロード）
+# 作業ディレクトリを変えて実行するベンチマークからも同じキャッシュを使うため絶対パスにする
+MODEL_CACHE_DIR = os.path.abspath(os.environ.get("CONTENTFLOW_MODEL_CACHE_DIR", ".cache/models"))
+
+# プロンプト埋め込みキャッシュ
+EMBEDDING_CACHE_DIR = ".cache/prompt-embeddings"
+EMBEDDING_CACHE_MAX_ENTRIES = 512  # ディスク上の最大エントリ数（LRUで削除）
+EMBEDDING_CACHE_MEMORY_ENTRIES = 64
+
+# バックグラウンド画像書き込み（PNGエンコード・保存を次の生成と並行実行）
+WRITER_THREADS = 2
+WRITER_MAX_PENDING = 4  # 未書き込み画像の上限（超えると生成側が待つ）
+
+# プログレッシブ生成（低解像度プレビュー → 選択候補のみフル解像度で仕上げ）
+PREVIEW_SCALE = 0.5  # プレビューの縦横比率（1600x896 → 800x448）
+PREVIEW_STEPS = 10
+REFINE_STRENGTH = 0.5  # 仕上げimg2imgの強さ（フルステップのうち実際に実行する割合）
+PREVIEW_DIR_NAME = "previews"
+
+# レスポンシブ画像派生ファイル（srcset・OGP・LQIP）
+DERIVATIVE_DIR_NAME = "derivatives"
+DERIVATIVE_WIDTHS = [480, 800, 1200, 1600]
+DERIVATIVE_FORMATS = {"webp": 80, "avif": 50}  # 形式 → 品質
+OG_IMAGE_SIZE = (1200, 630)
+OG_IMAGE_QUALITY = 85
+LQIP_WIDTH = 16
+
+# 生成状況（スナップショット＋セッションごとの追記専用イベントログ）
+STATUS_FILE = "image-generation-status.json"
+STATUS_EVENTS_DIR = "logs/image-generation"
+
+# デノイズステップ進捗（通知間隔の下限と秒/ステップの移動平均ウィンドウ）
+PROGRESS_MIN_INTERVAL = 1.0
+PROGRESS_WINDOW = 5
+
+# 生成途中チェックポイント（出力ディレクトリ内に保存、中断後 --resume で再開）
+CHECKPOINT_DIR_NAME = ".checkpoints"
+CHECKPOINT_INTERVAL = 5  # ステップ数（0で定期保存なし、中断時のみ保存）
+
+# CPUワーカープール（親プロセスでロードした重みを fork したワーカーで共有）
+POOL_THREADS_PER_WORKER = 4  # ワーカーごとの torch スレッド数
+
+# 締め切り付き生成（--deadline、ワーカーのタイムアウト内に全シーンが収まるようステップ数・解像度・スケジューラーを計画）
+DEADLINE_MARGIN = 30.0  # 秒（画像の書き込み待ち・結果JSONの保存に残す時間）
+DEADLINE_MIN_STEPS = 8  # これ未満にはステップ数を減らさない
+DEADLINE_MIN_SCALE = 0.5  # 解像度を下げる場合の縦横比率の下限（--deadline-resize）
+DEADLINE_SCHEDULER = "dpmpp_2m_karras"  # ステップ数を減らした画像のスケジューラー（--deadline-scheduler、少ステップでも破綻しにくい）
+DEADLINE_HISTORY_EVENTS = 200  # 初期見積もりに使う metrics.jsonl の直近の区間数
+
+# 同一プロンプトのバリエーションを1回のパイプライン呼び出しで生成する最大枚数（メモリ不足時は自動で半減）
+# GPU / MPS で効果がある。演算律速のCPU実行では速くならないため 1（逐次）でよい
+VARIATION_BATCH_SIZE = int(os.environ.get("CONTENTFLOW_VARIATION_BATCH_SIZE", "4"))
+
+# 段階別計測（1区間1行のJSONL＋Prometheus textfile collector 形式、CONTENTFLOW_METRICS=0 で無効）
+METRICS_ENABLED = os.environ.get("CONTENTFLOW_METRICS", "1") != "0"
+METRICS_EVENTS_FILE = os.path.join(STATUS_EVENTS_DIR, "metrics.jsonl")
+METRICS_TEXTFILE_DIR = os.environ.get("CONTENTFLOW_METRICS_TEXTFILE_DIR", "logs/metrics")  # node_exporter の --collector.textfile.directory
+
+# 生成性能の履歴（1枚1行のSQLite、CONTENTFLOW_PERF_STORE=0 で記録しない）
+PERF_STORE_ENABLED = os.environ.get("CONTENTFLOW_PERF_STORE", "1") != "0"
+PERF_STORE_FILE = os.path.join(STATUS_EVENTS_DIR, "performance.sqlite3")
+PERF_REGRESSION_THRESHOLD = 0.15  # 直近期間の s/it 中央値が基準より15%以上遅ければ回帰
+PERF_BASELINE_PERIODS = 4  # 基準にする直前の期間数
+
+# メモリプロファイル（パイプライン単位、プロンプトの parameters.memory_profile で画像ごとにも指定可）
+# vae_slicing・vae_tiling: VAEデコードを1枚ずつ・タイル単位で実行（1600x896 のデコード時のピークを抑える）
+# offload: "model"=使用中のモデルのみデバイスへ / "sequential"=層単位で転送（最小メモリ・最も低速、CPU実行では無効）
+# unload_text_encoders: 埋め込み取得後にテキストエンコーダーを解放（埋め込みキャッシュのミス時のみ再ロード）
+# attention_slicing: アテンションを分割計算（torch 2 の SDPA より遅くメモリも減らないことが多いため minimal のみ）
+MEMORY_PROFILES = {
+    "default": {},
+    "balanced": {"vae_slicing": True, "vae_tiling": True},
+    "low": {"vae_slicing": True, "vae_tiling": True, "offload": "model", "unload_text_encoders": True},
+    "minimal": {"vae_slicing": True, "vae_tiling": True, "offload": "sequential", "unload_text_encoders": True,
+                "attention_slicing": True}
+}
+MEMORY_PROFILE = os.environ.get("CONTENTFLOW_MEMORY_PROFILE", "default")
+
+# サンプラー（プロンプトの parameters.scheduler で指定、default はモデル同梱のスケジューラー）
+# class: diffusers のスケジューラークラス名、config: モデルのスケジューラー設定への上書き
+SCHEDULERS = {
+    "default": None,
+    "euler": {"class": "EulerDiscreteScheduler"},
+    "euler_a": {"class": "EulerAncestralDiscreteScheduler"},
+    "dpmpp_2m": {"class": "DPMSolverMultistepScheduler"},
+    "dpmpp_2m_karras": {"class": "DPMSolverMultistepScheduler", "config": {"use_karras_sigmas": True}},
+    "unipc": {"class": "UniPCMultistepScheduler"},
+    "lcm": {"class": "LCMScheduler"}
+}
+
+# LoRAアダプター（ローカルパスまたは Hugging Face のリポジトリID、空なら未設定）
+# プロンプト埋め込みキャッシュを共有するため、テキストエンコーダーを変更しない UNet のみのアダプターに限る
+ADAPTERS = {
+    "lcm": os.environ.get("CONTENTFLOW_LCM_LORA", "")  # 例: latent-consistency/lcm-lora-sdxl
+}
+
+# 速度プロファイル（プロンプトの parameters.speed_profile で指定、parameters の明示値が優先）
+# adapter が未設定のプロファイルは fallback のプロファイルで生成する
+SPEED_PROFILES = {
+    "default": {},
+    "fast": {"scheduler": "dpmpp_2m_karras", "num_inference_steps": 12},
+    "draft": {"scheduler": "lcm", "num_inference_steps": 6, "guidance_scale": 1.5, "adapter": "lcm", "fallback": "fast"}
+}
+SPEED_PROFILE = os.environ.get("CONTENTFLOW_SPEED_PROFILE", "default")
@@ -0,0 +1,115 @@
+"""
+画像生成状況の記録
+セッションごとの追記専用イベントログ（JSONL）と、コンパクトなスナップショット（一時ファイル → rename で原子的に置換）
+
+読み取り側はスナップショットを読んだ後、スナップショットの events.offset 以降だけをイベントログから読めば
+差分を取りこぼさない（イベント追記 → スナップショット更新の順で書くため）。
+イベントは1行1回の write で追記するので、書き込み途中の行は末尾の改行がないことで判別できる。
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from .settings import STATUS_FILE, STATUS_EVENTS_DIR
+
+
+def events_path(session_id: str, events_dir: str = STATUS_EVENTS_DIR) -> str:
+    """セッションのイベントログパス"""
+    return os.path.join(events_dir, f"{session_id}.jsonl")
+
+
+def session_snapshot_path(session_id: str, events_dir: str = STATUS_EVENTS_DIR) -> str:
+    """複数セッション実行時のセッション別スナップショットパス（イベントログと同じ場所）"""
+    return os.path.join(events_dir, f"{session_id}.json")
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    """JSONを一時ファイル経由で原子的に書き込み（読み取り側が書きかけの内容を読まない）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+class StatusLog:
+    """セッションの生成状況（イベントログ＋スナップショット）"""
+
+    def __init__(self, session_id: str, snapshot_file: str = STATUS_FILE, events_dir: str = STATUS_EVENTS_DIR):
+        self.session_id = session_id
+        self.snapshot_file = snapshot_file
+        self.events_file = events_path(session_id, events_dir)
+        os.makedirs(os.path.dirname(os.path.abspath(self.events_file)), exist_ok=True)
+
+        # 同一セッションの再実行は既存ログに追記する（"started" イベントが実行の区切り）
+        self.offset = os.path.getsize(self.events_file) if os.path.exists(self.events_file) else 0
+        self.seq = 0
+        # 進捗ポーリングスレッドからもスナップショットを書くため、状況データの変更と書き込みを排他
+        self.lock = threading.RLock()
+
+    def emit(self, event_type: str, data: Optional[Dict[str, Any]] = None,
+             snapshot: Optional[Dict[str, Any]] = None) -> None:
+        """イベントを追記し、snapshot 指定時はスナップショットも更新"""
+        with self.lock:
+            self._emit(event_type, data, snapshot)
+
+    def _emit(self, event_type: str, data: Optional[Dict[str, Any]], snapshot: Optional[Dict[str, Any]]) -> None:
+        self.seq += 1
+        event = {
+            "seq": self.seq,
+            "ts": datetime.now().isoformat(),
+            "sessionId": self.session_id,
+            "type": event_type,
+            "data": data or {}
+        }
+        line = (json.dumps(event, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+        try:
+            fd = os.open(self.events_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self.offset += len(line)
+        except OSError as e:
+            print(f"⚠️ イベントログ追記エラー: {e}")
+
+        if snapshot is not None:
+            self._write_snapshot(snapshot)
+
+    def write_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """スナップショットを原子的に書き込み（イベントログの読み取り位置を付与）"""
+        with self.lock:
+            self._write_snapshot(snapshot)
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        data = dict(snapshot)
+        data["updatedAt"] = datetime.now().isoformat()
+        data["events"] = {
+            "file": self.events_file,
+            "offset": self.offset,
+            "seq": self.seq
+        }
+        try:
+            write_json_atomic(self.snapshot_file, data)
+        except OSError as e:
+            print(f"⚠️ 状況スナップショット保存エラー: {e}")
+
+
+def read_events(path: str, offset: int = 0) -> Dict[str, Any]:
+    """offset 以降の完結したイベントを読み取り、次回の読み取り位置とともに返す"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+    except OSError:
+        return {"events": [], "offset": offset}
+
+    # 末尾の書きかけ行は次回に回す
+    end = chunk.rfind(b"\n") + 1
+    events = [json.loads(line) for line in chunk[:end].decode('utf-8').splitlines() if line.strip()]
+    return {"events": events, "offset": offset + end}
@@ -0,0 +1,273 @@
+"""
+記事JSON・プロンプト設定の検証（torch を import せずにモデルロード前に実行できる）
+記事JSON（imagePrompts）と auto-sd-generator / ジョブのプロンプト設定（prompts + article_info）の
+必須フィールド・パラメータ範囲（幅・高さは8の倍数、ステップ数等）・ポジションの重複を検査する。
+各生成スクリプトは同じ検証を生成前に行う
+
+Usage:
+    python -m contentflow_sd.validation                      # articles/・articles/processed/・data/jobs/configs/ を並列検証
+    python -m contentflow_sd.validation articles/new-article.json
+    python -m contentflow_sd.validation --strict             # 警告（説明なし・長すぎるプロンプト等）もエラー扱い
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from .settings import PARAMETER_LIMITS, VALIDATION_DIRS, MEMORY_PROFILES, SPEED_PROFILES, SCHEDULERS
+
+# CLIPテキストエンコーダーの最大トークン数（開始・終了トークンを除く）
+CLIP_MAX_TOKENS = 75
+
+ARTICLE_PROMPT_FIELDS = ("position", "prompt", "style", "negativePrompt")
+CONFIG_PROMPT_FIELDS = ("name", "prompt", "filename_prefix")
+CONFIG_FIELDS = ("prompts", "article_info")
+PROFILE_CHOICES = {
+    "memory_profile": MEMORY_PROFILES,
+    "speed_profile": SPEED_PROFILES,
+    "scheduler": SCHEDULERS
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """CLIPトークン数の概算（単語と記号の数）"""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def is_number(value: Any) -> bool:
+    """bool を除く数値"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_parameters(params: Any, where: str) -> List[str]:
+    """生成パラメータの範囲・型の検証（エラーメッセージの一覧）"""
+    if not isinstance(params, dict):
+        return [f"{where}: parameters がオブジェクトではありません"]
+
+    errors = []
+    for name, (low, high) in PARAMETER_LIMITS.items():
+        value = params.get(name)
+        if value is None:
+            continue
+        integer = name in ("width", "height", "num_inference_steps", "seed")
+        if not is_number(value) or (integer and not isinstance(value, int)):
+            errors.append(f"{where}: {name} が{'整数' if integer else '数値'}ではありません: {value!r}")
+            continue
+        if not low <= value <= high:
+            errors.append(f"{where}: {name} が範囲外です: {value}（{low}〜{high}）")
+        elif name in ("width", "height") and value % 8 != 0:
+            errors.append(f"{where}: {name} が8の倍数ではありません: {value}")
+
+    for name, choices in PROFILE_CHOICES.items():
+        value = params.get(name)
+        if value is not None and value not in choices:
+            errors.append(f"{where}: 不明な {name}: {value!r}（{', '.join(choices)}）")
+    return errors
+
+
+def validate_article(data: Any) -> Dict[str, List[str]]:
+    """記事JSON（metadata + article + imagePrompts）の検証"""
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    prompts = data.get("imagePrompts") if isinstance(data, dict) else None
+    if not isinstance(prompts, list) or not prompts:
+        return {"errors": ["imagePrompts が空、または配列ではありません"], "warnings": warnings}
+
+    positions: Dict[str, int] = {}
+    for index, prompt in enumerate(prompts):
+        where = f"imagePrompts[{index}]"
+        if not isinstance(prompt, dict):
+            errors.append(f"{where}: オブジェクトではありません")
+            continue
+
+        missing = [field for field in ARTICLE_PROMPT_FIELDS if not isinstance(prompt.get(field), str) or not prompt[field].strip()]
+        if missing:
+            errors.append(f"{where}: 必須フィールドがない、または空です: {', '.join(missing)}")
+
+        position = prompt.get("position")
+        if isinstance(position, str):
+            where = f"{where}（{position}）"
+            if position in positions:
+                errors.append(f"{where}: ポジションが imagePrompts[{positions[position]}] と重複しています")
+            positions.setdefault(position, index)
+
+        if "parameters" in prompt:
+            errors.extend(validate_parameters(prompt["parameters"], where))
+
+        if not prompt.get("description"):
+            warnings.append(f"{where}: description がありません")
+        if isinstance(prompt.get("prompt"), str) and isinstance(prompt.get("style"), str):
+            tokens = estimate_tokens(f"{prompt['prompt']}, {prompt['style']}")
+            if tokens > CLIP_MAX_TOKENS:
+                warnings.append(f"{where}: prompt + style が約{tokens}トークンで、{CLIP_MAX_TOKENS}トークンを超える部分は無視されます")
+
+    return {"errors": errors, "warnings": warnings}
+
+
+def validate_prompt_config(config: Any) -> Dict[str, List[str]]:
+    """auto-sd-generator / ジョブのプロンプト設定（prompts + article_info）の検証"""
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    if not isinstance(config, dict):
+        return {"errors": ["設定がオブジェクトではありません"], "warnings": warnings}
+    missing = [field for field in CONFIG_FIELDS if field not in config]
+    if missing:
+        return {"errors": [f"必須フィールドが不足: {', '.join(missing)}"], "warnings": warnings}
+
+    prompts = config["prompts"]
+    if not isinstance(prompts, list) or not prompts:
+        return {"errors": ["プロンプト配列が無効です"], "warnings": warnings}
+
+    names: Dict[str, int] = {}
+    prefixes: Dict[str, int] = {}
+    for index, prompt in enumerate(prompts):
+        where = f"プロンプト{index + 1}"
+        if not isinstance(prompt, dict):
+            errors.append(f"{where}: オブジェクトではありません")
+            continue
+
+        missing = [field for field in CONFIG_PROMPT_FIELDS if field not in prompt]
+        if missing:
+            errors.append(f"{where}: 必須フィールドが不足: {', '.join(missing)}")
+
+        name = prompt.get("name")
+        if isinstance(name, str):
+            where = f"{where}（{name}）"
+            if name in names:
+                errors.append(f"{where}: name がプロンプト{names[name] + 1}と重複しています")
+            names.setdefault(name, index)
+        prefix = prompt.get("filename_prefix")
+        if isinstance(prefix, str):
+            if prefix in prefixes:
+                errors.append(f"{where}: filename_prefix がプロンプト{prefixes[prefix] + 1}と重複しています")
+            prefixes.setdefault(prefix, index)
+
+        # プロンプト単位の seed / memory_profile / speed_profile / scheduler は parameters と同じ規則
+        errors.extend(validate_parameters(
+            {key: prompt[key] for key in ("seed", *PROFILE_CHOICES) if key in prompt}, where
+        ))
+
+        if not prompt.get("description"):
+            warnings.append(f"{where}: description がありません")
+        if isinstance(prompt.get("prompt"), str) and estimate_tokens(prompt["prompt"]) > CLIP_MAX_TOKENS:
+            warnings.append(f"{where}: prompt が約{estimate_tokens(prompt['prompt'])}トークンで、"
+                            f"{CLIP_MAX_TOKENS}トークンを超える部分は無視されます")
+
+    return {"errors": errors, "warnings": warnings}
+
+
+def validate_file(path: str) -> Dict[str, Any]:
+    """1ファイルの検証（種類は内容から判定、画像プロンプトを含まない記事は対象外）"""
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"path": path, "kind": None, "errors": [], "warnings": []}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        result["errors"].append(f"読み込みエラー: {e}")
+    else:
+        if isinstance(data, dict) and "imagePrompts" in data:
+            result["kind"] = "article"
+            result.update(validate_article(data))
+        elif isinstance(data, dict) and "prompts" in data:
+            result["kind"] = "config"
+            result.update(validate_prompt_config(data))
+        else:
+            # 投稿済み記事（title / body のみ）等は生成の入力ではない
+            result["kind"] = "skipped"
+    result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    """検証対象のJSON（ディレクトリは直下の *.json）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        elif os.path.exists(path):
+            files.append(path)
+    return files
+
+
+def validate_files(files: List[str], workers: Optional[int] = None):
+    """ファイル群を並列に検証し、結果をファイル順に逐次返す"""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(files) < 2:
+        yield from map(validate_file, files)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+        yield from executor.map(validate_file, files, chunksize=max(1, len(files) // (workers * 4)))
+
+
+def print_messages(result: Dict[str, Any]) -> None:
+    """検証結果のエラー・警告を表示"""
+    for error in result["errors"]:
+        print(f"❌ {error}")
+    for warning in result.get("warnings", []):
+        print(f"⚠️ {warning}")
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='記事JSON・プロンプト設定の一括検証（モデル・torch を読み込まない）')
+    parser.add_argument('paths', nargs='*', help=f'検証するファイル・ディレクトリ（デフォルト: {", ".join(VALIDATION_DIRS)}）')
+    parser.add_argument('--workers', type=int, help='並列プロセス数（デフォルト: CPU数、1で逐次）')
+    parser.add_argument('--strict', action='store_true', help='警告もエラーとして扱う')
+    parser.add_argument('--quiet', action='store_true', help='問題のあるファイルのみ表示')
+    parser.add_argument('--json', action='store_true', help='結果をJSON Linesで出力')
+
+    args = parser.parse_args()
+
+    files = collect_files(args.paths or VALIDATION_DIRS)
+    if not files:
+        print("⚠️ 検証対象のJSONがありません")
+        return
+
+    started = time.perf_counter()
+    counts = {"ok": 0, "warning": 0, "error": 0, "skipped": 0}
+    for result in validate_files(files, args.workers):
+        if args.strict:
+            result["errors"] = result["errors"] + result["warnings"]
+            result["warnings"] = []
+
+        if result["errors"]:
+            status, mark = "error", "❌"
+        elif result["warnings"]:
+            status, mark = "warning", "⚠️"
+        elif result["kind"] == "skipped":
+            status, mark = "skipped", "⏭️"
+        else:
+            status, mark = "ok", "✅"
+        counts[status] += 1
+
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+            continue
+        if args.quiet and status in ("ok", "skipped"):
+            continue
+        kind = {"article": "記事", "config": "設定", "skipped": "対象外"}.get(result["kind"], "不明")
+        print(f"{mark} {result['path']} [{kind}] {result['ms']}ms")
+        for error in result["errors"]:
+            print(f"    ❌ {error}")
+        for warning in result["warnings"]:
+            print(f"    ⚠️ {warning}")
+
+    elapsed = (time.perf_counter() - started) * 1000
+    if not args.json:
+        print(f"\n📊 {len(files)}ファイル: ✅ {counts['ok']} / ⚠️ {counts['warning']} / ❌ {counts['error']} / "
+              f"⏭️ 対象外 {counts['skipped']}（{elapsed:.0f}ms）")
+    if counts["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
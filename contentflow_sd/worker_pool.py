@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+CPUワーカープール
+親プロセスでモデルを1回だけロードし、fork したワーカープロセスがコピーオンライトで重みを共有する
+（重みのテンソルは読み取りのみのため、ワーカー数を増やしてもモデル分のメモリは増えない）
+
+Usage:
+    python -m contentflow_sd.worker_pool --benchmark --workers 4 --threads 4 --images 8
+    python -m contentflow_sd.scheduler --articles "articles/*.json" --workers 4 --threads 4
+
+ワーカーは共有キューからリクエストのまとまりを取り出して生成する。WorkerPool は LocalGenerator と
+同じ generate / generate_batch / flush / interrupt を持つため、スケジューラーからそのまま使える。
+fork はCPU実行専用（MPS/CUDAのコンテキストは fork 後に使えない）。
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import signal
+import argparse
+import tempfile
+from typing import Dict, Any, List, Optional
+
+from .settings import MODEL_PATH, POOL_THREADS_PER_WORKER
+from .generator import LocalGenerator, error_result
+from .metrics import get_metrics
+
+WORKER_POLL_INTERVAL = 1.0
+
+
+def memory_usage() -> Dict[str, Optional[float]]:
+    """プロセスのメモリ使用量（MB）。PSS は共有ページをプロセス数で按分した値"""
+    usage: Dict[str, Optional[float]] = {"rssMB": None, "pssMB": None}
+    try:
+        with open("/proc/self/smaps_rollup", 'r') as f:
+            for line in f:
+                field, value = line.split(":", 1)
+                if field in ("Rss", "Pss"):
+                    usage[f"{field.lower()}MB"] = round(int(value.split()[0]) / 1024, 1)
+    except (OSError, ValueError):
+        import resource
+
+        # Linux以外は最大常駐サイズのみ（macOSはバイト単位）
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["rssMB"] = round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return usage
+
+
+def interrupted_result(request: Dict[str, Any]) -> Dict[str, Any]:
+    """停止要求後に受け取ったリクエストの結果"""
+    return {
+        "success": False,
+        "interrupted": True,
+        "error": "中断: ワーカー停止",
+        "position": request["position"]
+    }
+
+
+def _worker_main(index: int, generator: LocalGenerator, threads: int, tasks, results) -> None:
+    """ワーカープロセス本体（fork 直後に親のジェネレーターをそのまま使う）"""
+    import torch
+
+    torch.set_num_threads(threads)
+    # 親プロセスの textfile を上書きしないよう、ワーカーごとに別ファイルへ出力
+    get_metrics().configure(process=f"{get_metrics().process}-worker{index}")
+    stopping = []
+
+    def handle_sigterm(signum, frame):
+        stopping.append(signum)
+        generator.interrupt()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    # Ctrl+C は親プロセスが受けて各ワーカーに SIGTERM を送る
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    results.put(("ready", index, os.getpid(), memory_usage()))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, requests, max_batch_size = task
+        results.put(("claimed", index, task_id))
+
+        if stopping:
+            batch_results = [interrupted_result(request) for request in requests]
+        else:
+            try:
+                batch_results = generator.generate_batch(requests, max_batch_size=max_batch_size)
+            except Exception as e:
+                batch_results = [error_result(request, e) for request in requests]
+
+        results.put(("done", index, task_id, batch_results, memory_usage()))
+
+
+class WorkerPool:
+    """fork したワーカープロセス群（LocalGenerator と同じインターフェース）"""
+
+    def __init__(self, generator: LocalGenerator, workers: int, threads: int = POOL_THREADS_PER_WORKER):
+        import multiprocessing
+
+        context = multiprocessing.get_context("fork")
+        self.generator = generator
+        self.model_path = generator.model_path
+        self.parallelism = max(1, workers)
+        self.threads = threads
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.next_task_id = 0
+        self.in_flight: Dict[int, int] = {}
+        self.memory: Dict[int, Dict[str, Optional[float]]] = {}
+        self.requests_served = 0
+
+        # 遅延ロードのジェネレーターも fork 前に親プロセスでロード（ワーカー間で重みを共有するため）
+        generator.load()
+
+        # 書き込みスレッドは fork 先に引き継がれないため、ワーカーは同期保存する（保存自体がワーカー間で並列になる）
+        if generator.writer is not None:
+            generator.writer.close()
+            generator.writer = None
+
+        self.processes = []
+        for index in range(self.parallelism):
+            process = context.Process(
+                target=_worker_main,
+                args=(index, generator, threads, self.tasks, self.results),
+                name=f"sd-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        print(f"👷 ワーカープール起動: {self.parallelism}プロセス × {threads}スレッド")
+
+    def set_progress_callback(self, callback) -> None:
+        """ワーカー内のステップ進捗は取得しない（インターフェース互換のため）"""
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """埋め込みキャッシュ統計はワーカーごとのため集計しない"""
+        return None
+
+    def stage_stats(self) -> Optional[Dict[str, Any]]:
+        """段階別計測はワーカーごとの textfile・JSONL に出力する（集計しない）"""
+        return None
+
+    def flush(self) -> Dict[str, str]:
+        """ワーカーは同期保存のため待つ書き込みはない"""
+        return {}
+
+    def interrupt(self) -> None:
+        """全ワーカーに生成中の画像のチェックポイント保存と停止を指示"""
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """単一画像生成"""
+        return self.generate_batch([request], max_batch_size=1)[0]
+
+    def generate_batch(self, requests: List[Dict[str, Any]], max_batch_size: int = 1) -> List[Dict[str, Any]]:
+        """リクエストを max_batch_size ごとのタスクに分けてワーカーに配り、リクエスト順の結果を返す"""
+        chunk_size = max(1, max_batch_size)
+        chunks: Dict[int, List[Dict[str, Any]]] = {}
+        for start in range(0, len(requests), chunk_size):
+            task_id = self.next_task_id
+            self.next_task_id += 1
+            chunks[task_id] = requests[start:start + chunk_size]
+            self.tasks.put((task_id, chunks[task_id], chunk_size))
+
+        done: Dict[int, List[Dict[str, Any]]] = {}
+        # 前回の呼び出しで失敗扱いにしたタスクの結果が遅れて届いても、今回のタスクだけを待つ
+        while any(task_id not in done for task_id in chunks):
+            try:
+                message = self.results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                self._check_workers(chunks, done)
+                continue
+            self._handle(message, done)
+
+        results = [result for task_id in chunks for result in done[task_id]]
+        self.requests_served += sum(1 for result in results if result.get("success"))
+        return results
+
+    def _handle(self, message, done: Dict[int, List[Dict[str, Any]]]) -> None:
+        kind, index = message[0], message[1]
+        if kind == "ready":
+            self.memory[index] = message[3]
+        elif kind == "claimed":
+            self.in_flight[index] = message[2]
+        elif kind == "done":
+            self.in_flight.pop(index, None)
+            done.setdefault(message[2], message[3])
+            self.memory[index] = message[4]
+
+    def _check_workers(self, chunks: Dict[int, List[Dict[str, Any]]], done: Dict[int, List[Dict[str, Any]]]) -> None:
+        """異常終了したワーカーの処理中タスク（全滅時は未処理タスクすべて）を失敗にする"""
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or index not in self.in_flight:
+                continue
+            task_id = self.in_flight.pop(index)
+            if task_id in chunks and task_id not in done:
+                error = RuntimeError(f"ワーカープロセスが異常終了しました (exit {process.exitcode})")
+                done[task_id] = [error_result(request, error) for request in chunks[task_id]]
+
+        if not any(process.is_alive() for process in self.processes):
+            error = RuntimeError("稼働中のワーカープロセスがありません")
+            for task_id, chunk in chunks.items():
+                done.setdefault(task_id, [error_result(request, error) for request in chunk])
+
+    def memory_summary(self) -> Dict[str, Any]:
+        """親・ワーカーのメモリ使用量"""
+        return {
+            "parent": memory_usage(),
+            "workers": [self.memory.get(index) for index in range(len(self.processes))]
+        }
+
+    def close(self) -> None:
+        """ワーカーを終了"""
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+
+def benchmark_requests(count: int, output_dir: str, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """ベンチマーク用リクエスト（シードのみ異なる同一プロンプト）"""
+    return [{
+        "prompt": "modern minimalist workspace, natural light, wooden desk, plants",
+        "negative_prompt": "person, people, text, watermark",
+        "parameters": dict(parameters, seed=1000 + index),
+        "position": f"bench{index:03d}",
+        "output_dir": output_dir,
+        "force": True
+    } for index in range(count)]
+
+
+def run_benchmark(model_path: str, workers: int, threads: int, images: int, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """ワーカープールと単一プロセス（全スレッド使用）の画像/時を比較"""
+    import torch
+
+    generator = LocalGenerator.from_model(
+        model_path, device="cpu",
+        use_embedding_cache=False, use_result_cache=False, background_write=False
+    )
+    generator.pipe.set_progress_bar_config(disable=True)
+    output_dir = tempfile.mkdtemp(prefix="sd-pool-bench-")
+    report: Dict[str, Any] = {"workers": workers, "threads": threads, "images": images, "parameters": parameters}
+
+    try:
+        # fork 前に親プロセスで推論しない（OpenMPのスレッド状態を持ち込まない）
+        pool = WorkerPool(generator, workers, threads)
+        start_time = time.monotonic()
+        results = pool.generate_batch(benchmark_requests(images, output_dir, parameters), max_batch_size=1)
+        pool_time = time.monotonic() - start_time
+        report["pool"] = {
+            "seconds": round(pool_time, 1),
+            "succeeded": sum(1 for result in results if result["success"]),
+            "imagesPerHour": round(images * 3600 / pool_time, 1),
+            "memory": pool.memory_summary()
+        }
+        pool.close()
+
+        torch.set_num_threads(workers * threads)
+        start_time = time.monotonic()
+        results = generator.generate_batch(benchmark_requests(images, output_dir, parameters), max_batch_size=1)
+        single_time = time.monotonic() - start_time
+        report["single"] = {
+            "seconds": round(single_time, 1),
+            "succeeded": sum(1 for result in results if result["success"]),
+            "imagesPerHour": round(images * 3600 / single_time, 1),
+            "memory": memory_usage()
+        }
+        report["speedup"] = round(single_time / pool_time, 2)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    return report
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='CPUワーカープール（重み共有）のスループット計測')
+    parser.add_argument('--benchmark', action='store_true', help='ワーカープールと単一プロセスの画像/時を比較')
+    parser.add_argument('--model-path', default=MODEL_PATH, help='モデルディレクトリ')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // POOL_THREADS_PER_WORKER),
+                        help='ワーカープロセス数（デフォルト: CPUコア数 / スレッド数）')
+    parser.add_argument('--threads', type=int, default=POOL_THREADS_PER_WORKER,
+                        help=f'ワーカーごとの torch スレッド数（デフォルト: {POOL_THREADS_PER_WORKER}）')
+    parser.add_argument('--images', type=int, default=8, help='計測する画像枚数（デフォルト: 8）')
+    parser.add_argument('--steps', type=int, default=20, help='推論ステップ数（デフォルト: 20）')
+    parser.add_argument('--width', type=int, default=1024, help='画像幅（デフォルト: 1024）')
+    parser.add_argument('--height', type=int, default=576, help='画像高さ（デフォルト: 576）')
+    parser.add_argument('--output', help='計測結果JSONの保存先')
+
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.error("--benchmark を指定してください（記事画像の生成は contentflow_sd.scheduler --workers で実行）")
+
+    parameters = {"width": args.width, "height": args.height, "num_inference_steps": args.steps}
+    print(f"⏱️ ベンチマーク: {args.images}枚 ({args.width}x{args.height}, {args.steps}ステップ)")
+    report = run_benchmark(args.model_path, args.workers, args.threads, args.images, parameters)
+
+    print(f"\n📈 結果")
+    print(f"👷 プール {args.workers}×{args.threads}: {report['pool']['imagesPerHour']} 枚/時 ({report['pool']['seconds']}秒)")
+    print(f"🧍 単一プロセス {args.workers * args.threads}スレッド: {report['single']['imagesPerHour']} 枚/時 ({report['single']['seconds']}秒)")
+    print(f"🚀 速度比: {report['speedup']}倍")
+    for index, memory in enumerate(report["pool"]["memory"]["workers"]):
+        if memory:
+            print(f"🧠 ワーカー{index}: RSS {memory['rssMB']}MB / PSS {memory['pssMB']}MB")
+
+    if args.output:
+        import json
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
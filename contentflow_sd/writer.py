@@ -0,0 +1,133 @@
+"""
+バックグラウンド画像書き込み
+PNGエンコードとディスク書き込みをスレッドプールで行い、次の画像のデノイズと並行させる
+
+待ち行列は上限付き（上限に達すると submit が空きを待つ）で、未書き込み画像がメモリに溜まり続けない。
+書き込みは一時ファイル → fsync → os.replace で行い、保存後に読み直して検証する。
+呼び出し側は最終的な状況・結果ファイルを書く前に flush() で全書き込みの完了を待つこと。
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, List, Callable, Optional
+
+from .settings import WRITER_THREADS, WRITER_MAX_PENDING
+from .metrics import span
+
+
+class ImageWriter:
+    """上限付き待ち行列を持つ画像書き込みスレッドプール"""
+
+    def __init__(self, max_workers: int = WRITER_THREADS, max_pending: int = WRITER_MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Future] = {}
+        self.failures: Dict[str, str] = {}
+        self.written = 0
+
+    def submit(self, image, output_path: str, pnginfo=None, on_saved: Optional[Callable[[], None]] = None) -> None:
+        """画像の書き込みを予約（待ち行列が満杯なら空くまで待つ）"""
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self._write, image, output_path, pnginfo, on_saved)
+        except Exception:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.pending[output_path] = future
+        future.add_done_callback(lambda _: self._done(output_path, future))
+
+    def _done(self, output_path: str, future: Future) -> None:
+        with self.lock:
+            if self.pending.get(output_path) is future:
+                del self.pending[output_path]
+        self.slots.release()
+
+    def _write(self, image, output_path: str, pnginfo, on_saved: Optional[Callable[[], None]]) -> None:
+        try:
+            write_png(image, output_path, pnginfo)
+            if on_saved is not None:
+                on_saved()
+            with self.lock:
+                self.written += 1
+        except Exception as e:
+            print(f"❌ 画像保存エラー ({output_path}): {e}")
+            with self.lock:
+                self.failures[output_path] = str(e)
+
+    def pending_count(self) -> int:
+        """未完了の書き込み数"""
+        with self.lock:
+            return len(self.pending)
+
+    def wait(self) -> None:
+        """予約済みの全書き込みの完了を待つ"""
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.result()
+
+    def flush(self) -> Dict[str, str]:
+        """全書き込みの完了を待ち、前回の flush 以降に失敗した出力パス → エラーを返す"""
+        self.wait()
+        with self.lock:
+            failures = self.failures
+            self.failures = {}
+        return failures
+
+    def close(self) -> Dict[str, str]:
+        """書き込みを完了させてスレッドプールを停止"""
+        failures = self.flush()
+        self.executor.shutdown(wait=True)
+        return failures
+
+
+def write_png(image, output_path: str, pnginfo=None) -> None:
+    """PNGエンコード → 一時ファイルに書き込み・fsync → os.replace → 読み直して検証（失敗時は例外）"""
+    from PIL import Image
+
+    with span("image_encode", path=output_path):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", pnginfo=pnginfo)
+
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with span("disk_write", path=output_path, bytes=buffer.tell()):
+        try:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(buffer.getbuffer())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, output_path)
+
+            # 読み直してPNGの整合性とサイズを検証
+            with Image.open(output_path) as saved:
+                if saved.size != image.size:
+                    raise IOError(f"保存サイズ不一致: {saved.size} != {image.size}")
+                saved.verify()
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def apply_write_failures(results: List[Dict[str, Any]], failures: Dict[str, str]) -> int:
+    """保存に失敗した画像の結果を失敗扱いに書き換え、件数を返す"""
+    if not failures:
+        return 0
+
+    failed_paths = {os.path.abspath(path): error for path, error in failures.items()}
+    count = 0
+    for result in results:
+        if not result.get("success") or not result.get("output_path"):
+            continue
+        error = failed_paths.get(os.path.abspath(result["output_path"]))
+        if error is not None:
+            result["success"] = False
+            result["error"] = f"画像保存エラー: {error}"
+            count += 1
+    return count
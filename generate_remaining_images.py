@@ -6,79 +6,46 @@
 import os
 import sys
 import json
-import time
-from datetime import datetime
+
+from contentflow_sd import build_request, get_generator
 
 def setup_stable_diffusion():
-    """Stable Diffusion環境セットアップ"""
+    """Stable Diffusion環境セットアップ（常駐サーバーがあれば利用）"""
     try:
-        from diffusers import StableDiffusionXLPipeline
-        import torch
-        
-        print("📂 Stable Diffusionモデルロード中...")
-        
-        model_path = "/Users/gotohiro/Documents/user/Products/AI/models/diffusers/juggernaut-xl"
-        
-        pipe = StableDiffusionXLPipeline.from_pretrained(
-            model_path,
-            torch_dtype=torch.float16,
-            use_safetensors=False  # .bin形式のため必須
-        ).to("mps")  # Apple Silicon最適化
-        
+        generator = get_generator()
         print("✅ Stable Diffusion環境セットアップ完了")
-        return pipe
+        return generator
         
     except Exception as e:
         print(f"❌ Stable Diffusion環境セットアップエラー: {e}")
         sys.exit(1)
 
-def generate_image(pipe, prompt_info, position, session_id):
+def generate_image(generator, prompt_info, position, session_id):
     """画像生成実行"""
-    try:
-        print(f"\n🎨 画像生成開始: {position}")
-        print(f"📝 説明: {prompt_info['description']}")
-        
-        # 完全なプロンプト作成
-        full_prompt = f"{prompt_info['prompt']}, {prompt_info['style']}"
-        
-        print(f"🔤 プロンプト: {full_prompt[:80]}...")
-        print("🚫 人物除去プロンプト適用済み")
-        print("⚡ 画像生成実行中...")
-        
-        start_time = time.time()
-        
-        # 画像生成実行
-        image = pipe(
-            prompt=full_prompt,
-            negative_prompt=prompt_info['negativePrompt'],
-            width=prompt_info['parameters']['width'],
-            height=prompt_info['parameters']['height'],
-            num_inference_steps=prompt_info['parameters']['num_inference_steps'],
-            guidance_scale=prompt_info['parameters']['guidance_scale']
-        ).images[0]
-        
-        generation_time = time.time() - start_time
-        
-        # ファイル保存
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{position}-{timestamp}.png"
-        output_dir = f"public/images/blog/auto-generated/{session_id}"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        output_path = os.path.join(output_dir, filename)
-        image.save(output_path)
-        
-        print("✅ 画像生成完了")
-        print(f"⏱️ 生成時間: {generation_time:.2f}秒")
-        print(f"💾 保存先: {output_path}")
-        print(f"📏 解像度: {prompt_info['parameters']['width']}x{prompt_info['parameters']['height']}")
-        print(f"✅ 画像 {position} 生成成功")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ 画像生成エラー ({position}): {e}")
+    print(f"\n🎨 画像生成開始: {position}")
+    print(f"📝 説明: {prompt_info['description']}")
+    
+    # 完全なプロンプト作成
+    output_dir = f"public/images/blog/auto-generated/{session_id}"
+    request = build_request(prompt_info, output_dir, human_prevention=False, session_id=session_id)
+    
+    print(f"🔤 プロンプト: {request['prompt'][:80]}...")
+    print("🚫 人物除去プロンプト適用済み")
+    print("⚡ 画像生成実行中...")
+    
+    result = generator.generate(request)
+    
+    if not result["success"]:
         return False
+    
+    print("✅ 画像生成完了")
+    print(f"⏱️ 生成時間: {result['generation_time']:.2f}秒")
+    print(f"💾 保存先: {result['output_path']}")
+    print(f"📏 解像度: {prompt_info['parameters']['width']}x{prompt_info['parameters']['height']}")
+    print(f"🎲 シード: {result['seed']}")
+    print(f"✅ 画像 {position} 生成成功")
+    
+    return True
 
 def main():
     """メイン処理"""
@@ -102,7 +69,7 @@ def main():
     print(f"📝 記事タイトル: {data['article']['title']}")
     
     # Stable Diffusion セットアップ
-    pipe = setup_stable_diffusion()
+    generator = setup_stable_diffusion()
     
     # 対象画像プロンプト（section1、section2、section3）
     target_positions = ['section1', 'section2', 'section3']
@@ -122,9 +89,15 @@ def main():
             continue
         
         # 画像生成実行
-        if generate_image(pipe, prompt_info, position, session_id):
+        if generate_image(generator, prompt_info, position, session_id):
             success_count += 1
     
+    # 書き込み・検証の完了待ち（保存に失敗した画像は失敗として数える）
+    failures = generator.flush()
+    for output_path, error in failures.items():
+        print(f"❌ 画像保存エラー ({output_path}): {error}")
+    success_count -= len(failures)
+    
     print("\n" + "=" * 60)
     print(f"🎉 画像生成完了: {success_count}/{len(target_positions)}枚成功")
     
@@ -6,6 +6,7 @@
 import { promises as fs } from 'fs'
 import path from 'path'
 import { spawn } from 'child_process'
+import { sdServerClient, SD_DEFAULT_PARAMETERS, SD_LIGHT_TEST_PARAMETERS } from './sd-server-client'
 
 export interface ImageGenerationConfig {
   title: string
@@ -16,6 +17,7 @@ export interface ImageGenerationConfig {
     negative_prompt: string
     filename_prefix: string
     description: string
+    seed?: number
   }>
   article_info: {
     title: string
@@ -28,6 +30,7 @@ export interface ImageGenerationConfig {
 export interface ImageGenerationResult {
   success: boolean
   generated_files?: Record<string, string[]>
+  seeds?: Record<string, number[]>
   output_directory?: string
   stats?: {
     total_images: number
@@ -122,6 +125,22 @@ export class AutoImageManager {
     try {
       console.log('🎨 Stable Diffusion画像生成開始...')
       
+      // 常駐生成サーバーがあれば直接依頼（モデル再ロードなし）
+      if (await sdServerClient.isAvailable()) {
+        console.log('🔌 常駐生成サーバーを使用')
+        const config = JSON.parse(await fs.readFile(configPath, 'utf-8'))
+        const serverResult = await sdServerClient.generateFromConfig(
+          config,
+          outputDir,
+          testMode ? 1 : variations,
+          testMode ? SD_LIGHT_TEST_PARAMETERS : SD_DEFAULT_PARAMETERS
+        )
+        return {
+          ...serverResult,
+          output_directory: outputDir
+        }
+      }
+
       // 実行環境確認
       if (!(await this.validateSDEnvironment())) {
         return {
@@ -13,6 +13,7 @@ export interface BackgroundProcessConfig {
   totalImages: number;
   imagePrompts?: ImagePromptConfig[];
   outputDir?: string;
+  resume?: boolean; // 中断したセッションをチェックポイントから再開
 }
 
 export interface ImagePromptConfig {
@@ -26,6 +27,7 @@ export interface ImagePromptConfig {
     height: number;
     num_inference_steps: number;
     guidance_scale: number;
+    seed?: number;
   };
 }
 
@@ -38,9 +40,21 @@ export interface BackgroundProcessStatus {
     completed: number;
     total: number;
     failed: number;
+    step?: StepProgress;
   };
 }
 
+// 生成中画像のデノイズステップ進捗（Python側 contentflow_sd.progress が間引いて更新）
+export interface StepProgress {
+  positions: string[];
+  step: number;
+  totalSteps: number;
+  secondsPerStep: number | null;
+  elapsed: number;
+  imageEta: number | null;
+  sessionEta: number | null;
+}
+
 export interface GenerationStatus {
   sessionId?: string;
   status: string;
@@ -50,8 +64,24 @@ export interface GenerationStatus {
     completed: number;
     failed: number;
     results: any[];
+    progress?: StepProgress;
   };
   prompts?: any[];
+  updatedAt?: string;
+  // スナップショット時点のイベントログ位置（offset以降を読めば差分が得られる）
+  events?: {
+    file: string;
+    offset: number;
+    seq: number;
+  };
+}
+
+export interface GenerationEvent {
+  seq: number;
+  ts: string;
+  sessionId: string;
+  type: string;
+  data: Record<string, any>;
 }
 
 export class BackgroundProcessManager {
@@ -97,7 +127,8 @@ export class BackgroundProcessManager {
         progress: {
           completed: statusData.imageGeneration?.completed || 0,
           total: statusData.imageGeneration?.total || 0,
-          failed: statusData.imageGeneration?.failed || 0
+          failed: statusData.imageGeneration?.failed || 0,
+          step: statusData.imageGeneration?.progress
         }
       };
 
@@ -127,6 +158,56 @@ export class BackgroundProcessManager {
     }
   }
 
+  /**
+   * 画像生成イベント取得（イベントログの offset 以降のみ読む）
+   * offset 省略時はログの先頭から。返却された offset を次回の呼び出しに渡す
+   */
+  static async getGenerationEvents(offset: number = 0, eventsFile?: string): Promise<{ events: GenerationEvent[]; offset: number }> {
+    try {
+      const file = eventsFile || (await this.getGenerationStatus()).events?.file;
+      if (!file) {
+        return { events: [], offset };
+      }
+
+      const handle = await fs.open(path.resolve(process.cwd(), file), 'r');
+      try {
+        const { size } = await handle.stat();
+        if (size <= offset) {
+          return { events: [], offset };
+        }
+
+        const buffer = Buffer.alloc(size - offset);
+        await handle.read(buffer, 0, buffer.length, offset);
+
+        // 書き込み途中の末尾行は次回に回す
+        const end = buffer.lastIndexOf(0x0a) + 1;
+        const events = buffer
+          .subarray(0, end)
+          .toString('utf-8')
+          .split('\n')
+          .filter(line => line.trim())
+          .map(line => JSON.parse(line) as GenerationEvent);
+
+        return { events, offset: offset + end };
+      } finally {
+        await handle.close();
+      }
+
+    } catch (error) {
+      console.error('Generation events read error:', error);
+      return { events: [], offset };
+    }
+  }
+
+  /**
+   * 状態ファイルを原子的に書き込み（一時ファイル → rename）
+   */
+  private static async writeStatusFile(statusData: Record<string, any>): Promise<void> {
+    const tempFile = `${this.STATUS_FILE}.${process.pid}.tmp`;
+    await fs.writeFile(tempFile, JSON.stringify(statusData), 'utf-8');
+    await fs.rename(tempFile, this.STATUS_FILE);
+  }
+
   /**
    * バックグラウンド画像生成開始
    */
@@ -150,6 +231,9 @@ export class BackgroundProcessManager {
         this.SCRIPT_PATH,
         '--session-id', config.sessionId
       ];
+      if (config.resume) {
+        args.push('--resume');
+      }
 
       // バックグラウンドプロセス起動
       const child = spawn(this.PYTHON_PATH, args, {
@@ -197,7 +281,7 @@ export class BackgroundProcessManager {
         };
       }
 
-      // プロセス終了
+      // プロセス終了（生成中の画像はチェックポイント保存後に停止し、resume で再開できる）
       process.kill(status.pid, 'SIGTERM');
 
       // PIDファイル削除
@@ -265,9 +349,9 @@ export class BackgroundProcessManager {
         failed: 0,
         results: []
       },
-      prompts: config.imagePrompts || []
+      updatedAt: new Date().toISOString()
     };
 
-    await fs.writeFile(this.STATUS_FILE, JSON.stringify(statusData, null, 2), 'utf-8');
+    await this.writeStatusFile(statusData);
   }
 }
\ No newline at end of file
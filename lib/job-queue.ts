@@ -37,6 +37,7 @@ export interface ImageGenerationJobData {
     negative_prompt: string;
     filename_prefix: string;
     description: string;
+    seed?: number;
   }>;
 }
 
@@ -91,8 +92,9 @@ export class JobQueue {
 
   /**
    * 次の実行可能ジョブを取得
+   * pending → processing への rename で取得するため、複数ワーカー（Python ワーカー含む）でも同じジョブを二重に処理しない
    */
-  async getNextJob(): Promise<Job | null> {
+  async getNextJob(types?: JobType[]): Promise<Job | null> {
     try {
       const files = await fs.readdir(this.queueDir);
       const jobFiles = files.filter(file => file.endsWith('.json'));
@@ -101,18 +103,37 @@ export class JobQueue {
         return null;
       }
 
-      // 最も古いジョブを選択
+      // 最も古いジョブから順に取得を試みる
       jobFiles.sort();
-      const jobFile = jobFiles[0];
-      const jobPath = path.join(this.queueDir, jobFile);
-      
-      const jobData = await fs.readFile(jobPath, 'utf-8');
-      const job: Job = JSON.parse(jobData);
+      for (const jobFile of jobFiles) {
+        const jobPath = path.join(this.queueDir, jobFile);
+        const processingPath = path.join(this.processingDir, jobFile);
+
+        // 扱えない種類のジョブは取得しない
+        if (types) {
+          try {
+            const pendingJob: Job = JSON.parse(await fs.readFile(jobPath, 'utf-8'));
+            if (!types.includes(pendingJob.type)) {
+              continue;
+            }
+          } catch {
+            continue;
+          }
+        }
+
+        try {
+          await fs.rename(jobPath, processingPath);
+        } catch {
+          // 他のワーカーが先に取得した
+          continue;
+        }
+
+        const job: Job = JSON.parse(await fs.readFile(processingPath, 'utf-8'));
+        await this.markProcessing(job);
+        return job;
+      }
 
-      // ジョブを処理中に移動
-      await this.moveJobToProcessing(job);
-      
-      return job;
+      return null;
     } catch (error) {
       console.error('Error getting next job:', error);
       return null;
@@ -120,17 +141,16 @@ export class JobQueue {
   }
 
   /**
-   * ジョブを処理中ステータスに移動
+   * 取得済みジョブを処理中ステータスに更新
    */
-  private async moveJobToProcessing(job: Job): Promise<void> {
+  private async markProcessing(job: Job): Promise<void> {
     job.status = 'processing';
     job.startedAt = new Date().toISOString();
 
-    const oldPath = path.join(this.queueDir, `${job.id}.json`);
-    const newPath = path.join(this.processingDir, `${job.id}.json`);
-
-    await fs.writeFile(newPath, JSON.stringify(job, null, 2));
-    await fs.unlink(oldPath);
+    const processingPath = path.join(this.processingDir, `${job.id}.json`);
+    const tempPath = `${processingPath}.${process.pid}.tmp`;
+    await fs.writeFile(tempPath, JSON.stringify(job, null, 2));
+    await fs.rename(tempPath, processingPath);
   }
 
   /**
@@ -0,0 +1,211 @@
+/**
+ * ContentFlow 常駐画像生成サーバー クライアント
+ * contentflow_sd.server（python -m contentflow_sd.server）へループバックHTTPで生成を依頼する
+ */
+
+import { promises as fs } from 'fs'
+import path from 'path'
+
+export interface SDGenerationRequest {
+  prompt: string
+  negative_prompt: string
+  parameters?: {
+    width?: number
+    height?: number
+    num_inference_steps?: number
+    guidance_scale?: number
+    seed?: number
+    strength?: number
+  }
+  position: string
+  description?: string
+  output_dir: string
+  filename_prefix?: string
+  variation?: number
+  session_id?: string
+  force?: boolean
+  init_image?: string
+}
+
+export interface SDGenerationResult {
+  success: boolean
+  output_path?: string
+  filename?: string
+  generation_time?: number
+  position: string
+  description?: string
+  seed?: number
+  cached?: boolean
+  error?: string
+}
+
+export interface SDPromptConfig {
+  name: string
+  prompt: string
+  negative_prompt: string
+  filename_prefix: string
+  description: string
+  seed?: number
+}
+
+// scripts/auto-sd-generator.py の CONTENTFLOW_SETTINGS / LIGHT_TEST_SETTINGS と同じ値
+export const SD_DEFAULT_PARAMETERS = {
+  width: 1600,
+  height: 896,
+  num_inference_steps: 25,
+  guidance_scale: 7.5
+}
+
+export const SD_LIGHT_TEST_PARAMETERS = {
+  width: 512,
+  height: 512,
+  num_inference_steps: 10,
+  guidance_scale: 7.5
+}
+
+export class SDServerClient {
+  private baseUrl: string
+
+  constructor(baseUrl?: string) {
+    const host = process.env.CONTENTFLOW_SD_HOST || '127.0.0.1'
+    const port = process.env.CONTENTFLOW_SD_PORT || '7861'
+    this.baseUrl = baseUrl || `http://${host}:${port}`
+  }
+
+  /**
+   * サーバー起動確認
+   */
+  async isAvailable(): Promise<boolean> {
+    try {
+      const response = await fetch(`${this.baseUrl}/health`, { signal: AbortSignal.timeout(1000) })
+      if (!response.ok) return false
+      const health = await response.json()
+      return health.status === 'ready'
+    } catch {
+      return false
+    }
+  }
+
+  /**
+   * 単一画像生成
+   */
+  async generate(request: SDGenerationRequest): Promise<SDGenerationResult> {
+    const response = await fetch(`${this.baseUrl}/generate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        ...request,
+        output_dir: path.resolve(request.output_dir),
+        ...(request.init_image ? { init_image: path.resolve(request.init_image) } : {})
+      })
+    })
+
+    const result: SDGenerationResult = await response.json()
+    if (result.success && result.filename && !path.isAbsolute(request.output_dir)) {
+      result.output_path = path.join(request.output_dir, result.filename)
+    }
+    return result
+  }
+
+  /**
+   * サーバー側のバックグラウンド画像書き込み完了待ち
+   * 保存に失敗した出力パス（絶対パス）→ エラーを返す
+   */
+  async flush(): Promise<Record<string, string>> {
+    const response = await fetch(`${this.baseUrl}/flush`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: '{}'
+    })
+    const result = await response.json()
+    return result.failures || {}
+  }
+
+  /**
+   * プロンプト設定（auto-sd-generator.py 形式）から一括生成
+   * generation_result.json と同じ形式の結果を出力ディレクトリに保存する
+   */
+  async generateFromConfig(
+    config: { prompts: SDPromptConfig[]; article_info: Record<string, any> },
+    outputDir: string,
+    variations: number = 1,
+    parameters = SD_DEFAULT_PARAMETERS
+  ): Promise<{
+    success: boolean
+    generated_files: Record<string, string[]>
+    seeds: Record<string, number[]>
+    stats: { total_images: number; successful_generations: number; failed_generations: number; total_time: number }
+    article_info: Record<string, any>
+  }> {
+    const generatedFiles: Record<string, string[]> = {}
+    const seeds: Record<string, number[]> = {}
+    const stats = { total_images: 0, successful_generations: 0, failed_generations: 0, total_time: 0 }
+    const startTime = Date.now()
+
+    for (const promptConfig of config.prompts) {
+      generatedFiles[promptConfig.name] = []
+      seeds[promptConfig.name] = []
+
+      for (let i = 0; i < variations; i++) {
+        // 明示シードはバリエーションごとに連番、未指定ならサーバー側で出力ディレクトリ名とポジションから導出
+        const seed = promptConfig.seed !== undefined ? promptConfig.seed + i : undefined
+        const result = await this.generate({
+          prompt: promptConfig.prompt,
+          negative_prompt: promptConfig.negative_prompt || '',
+          parameters: seed !== undefined ? { ...parameters, seed } : parameters,
+          position: promptConfig.name,
+          description: promptConfig.description,
+          output_dir: outputDir,
+          filename_prefix: promptConfig.filename_prefix,
+          variation: i + 1
+        })
+
+        if (!result.success || !result.output_path) {
+          console.error(`❌ 画像生成エラー (${promptConfig.name}): ${result.error}`)
+          stats.failed_generations++
+          break
+        }
+
+        generatedFiles[promptConfig.name].push(result.output_path)
+        if (result.seed !== undefined) seeds[promptConfig.name].push(result.seed)
+        stats.successful_generations++
+        console.log(`✅ ${result.filename} 生成完了 (${(result.generation_time || 0).toFixed(1)}秒)`)
+      }
+
+      stats.total_images += generatedFiles[promptConfig.name].length
+    }
+
+    // 全画像の書き込み・検証が終わってから結果を確定
+    const failures = await this.flush()
+    for (const name of Object.keys(generatedFiles)) {
+      const files = generatedFiles[name]
+      const kept = files.map((_, i) => i).filter(i => failures[path.resolve(files[i])] === undefined)
+      for (const file of files.filter((_, i) => !kept.includes(i))) {
+        console.error(`❌ 画像保存エラー (${name}): ${failures[path.resolve(file)]}`)
+      }
+
+      const failedCount = files.length - kept.length
+      generatedFiles[name] = kept.map(i => files[i])
+      seeds[name] = kept.filter(i => i < seeds[name].length).map(i => seeds[name][i])
+      stats.total_images -= failedCount
+      stats.successful_generations -= failedCount
+      stats.failed_generations += failedCount
+    }
+
+    stats.total_time = (Date.now() - startTime) / 1000
+
+    const result = {
+      success: true,
+      generated_files: generatedFiles,
+      seeds,
+      stats,
+      article_info: config.article_info
+    }
+
+    await fs.writeFile(path.join(outputDir, 'generation_result.json'), JSON.stringify(result, null, 2), 'utf-8')
+    return result
+  }
+}
+
+// シングルトンインスタンス
+export const sdServerClient = new SDServerClient()
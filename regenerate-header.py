@@ -6,8 +6,8 @@ current session用のヘッダー画像のみを再生成する
 
 import os
 import json
-import time
-from datetime import datetime
+
+from contentflow_sd import get_generator
 
 def main():
     print("🔄 ヘッダー画像再生成スクリプト開始")
@@ -40,49 +40,44 @@ def main():
     
     try:
         print("📦 Stable Diffusion ライブラリロード中...")
-        from diffusers import StableDiffusionXLPipeline
-        import torch
-        
-        # モデルパス
-        model_path = "/Users/gotohiro/Documents/user/Products/AI/models/diffusers/juggernaut-xl"
-        
-        print(f"🤖 モデル読み込み中: Juggernaut XL")
-        pipe = StableDiffusionXLPipeline.from_pretrained(
-            model_path,
-            torch_dtype=torch.float16,
-            use_safetensors=False
-        ).to("mps")
+        print(f"🤖 モデル準備中: Juggernaut XL")
+        generator = get_generator()
         
         print(f"⚡ ヘッダー画像生成開始...")
-        start_time = time.time()
         
         # 画像生成
-        image = pipe(
-            prompt=header_prompt.strip(),
-            negative_prompt=negative_prompt.strip(),
-            width=1600,
-            height=896,
-            num_inference_steps=25,
-            guidance_scale=7.5
-        ).images[0]
-        
-        generation_time = time.time() - start_time
+        result = generator.generate({
+            "prompt": header_prompt.strip(),
+            "negative_prompt": negative_prompt.strip(),
+            "parameters": {
+                "width": 1600,
+                "height": 896,
+                "num_inference_steps": 25,
+                "guidance_scale": 7.5
+            },
+            "position": "header",
+            "description": "ヘッダー画像再生成",
+            "output_dir": output_dir,
+            "session_id": session_id
+        })
         
-        # 出力ファイルパス（タイムスタンプ付き）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"header-{timestamp}.png"
-        output_path = os.path.join(output_dir, filename)
+        if not result["success"]:
+            raise RuntimeError(result["error"])
         
-        # ディレクトリ存在確認・作成
-        os.makedirs(output_dir, exist_ok=True)
+        # 書き込み・検証の完了待ち
+        failures = generator.flush()
+        if failures:
+            raise RuntimeError(f"画像保存エラー: {next(iter(failures.values()))}")
         
-        # 画像保存
-        image.save(output_path)
+        generation_time = result["generation_time"]
+        filename = result["filename"]
+        output_path = result["output_path"]
         
         print(f"✅ ヘッダー画像再生成完了！")
         print(f"⏱️ 生成時間: {generation_time:.2f}秒")
         print(f"💾 保存先: {output_path}")
         print(f"📏 解像度: 1600x896")
+        print(f"🎲 シード: {result['seed']}")
         print(f"🎯 人物描画防止プロンプト適用済み")
         print(f"🌟 改善されたプロンプトで生成済み")
         
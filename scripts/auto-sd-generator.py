@@ -5,21 +5,38 @@ Phase A: SD実行スクリプト最適化版
 
 Usage:
     python auto-sd-generator.py --config prompts.json --output /path/to/output
+    python auto-sd-generator.py --config prompts.json --output /path/to/output --deadline 1680  # 28分以内に終える
+
+引数解析・設定ファイルの読み込みと検証はモデルの読み込み前に行い、
+torch / diffusers はパイプライン初期化時まで import しない（--help や設定エラーは即座に終了する）
 """
 
 import os
 import sys
 import json
+import time
+import signal
 import argparse
-import torch
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any
-from diffusers import StableDiffusionXLPipeline
+from typing import Dict, List, Any, Optional
+
+# プロジェクトルートの共通モジュールを参照
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-# 設定定数
-MODEL_PATH = "/Users/gotohiro/Documents/user/Products/AI/models/diffusers/juggernaut-xl"
-PYTHON_ENV = "/Users/gotohiro/Documents/user/Products/stable-diffusion-local/venv310/bin/python"
+from contentflow_sd import get_generator
+from contentflow_sd.settings import (
+    MODEL_PATH, DEVICE, MEMORY_PROFILES, MEMORY_PROFILE, SCHEDULERS, SPEED_PROFILES, SPEED_PROFILE,
+    VARIATION_BATCH_SIZE
+)
+from contentflow_sd.progressive import (
+    preview_request, refine_request, parse_selection, load_manifest, save_manifest
+)
+from contentflow_sd.writer import apply_write_failures
+from contentflow_sd.metrics import format_stages
+from contentflow_sd.validation import validate_prompt_config, print_messages
+from contentflow_sd.deadline import DeadlinePlanner
 
 # ContentFlow最適化設定
 CONTENTFLOW_SETTINGS = {
@@ -27,9 +44,11 @@ CONTENTFLOW_SETTINGS = {
     "height": 896,  # 16:9比率、8の倍数
     "num_inference_steps": 25,
     "guidance_scale": 7.5,
-    "torch_dtype": torch.float16,
-    "use_safetensors": False,  # .bin形式のため必須
-    "device": "mps"  # Apple Silicon最適化
+    "torch_dtype": None,  # デバイスに合わせて自動（MPS / CUDA: float16、CPU: bfloat16 または float32）
+    "device": DEVICE,  # auto: CUDA → MPS → CPU（CONTENTFLOW_DEVICE で固定）
+    "memory_profile": MEMORY_PROFILE,  # OOMになるホストでは low / minimal（--memory-profile）
+    "speed_profile": SPEED_PROFILE,  # fast: 12ステップ DPM++ 2M Karras、draft: LCM-LoRA 6ステップ（--speed-profile）
+    "scheduler": None  # None: 速度プロファイル・モデル同梱のスケジューラー（--scheduler）
 }
 
 # 軽量テストモード設定
@@ -38,25 +57,71 @@ LIGHT_TEST_SETTINGS = {
     "height": 512,  # 高速化のため小さいサイズ
     "num_inference_steps": 10,  # 高速化のため少ないステップ
     "guidance_scale": 7.5,
-    "torch_dtype": torch.float16,
-    "use_safetensors": False,
-    "device": "mps"
+    "torch_dtype": None,
+    "device": DEVICE,
+    "memory_profile": MEMORY_PROFILE,
+    "speed_profile": SPEED_PROFILE,
+    "scheduler": None
 }
 
+def load_prompt_config(config_path: str) -> Optional[Dict[str, Any]]:
+    """プロンプト設定ファイルの読み込みと検証（無効なら理由を表示して None）"""
+    print(f"📄 設定ファイル読み込み: {config_path}")
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except OSError as e:
+        print(f"❌ 設定ファイルを読み込めません: {e}")
+        return None
+    except ValueError as e:
+        print(f"❌ 設定ファイルのJSONが不正です: {e}")
+        return None
+    
+    if not ContentFlowSDGenerator.validate_prompt_config(config):
+        return None
+    return config
+
 class ContentFlowSDGenerator:
     """ContentFlow用Stable Diffusion画像生成クラス"""
     
-    def __init__(self, model_path: str = MODEL_PATH, test_mode: bool = False):
+    def __init__(self, model_path: str = MODEL_PATH, test_mode: bool = False, use_server: bool = True, batch_size: int = 1, force: bool = False,
+                 progressive: bool = False, preview_only: bool = False, selection: Dict[str, int] = None,
+                 memory_profile: str = None, speed_profile: str = None, scheduler: str = None,
+                 deadline: Optional[float] = None, deadline_resize: bool = False, deadline_scheduler: bool = False):
         self.model_path = model_path
-        self.pipe = None
+        self.generator = None
         self.test_mode = test_mode
+        self.use_server = use_server
+        self.batch_size = batch_size
+        self.force = force
+        self.progressive = progressive or preview_only
+        self.preview_only = preview_only
+        self.selection = selection or {}
+        self.previews: Dict[str, List[Dict[str, Any]]] = {}
+        self.seeds: Dict[str, List[int]] = {}
+        self.speed_profiles: Dict[str, Dict[str, Any]] = {}
+        # 締め切り（time.monotonic 基準）: 残り時間に収まるようステップ数等を画像ごとに計画する
+        self.deadline = deadline
+        self.deadline_resize = deadline_resize
+        self.deadline_scheduler = deadline_scheduler
+        self.planner: Optional[DeadlinePlanner] = None
+        self.interrupted = False
         self.settings = LIGHT_TEST_SETTINGS if test_mode else CONTENTFLOW_SETTINGS
+        if memory_profile:
+            self.settings = dict(self.settings, memory_profile=memory_profile)
+        if speed_profile:
+            self.settings = dict(self.settings, speed_profile=speed_profile)
+        if scheduler:
+            self.settings = dict(self.settings, scheduler=scheduler)
         self.generation_stats = {
             "total_images": 0,
             "successful_generations": 0,
             "failed_generations": 0,
             "total_time": 0
         }
+        if batch_size > 1:
+            self.generation_stats["batches"] = []
+            self.generation_stats["image_timings"] = []
     
     def initialize_pipeline(self) -> bool:
         """パイプライン初期化"""
@@ -69,12 +134,14 @@ class ContentFlowSDGenerator:
                 print(f"❌ モデルが見つかりません: {self.model_path}")
                 return False
             
-            # パイプライン初期化
-            self.pipe = StableDiffusionXLPipeline.from_pretrained(
+            # パイプライン初期化（常駐サーバーがあれば利用）
+            self.generator = get_generator(
                 self.model_path,
                 torch_dtype=self.settings["torch_dtype"],
-                use_safetensors=self.settings["use_safetensors"]
-            ).to(self.settings["device"])
+                device=self.settings["device"],
+                use_server=self.use_server,
+                memory_profile=self.settings["memory_profile"]
+            )
             
             print("✅ パイプライン初期化完了")
             return True
@@ -83,89 +150,275 @@ class ContentFlowSDGenerator:
             print(f"❌ パイプライン初期化エラー: {e}")
             return False
     
-    def validate_prompt_config(self, config: Dict[str, Any]) -> bool:
-        """プロンプト設定の検証"""
-        required_fields = ["prompts", "article_info"]
+    @staticmethod
+    def validate_prompt_config(config: Dict[str, Any]) -> bool:
+        """プロンプト設定の検証（python -m contentflow_sd.validation と同じ規則、警告は表示のみ）"""
+        validation = validate_prompt_config(config)
+        print_messages(validation)
+        return not validation["errors"]
+    
+    def build_request(self, prompt_config: Dict[str, str], output_dir: Path, variation: int) -> Dict[str, Any]:
+        """プロンプト設定から生成リクエストを構築"""
+        parameters = {
+            "width": self.settings["width"],
+            "height": self.settings["height"],
+            "num_inference_steps": self.settings["num_inference_steps"],
+            "guidance_scale": self.settings["guidance_scale"],
+            # プロンプト単位の指定（長尺・高解像度のシーンだけ省メモリにする等）を優先
+            "memory_profile": prompt_config.get("memory_profile") or self.settings["memory_profile"]
+        }
+        
+        # 速度プロファイルのステップ数・ガイダンス等はスクリプトの既定値より優先
+        speed_profile = prompt_config.get("speed_profile") or self.settings["speed_profile"]
+        for name in SPEED_PROFILES.get(speed_profile, {}):
+            parameters.pop(name, None)
+        parameters["speed_profile"] = speed_profile
+        scheduler = prompt_config.get("scheduler") or self.settings["scheduler"]
+        if scheduler:
+            parameters["scheduler"] = scheduler
+        
+        # 明示シードはバリエーションごとに連番、未指定なら出力ディレクトリ名とポジションから導出
+        if prompt_config.get("seed") is not None:
+            parameters["seed"] = prompt_config["seed"] + variation - 1
+        
+        return {
+            "prompt": prompt_config["prompt"],
+            "negative_prompt": prompt_config.get("negative_prompt", ""),
+            "parameters": parameters,
+            "position": prompt_config["name"],
+            "description": prompt_config.get("description", ""),
+            "output_dir": str(output_dir),
+            "filename_prefix": prompt_config["filename_prefix"],
+            "variation": variation,
+            "force": self.force
+        }
+    
+    def generate_batched(self, prompt_configs: List[Dict[str, str]], output_dir: Path, variations: int = 1) -> Dict[str, List[str]]:
+        """全プロンプト×バリエーションをまとめてバッチ生成"""
+        requests = [
+            self.build_request(prompt_config, output_dir, i + 1)
+            for prompt_config in prompt_configs
+            for i in range(variations)
+        ]
         
-        for field in required_fields:
-            if field not in config:
-                print(f"❌ 必須フィールドが不足: {field}")
-                return False
+        print(f"📦 バッチモード: {len(requests)}枚 (最大バッチサイズ {self.batch_size})")
+        results = self.generator.generate_batch(requests, max_batch_size=self.batch_size)
         
-        # プロンプト配列の検証
-        if not isinstance(config["prompts"], list) or len(config["prompts"]) == 0:
-            print("❌ プロンプト配列が無効です")
-            return False
+        all_generated_files = {prompt_config["name"]: [] for prompt_config in prompt_configs}
+        batches = {}
         
-        # 各プロンプトの必須フィールド確認
-        for i, prompt in enumerate(config["prompts"]):
-            required_prompt_fields = ["name", "prompt", "filename_prefix"]
-            for field in required_prompt_fields:
-                if field not in prompt:
-                    print(f"❌ プロンプト{i+1}に必須フィールドが不足: {field}")
-                    return False
+        for request, result in zip(requests, results):
+            if not result["success"]:
+                self.generation_stats["failed_generations"] += 1
+                continue
+            
+            all_generated_files[request["position"]].append(result["output_path"])
+            self.seeds.setdefault(request["position"], []).append(result["seed"])
+            self.record_speed_profile(request["position"], result)
+            self.generation_stats["successful_generations"] += 1
+            if result.get("cached"):
+                print(f"♻️ {result['filename']} 生成済み画像を再利用")
+                continue
+            
+            self.generation_stats["image_timings"].append({
+                "file": result["filename"],
+                "batch_id": result["batch_id"],
+                "generation_time": result["generation_time"]
+            })
+            batches[result["batch_id"]] = {
+                "batch_id": result["batch_id"],
+                "size": result["batch_size"],
+                "time": result["batch_time"],
+                "per_image": result["batch_time"] / result["batch_size"]
+            }
+            print(f"✅ {result['filename']} 生成完了 ({result['generation_time']:.1f}秒/枚, バッチ{result['batch_size']}枚)")
         
-        return True
+        self.generation_stats["batches"] = list(batches.values())
+        return all_generated_files
     
-    def generate_single_image(self, prompt_config: Dict[str, str], output_dir: Path, variations: int = 1) -> List[str]:
-        """単一プロンプトから画像生成"""
+    def generate_progressive(self, prompt_configs: List[Dict[str, str]], output_dir: Path, variations: int = 1) -> Dict[str, List[str]]:
+        """プレビュー生成 → 選択候補のみフル解像度で仕上げ"""
+        requests = {
+            prompt_config["name"]: [self.build_request(prompt_config, output_dir, i + 1) for i in range(variations)]
+            for prompt_config in prompt_configs
+        }
+        
+        # 1段目: 全候補のプレビュー（生成済みのものは結果キャッシュから再利用）
+        previews = [preview_request(request) for name in requests for request in requests[name]]
+        print(f"🔍 プレビュー生成: {len(previews)}枚 ({previews[0]['parameters']['width']}x{previews[0]['parameters']['height']}, {previews[0]['parameters']['num_inference_steps']}ステップ)")
+        preview_start = datetime.now()
+        preview_results = self.generator.generate_batch(previews, max_batch_size=self.batch_size)
+        apply_write_failures(preview_results, self.generator.flush())
+        preview_time = (datetime.now() - preview_start).total_seconds()
+        
+        self.previews = {name: [] for name in requests}
+        for request, result in zip(previews, preview_results):
+            if not result["success"]:
+                self.generation_stats["failed_generations"] += 1
+                continue
+            self.previews[request["position"]].append({
+                "variation": request["variation"],
+                "path": result["output_path"],
+                "seed": result["seed"]
+            })
+        
+        # 選択: --select 指定 > 前回の一覧ファイルの selected > バリエーション1
+        selected = {}
+        previous = load_manifest(str(output_dir)).get("selected", {})
+        for name, candidates in self.previews.items():
+            if not candidates:
+                continue
+            variation = self.selection.get(name, previous.get(name, 1))
+            if variation not in [candidate["variation"] for candidate in candidates]:
+                print(f"⚠️ {name}: バリエーション{variation}のプレビューがないため{candidates[0]['variation']}を使用")
+                variation = candidates[0]["variation"]
+            selected[name] = variation
+        
+        manifest_file = save_manifest(str(output_dir), self.previews, selected)
+        print(f"✅ プレビュー完了 ({preview_time:.1f}秒): {manifest_file}")
+        
+        self.generation_stats["progressive"] = {
+            "previews": sum(len(candidates) for candidates in self.previews.values()),
+            "preview_time": preview_time,
+            "selected": selected
+        }
+        
+        if self.preview_only:
+            print("👀 プレビューのみモード: --select で候補を選んで再実行してください")
+            return {name: [] for name in requests}
+        
+        # 2段目: 選択候補のみ、同じシードでプレビューを元にフル解像度で仕上げ
+        refines = []
+        for name, variation in selected.items():
+            preview = next(candidate for candidate in self.previews[name] if candidate["variation"] == variation)
+            refines.append(refine_request(requests[name][variation - 1], preview["path"]))
+        
+        print(f"🎨 仕上げ生成: {len(refines)}枚 (img2img strength {refines[0]['parameters']['strength'] if refines else '-'})")
+        refine_start = datetime.now()
+        refine_results = self.generator.generate_batch(refines, max_batch_size=self.batch_size)
+        self.generation_stats["progressive"]["refine_time"] = (datetime.now() - refine_start).total_seconds()
+        
+        all_generated_files = {name: [] for name in requests}
+        for request, result in zip(refines, refine_results):
+            if not result["success"]:
+                self.generation_stats["failed_generations"] += 1
+                continue
+            
+            all_generated_files[request["position"]].append(result["output_path"])
+            self.seeds.setdefault(request["position"], []).append(result["seed"])
+            self.record_speed_profile(request["position"], result)
+            self.generation_stats["successful_generations"] += 1
+            print(f"✅ {result['filename']} 仕上げ完了 (バリエーション{request['variation']}, {result['generation_time']:.1f}秒)")
+        
+        return all_generated_files
+    
+    def interrupt(self) -> None:
+        """生成中の画像をチェックポイント保存して止め、残りのシーンを生成しない（締め切り・SIGTERM）"""
+        self.interrupted = True
+        if self.generator is not None:
+            self.generator.interrupt()
+    
+    def handle_sigterm(self, signum, frame):
+        """SIGTERM受信時は生成済みの画像を結果として残して終了する"""
+        print(f"\n🛑 シグナル {signum} を受信しました。生成済みの画像で結果を保存して終了します...")
+        self.interrupt()
+    
+    def record_speed_profile(self, name: str, result: Dict[str, Any]) -> None:
+        """画像を生成した速度プロファイル・スケジューラー・ステップ数を記録"""
+        if result.get("speed_profile"):
+            self.speed_profiles[name] = {
+                "speed_profile": result["speed_profile"],
+                "scheduler": result["scheduler"],
+                "steps": result["steps"]
+            }
+    
+    def discard_failed_writes(self, generated_files: Dict[str, List[str]], failures: Dict[str, str]) -> None:
+        """保存に失敗した画像を生成結果から除外"""
+        failed_paths = {os.path.abspath(path) for path in failures}
+        
+        for name, files in generated_files.items():
+            kept = [i for i, file in enumerate(files) if os.path.abspath(file) not in failed_paths]
+            for file in files:
+                if os.path.abspath(file) in failed_paths:
+                    print(f"❌ 画像保存エラー ({name}): {failures.get(file) or file}")
+            
+            seeds = self.seeds.get(name, [])
+            if seeds:
+                self.seeds[name] = [seeds[i] for i in kept if i < len(seeds)]
+            
+            failed_count = len(files) - len(kept)
+            generated_files[name] = [files[i] for i in kept]
+            self.generation_stats["successful_generations"] -= failed_count
+            self.generation_stats["failed_generations"] += failed_count
+    
+    def generate_single_image(self, prompt_config: Dict[str, str], output_dir: Path, variations: int = 1,
+                              remaining_images: int = 1) -> List[str]:
+        """単一プロンプトから画像生成（バリエーションは1回のパイプライン呼び出しにまとめ、シードは画像ごと）
+
+        締め切り指定時は残り枚数（このシーンを含む）から計画したステップ数等で生成する。
+        """
         generated_files = []
         
         try:
             prompt = prompt_config["prompt"]
-            negative_prompt = prompt_config.get("negative_prompt", "")
-            filename_prefix = prompt_config["filename_prefix"]
             name = prompt_config["name"]
             
             print(f"🎨 {name} 画像生成開始...")
             print(f"📝 プロンプト: {prompt[:100]}...")
             
-            for i in range(variations):
-                start_time = datetime.now()
-                
-                # 画像生成
-                image = self.pipe(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    width=self.settings["width"],
-                    height=self.settings["height"],
-                    num_inference_steps=self.settings["num_inference_steps"],
-                    guidance_scale=self.settings["guidance_scale"]
-                ).images[0]
-                
-                # ファイル名生成
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{filename_prefix}-{i+1:03d}-{timestamp}.png"
-                filepath = output_dir / filename
+            requests = [self.build_request(prompt_config, output_dir, i + 1) for i in range(variations)]
+            if self.planner is not None:
+                parameters = self.planner.plan(name, requests[0]["parameters"], variations, remaining_images)
+                if parameters is None:
+                    return []
+                for request in requests:
+                    request["parameters"] = parameters
+            
+            # 画像生成（メモリ不足時は generate_batch がバッチサイズを半減して再試行）
+            results = self.generator.generate_batch(requests, max_batch_size=min(variations, VARIATION_BATCH_SIZE))
+            
+            if self.planner is not None and any(result.get("interrupted") for result in results):
+                self.planner.skipped.append(name)
+            generated = [result for result in results if result["success"] and not result.get("cached")]
+            if self.planner is not None and generated:
+                self.planner.record(requests[0]["parameters"], sum(result["generation_time"] for result in generated),
+                                    len(generated))
+            
+            for result in results:
+                if result.get("interrupted"):
+                    self.interrupted = True
+                    print(f"⏸️ {name}: 中断しました")
+                    continue
+                if not result["success"]:
+                    self.generation_stats["failed_generations"] += 1
+                    continue
                 
-                # 画像保存
-                image.save(filepath)
-                generated_files.append(str(filepath))
+                generated_files.append(result["output_path"])
+                self.seeds.setdefault(name, []).append(result["seed"])
+                self.record_speed_profile(name, result)
                 
                 # 統計更新
-                generation_time = (datetime.now() - start_time).total_seconds()
+                generation_time = result["generation_time"]
                 self.generation_stats["total_time"] += generation_time
                 self.generation_stats["successful_generations"] += 1
                 
-                print(f"✅ {filename} 生成完了 ({generation_time:.1f}秒)")
+                print(f"✅ {result['filename']} 生成完了 ({generation_time:.1f}秒, シード {result['seed']})")
             
             return generated_files
             
         except Exception as e:
             print(f"❌ 画像生成エラー ({name}): {e}")
             self.generation_stats["failed_generations"] += 1
-            return []
+            return generated_files
     
-    def generate_batch_images(self, config_path: str, output_dir: str, variations: int = 1) -> Dict[str, Any]:
-        """バッチ画像生成メイン処理"""
+    def generate_batch_images(self, config_path: str, output_dir: str, variations: int = 1,
+                              config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """バッチ画像生成メイン処理（config 指定時は検証済みの設定として使う）"""
         try:
-            # 設定ファイル読み込み
-            print(f"📄 設定ファイル読み込み: {config_path}")
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            # 設定検証
-            if not self.validate_prompt_config(config):
+            # 設定ファイル読み込み・検証
+            if config is None:
+                config = load_prompt_config(config_path)
+            if config is None:
                 return {"success": False, "error": "設定ファイルが無効です"}
             
             # 出力ディレクトリ作成
@@ -187,19 +440,64 @@ class ContentFlowSDGenerator:
             start_time = datetime.now()
             all_generated_files = {}
             
-            for prompt_config in config["prompts"]:
-                name = prompt_config["name"]
-                generated_files = self.generate_single_image(prompt_config, output_path, variations)
-                all_generated_files[name] = generated_files
-                self.generation_stats["total_images"] += len(generated_files)
-                
-                # 進行状況表示
-                print(f"📈 進行状況: {self.generation_stats['successful_generations']}/{len(config['prompts']) * variations}")
+            # 締め切り: 計画に使う残り時間が尽きたら実行中の画像も止める（生成済みの画像は結果に残す）
+            timer = None
+            if self.deadline is not None:
+                self.planner = DeadlinePlanner(self.deadline, resize=self.deadline_resize, scheduler=self.deadline_scheduler,
+                                               model=self.model_path)
+                remaining = self.planner.remaining()
+                print(f"⏰ 締め切りまで {remaining:.0f}秒"
+                      f"（見積もり: {'履歴 ' + str(self.planner.history_samples) + '件' if self.planner.history_samples else '1枚目の実測から'}）")
+                timer = threading.Timer(max(0.0, remaining), self.interrupt)
+                timer.daemon = True
+                timer.start()
+            
+            if self.progressive:
+                all_generated_files = self.generate_progressive(config["prompts"], output_path, variations)
+                self.generation_stats["total_images"] = sum(len(files) for files in all_generated_files.values())
+            elif self.batch_size > 1:
+                all_generated_files = self.generate_batched(config["prompts"], output_path, variations)
+                self.generation_stats["total_images"] = sum(len(files) for files in all_generated_files.values())
+            else:
+                for index, prompt_config in enumerate(config["prompts"]):
+                    name = prompt_config["name"]
+                    if self.interrupted:
+                        all_generated_files[name] = []
+                        if self.planner is not None:
+                            self.planner.skipped.append(name)
+                        continue
+                    remaining_images = (len(config["prompts"]) - index) * variations
+                    generated_files = self.generate_single_image(prompt_config, output_path, variations, remaining_images)
+                    all_generated_files[name] = generated_files
+                    self.generation_stats["total_images"] += len(generated_files)
+                    
+                    # 進行状況表示
+                    print(f"📈 進行状況: {self.generation_stats['successful_generations']}/{len(config['prompts']) * variations}")
+            
+            if timer is not None:
+                timer.cancel()
+            
+            # 全画像の書き込み・検証が終わってから結果を確定
+            failures = self.generator.flush()
+            if failures:
+                self.discard_failed_writes(all_generated_files, failures)
+                self.generation_stats["total_images"] = sum(len(files) for files in all_generated_files.values())
             
             # 完了統計
             total_time = (datetime.now() - start_time).total_seconds()
             self.generation_stats["total_time"] = total_time
             
+            cache_stats = self.generator.cache_stats()
+            if cache_stats:
+                self.generation_stats["embedding_cache"] = cache_stats
+            stage_stats = self.generator.stage_stats()
+            if stage_stats:
+                self.generation_stats["stages"] = stage_stats
+            if self.planner is not None:
+                self.generation_stats["deadline"] = self.planner.summary()
+            if self.interrupted:
+                self.generation_stats["interrupted"] = True
+            
             print("\n🎉 バッチ画像生成完了!")
             print(f"📊 統計:")
             print(f"  - 総画像数: {self.generation_stats['total_images']}")
@@ -207,10 +505,30 @@ class ContentFlowSDGenerator:
             print(f"  - 失敗: {self.generation_stats['failed_generations']}")
             print(f"  - 総時間: {total_time:.1f}秒")
             print(f"  - 平均時間/枚: {total_time/max(1, self.generation_stats['successful_generations']):.1f}秒")
+            if cache_stats:
+                print(f"  - 埋め込みキャッシュ: ヒット {cache_stats['hits']} / ミス {cache_stats['misses']}")
+            if stage_stats:
+                print(f"  - 段階別時間: {format_stages(stage_stats)}")
+            progressive_stats = self.generation_stats.get("progressive")
+            if progressive_stats:
+                print(f"  - プレビュー: {progressive_stats['previews']}枚 {progressive_stats['preview_time']:.1f}秒")
+                if "refine_time" in progressive_stats:
+                    print(f"  - 仕上げ: {progressive_stats['refine_time']:.1f}秒")
+            for batch in self.generation_stats.get("batches", []):
+                print(f"  - バッチ{batch['batch_id']}: {batch['size']}枚 {batch['time']:.1f}秒 ({batch['per_image']:.1f}秒/枚)")
+            deadline_stats = self.generation_stats.get("deadline")
+            if deadline_stats:
+                print(f"  - 締め切り: 残り {deadline_stats['remainingSeconds']:.0f}秒 / "
+                      f"未生成 {len(deadline_stats['skipped'])}シーン{'（' + ', '.join(deadline_stats['skipped']) + '）' if deadline_stats['skipped'] else ''}")
+            if self.interrupted:
+                print(f"  - ⏸️ 中断: 生成済みの画像のみ結果に含めます")
             
             return {
                 "success": True,
                 "generated_files": all_generated_files,
+                "seeds": self.seeds,
+                "speed_profiles": self.speed_profiles,
+                **({"previews": self.previews} if self.progressive else {}),
                 "stats": self.generation_stats,
                 "article_info": article_info
             }
@@ -226,20 +544,70 @@ def main():
     parser.add_argument('--output', required=True, help='画像出力ディレクトリ')
     parser.add_argument('--variations', type=int, default=1, help='各シーンの生成バリエーション数（デフォルト: 1）')
     parser.add_argument('--test', action='store_true', help='テストモード（1枚のみ生成）')
+    parser.add_argument('--no-server', action='store_true', help='常駐生成サーバーを使わずプロセス内でモデルをロード')
+    parser.add_argument('--batch-size', type=int, default=1, help='1回のパイプライン呼び出しでまとめて生成する最大枚数（デフォルト: 1=逐次）')
+    parser.add_argument('--force', action='store_true', help='同一入力の生成済み画像があっても再生成')
+    parser.add_argument('--progressive', action='store_true', help='全候補を低解像度でプレビュー生成し、選択候補のみフル解像度で仕上げ')
+    parser.add_argument('--preview-only', action='store_true', help='プレビュー生成のみ行い、仕上げは行わない')
+    parser.add_argument('--memory-profile', choices=list(MEMORY_PROFILES),
+                        help=f'メモリプロファイル（デフォルト: {MEMORY_PROFILE}、プロンプトの memory_profile が優先）')
+    parser.add_argument('--speed-profile', choices=list(SPEED_PROFILES),
+                        help=f'速度プロファイル（デフォルト: {SPEED_PROFILE}、プロンプトの speed_profile が優先）')
+    parser.add_argument('--scheduler', choices=list(SCHEDULERS),
+                        help='スケジューラー（デフォルト: 速度プロファイルのもの、プロンプトの scheduler が優先）')
+    parser.add_argument('--deadline', type=float,
+                        help='起動からの制限時間（秒）。残り時間に収まるよう画像ごとにステップ数を減らし、超えたシーンは生成しない')
+    parser.add_argument('--deadline-resize', action='store_true', help='--deadline で最小ステップ数でも収まらない場合に解像度も下げる')
+    parser.add_argument('--deadline-scheduler', action='store_true',
+                        help='--deadline でステップ数を減らした画像は少ステップ向けのスケジューラーで生成')
+    parser.add_argument('--select', help='仕上げる候補（例: hero=3,section1=1、未指定ポジションは前回の選択またはバリエーション1）')
     
     args = parser.parse_args()
+    started = time.monotonic()
+    
+    try:
+        selection = parse_selection(args.select)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.deadline is not None:
+        if args.deadline <= 0:
+            parser.error("--deadline は正の秒数で指定してください")
+        if args.batch_size > 1 or args.progressive or args.preview_only:
+            parser.error("--deadline は逐次生成（--batch-size 1、--progressive なし）でのみ使えます")
     
     print("🚀 ContentFlow自動画像生成システム開始")
     print("=" * 60)
     
+    # モデル（torch / diffusers）を読み込む前に設定ファイルを検証
+    config = load_prompt_config(args.config)
+    if config is None:
+        print("\n❌ 処理失敗: 設定ファイルが無効です")
+        sys.exit(1)
+    
     # テストモード
     if args.test:
         print("🧪 テストモード: 最初のプロンプトのみ生成")
         args.variations = 1
     
     # 生成実行
-    generator = ContentFlowSDGenerator(test_mode=args.test)
-    result = generator.generate_batch_images(args.config, args.output, args.variations)
+    generator = ContentFlowSDGenerator(
+        test_mode=args.test,
+        use_server=not args.no_server,
+        batch_size=args.batch_size,
+        force=args.force,
+        progressive=args.progressive,
+        preview_only=args.preview_only,
+        selection=selection,
+        memory_profile=args.memory_profile,
+        speed_profile=args.speed_profile,
+        scheduler=args.scheduler,
+        deadline=started + args.deadline if args.deadline is not None else None,
+        deadline_resize=args.deadline_resize,
+        deadline_scheduler=args.deadline_scheduler
+    )
+    signal.signal(signal.SIGTERM, generator.handle_sigterm)
+    result = generator.generate_batch_images(args.config, args.output, args.variations, config=config)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
     
     if result["success"]:
         print("\n✅ 全処理完了")
@@ -37,6 +37,9 @@ class HybridImageWorker {
     this.pollInterval = 5000; // 5秒間隔でポーリング
     this.pythonEnvPath = '/Users/gotohiro/Documents/user/Products/stable-diffusion-local/venv310/bin/python';
     this.scriptPath = './scripts/auto-sd-generator.py';
+    this.timeoutMs = 30 * 60 * 1000; // Python スクリプトの制限時間（30分）
+    this.deadlineMarginMs = 2 * 60 * 1000; // --deadline をタイムアウトより早めに設定する余白
+    this.killGraceMs = 60 * 1000; // タイムアウト時の SIGTERM から強制終了までの猶予
     this.flagsDir = './data/jobs/flags';
     this.configsDir = './data/jobs/configs';
     this.completedDir = './data/jobs/completed';
@@ -211,7 +214,9 @@ class HybridImageWorker {
         this.scriptPath,
         '--config', configPath,
         '--output', outputDir,
-        '--variations', '1'
+        '--variations', '1',
+        // タイムアウト前に終わるよう画像ごとのステップ数を調整させる（間に合わないシーンは生成しない）
+        '--deadline', String((this.timeoutMs - this.deadlineMarginMs) / 1000)
       ], {
         stdio: ['pipe', 'pipe', 'pipe'],
         env: { ...process.env }
@@ -232,8 +237,11 @@ class HybridImageWorker {
         console.error(`[Python Error]: ${output}`);
       });
 
+      let timedOut = false;
+
       pythonProcess.on('close', async (code) => {
-        if (code === 0) {
+        // タイムアウトで止めた場合も生成済みの画像は結果として返す
+        if (code === 0 || timedOut) {
           try {
             // 生成ファイル一覧取得
             const files = await fs.readdir(outputDir);
@@ -241,6 +249,13 @@ class HybridImageWorker {
               file.endsWith('.png') || file.endsWith('.jpg') || file.endsWith('.jpeg')
             );
             const fullPaths = imageFiles.map(file => path.join(outputDir, file));
+            if (timedOut) {
+              if (imageFiles.length === 0) {
+                reject(new Error('Python script execution timed out (30 minutes)'));
+                return;
+              }
+              console.warn(`⏰ Python script timed out. Keeping ${imageFiles.length} completed images.`);
+            }
             
             console.log(`✅ Phase A execution completed. Generated ${imageFiles.length} images.`);
             resolve(fullPaths);
@@ -256,11 +271,12 @@ class HybridImageWorker {
         reject(new Error(`Failed to start Python process: ${error.message}`));
       });
 
-      // タイムアウト設定 (30分)
+      // タイムアウト設定 (30分): SIGTERM で生成済みの画像を結果として保存させ、応答がなければ強制終了
       const timeout = setTimeout(() => {
+        timedOut = true;
         pythonProcess.kill('SIGTERM');
-        reject(new Error('Python script execution timed out (30 minutes)'));
-      }, 30 * 60 * 1000);
+        setTimeout(() => pythonProcess.kill('SIGKILL'), this.killGraceMs).unref();
+      }, this.timeoutMs);
 
       pythonProcess.on('close', () => {
         clearTimeout(timeout);
@@ -130,6 +130,21 @@ async function archiveProcessedFile(filePath, sessionId) {
   }
 }
 
+async function loadDerivativeManifest(baseDir) {
+  const manifestPath = path.join(baseDir, 'derivatives', 'manifest.json');
+  
+  try {
+    const manifest = JSON.parse(await fs.readFile(manifestPath, 'utf-8'));
+    console.log(`🖼️ 派生ファイルマニフェスト: ${manifestPath}`);
+    return manifest;
+  } catch (error) {
+    if (error.code !== 'ENOENT') {
+      console.warn(`⚠️ 派生ファイルマニフェスト読み込みエラー: ${error.message}`);
+    }
+    return null;
+  }
+}
+
 async function buildImageFilesPaths(sessionId) {
   console.log(`🖼️ 画像ファイルパスを構築: ${sessionId}`);
   
@@ -144,6 +159,9 @@ async function buildImageFilesPaths(sessionId) {
   const files = await fs.readdir(baseDir);
   console.log(`📁 ディレクトリ内ファイル数: ${files.length}`);
   
+  // 派生ファイルマニフェスト（contentflow_sd.derivatives）があれば選択画像と派生ファイル情報を利用
+  const manifest = await loadDerivativeManifest(baseDir);
+  
   // 最新の画像ファイルを自動検出
   const imageFiles = [];
   const positions = ['header', 'section1', 'section2', 'section3'];
@@ -154,14 +172,23 @@ async function buildImageFilesPaths(sessionId) {
       .sort()
       .reverse(); // 最新のファイルを選択
     
-    if (matchingFiles.length > 0) {
-      const selectedFile = matchingFiles[0];
-      imageFiles.push({
+    const manifestFile = manifest && manifest.positions[position];
+    const selectedFile = manifestFile && files.includes(manifestFile) ? manifestFile : matchingFiles[0];
+    
+    if (selectedFile) {
+      const imageFile = {
         position,
         filename: selectedFile,
         path: `${baseDir}/${selectedFile}`
-      });
-      console.log(`✅ ${position}: ${selectedFile}`);
+      };
+      
+      const derivatives = manifest && manifest.images[selectedFile];
+      if (derivatives) {
+        imageFile.derivatives = derivatives;
+      }
+      
+      imageFiles.push(imageFile);
+      console.log(`✅ ${position}: ${selectedFile}${derivatives ? ' (派生ファイルあり)' : ''}`);
     } else {
       console.warn(`⚠️ ${position}の画像が見つかりません`);
     }
@@ -295,5 +322,6 @@ module.exports = {
   integrateCurrentArticleSafe,
   findLatestArticleFile,
   findArticleInSanity,
-  buildImageFilesPaths
+  buildImageFilesPaths,
+  loadDerivativeManifest
 };
\ No newline at end of file
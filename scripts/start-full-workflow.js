@@ -492,11 +492,10 @@ class FullWorkflowOrchestrator {
           failed: 0,
           variations: []
         },
-        prompts: this.articleData.imagePrompts,
         backgroundProcess: null
       };
 
-      await fs.writeFile(STATUS_FILE, JSON.stringify(statusData, null, 2), 'utf-8');
+      await this.writeStatusFile(statusData);
       
       console.log(`✅ 状態ファイル初期化完了: ${this.articleData.imagePrompts.length}枚の画像生成準備`);
 
@@ -561,12 +560,21 @@ class FullWorkflowOrchestrator {
     try {
       const currentStatus = JSON.parse(await fs.readFile(STATUS_FILE, 'utf-8'));
       const updatedStatus = { ...currentStatus, ...updates };
-      await fs.writeFile(STATUS_FILE, JSON.stringify(updatedStatus, null, 2), 'utf-8');
+      await this.writeStatusFile(updatedStatus);
     } catch (error) {
       console.error(`状態ファイル更新エラー: ${error.message}`);
     }
   }
 
+  /**
+   * 状態ファイルを原子的に書き込み（一時ファイル → rename、生成プロセス側と同じ形式）
+   */
+  async writeStatusFile(statusData) {
+    const tempFile = `${STATUS_FILE}.${process.pid}.tmp`;
+    await fs.writeFile(tempFile, JSON.stringify(statusData), 'utf-8');
+    await fs.rename(tempFile, STATUS_FILE);
+  }
+
   /**
    * 最終結果報告
    */
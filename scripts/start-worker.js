@@ -28,7 +28,7 @@ class SimpleJobQueue {
     }
   }
 
-  async getNextJob() {
+  async getNextJob(types) {
     try {
       const files = await fs.readdir(this.queueDir);
       const jobFiles = files.filter(file => file.endsWith('.json'));
@@ -38,21 +38,41 @@ class SimpleJobQueue {
       }
 
       jobFiles.sort();
-      const jobFile = jobFiles[0];
-      const jobPath = path.join(this.queueDir, jobFile);
-      
-      const jobData = await fs.readFile(jobPath, 'utf-8');
-      const job = JSON.parse(jobData);
+      for (const jobFile of jobFiles) {
+        const jobPath = path.join(this.queueDir, jobFile);
+        const processingPath = path.join(this.processingDir, jobFile);
 
-      // ジョブを処理中に移動
-      job.status = 'processing';
-      job.startedAt = new Date().toISOString();
+        // 扱えない種類のジョブは取得しない
+        if (types) {
+          try {
+            const pendingJob = JSON.parse(await fs.readFile(jobPath, 'utf-8'));
+            if (!types.includes(pendingJob.type)) {
+              continue;
+            }
+          } catch {
+            continue;
+          }
+        }
 
-      const newPath = path.join(this.processingDir, `${job.id}.json`);
-      await fs.writeFile(newPath, JSON.stringify(job, null, 2));
-      await fs.unlink(jobPath);
-      
-      return job;
+        // rename で原子的に取得（他のワーカーが先に取得していれば失敗する）
+        try {
+          await fs.rename(jobPath, processingPath);
+        } catch {
+          continue;
+        }
+
+        const job = JSON.parse(await fs.readFile(processingPath, 'utf-8'));
+        job.status = 'processing';
+        job.startedAt = new Date().toISOString();
+
+        const tempPath = `${processingPath}.${process.pid}.tmp`;
+        await fs.writeFile(tempPath, JSON.stringify(job, null, 2));
+        await fs.rename(tempPath, processingPath);
+
+        return job;
+      }
+
+      return null;
     } catch (error) {
       console.error('Error getting next job:', error);
       return null;
@@ -127,6 +147,9 @@ class SimpleImageWorker {
     this.jobQueue = new SimpleJobQueue();
     this.pythonEnvPath = '/Users/gotohiro/Documents/user/Products/stable-diffusion-local/venv310/bin/python';
     this.scriptPath = './scripts/auto-sd-generator.py';
+    this.timeoutMs = 30 * 60 * 1000; // Python スクリプトの制限時間（30分）
+    this.deadlineMarginMs = 2 * 60 * 1000; // --deadline をタイムアウトより早めに設定する余白
+    this.killGraceMs = 60 * 1000; // タイムアウト時の SIGTERM から強制終了までの猶予
   }
 
   async start() {
@@ -152,7 +175,7 @@ class SimpleImageWorker {
       if (!this.isRunning) return;
 
       try {
-        const job = await this.jobQueue.getNextJob();
+        const job = await this.jobQueue.getNextJob(['image-generation']);
         if (job && job.type === 'image-generation') {
           await this.processImageGenerationJob(job);
         }
@@ -225,7 +248,9 @@ class SimpleImageWorker {
         this.scriptPath,
         '--config', configPath,
         '--output', outputDir,
-        '--variations', '1'
+        '--variations', '1',
+        // タイムアウト前に終わるよう画像ごとのステップ数を調整させる（間に合わないシーンは生成しない）
+        '--deadline', String((this.timeoutMs - this.deadlineMarginMs) / 1000)
       ], {
         stdio: ['pipe', 'pipe', 'pipe'],
         env: { ...process.env }
@@ -244,12 +269,22 @@ class SimpleImageWorker {
         console.error(`[Python Error]: ${data.toString().trim()}`);
       });
 
+      let timedOut = false;
+
       pythonProcess.on('close', async (code) => {
-        if (code === 0) {
+        // タイムアウトで止めた場合も生成済みの画像は結果として返す
+        if (code === 0 || timedOut) {
           try {
             const files = await fs.readdir(outputDir);
             const imageFiles = files.filter(file => file.endsWith('.png') || file.endsWith('.jpg'));
             const fullPaths = imageFiles.map(file => path.join(outputDir, file));
+            if (timedOut) {
+              if (imageFiles.length === 0) {
+                reject(new Error('Python script execution timed out (30 minutes)'));
+                return;
+              }
+              console.warn(`⏰ Python script timed out. Keeping ${imageFiles.length} completed images.`);
+            }
             
             console.log(`✅ Python script completed. Generated ${imageFiles.length} images.`);
             resolve(fullPaths);
@@ -265,11 +300,12 @@ class SimpleImageWorker {
         reject(new Error(`Failed to start Python process: ${error.message}`));
       });
 
-      // タイムアウト設定 (30分)
+      // タイムアウト設定 (30分): SIGTERM で生成済みの画像を結果として保存させ、応答がなければ強制終了
       const timeout = setTimeout(() => {
-        pythonProcess.kill();
-        reject(new Error('Python script execution timed out (30 minutes)'));
-      }, 30 * 60 * 1000);
+        timedOut = true;
+        pythonProcess.kill('SIGTERM');
+        setTimeout(() => pythonProcess.kill('SIGKILL'), this.killGraceMs).unref();
+      }, this.timeoutMs);
 
       pythonProcess.on('close', () => {
         clearTimeout(timeout);
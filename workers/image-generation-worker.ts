@@ -8,12 +8,16 @@ import path from 'path';
 import fs from 'fs/promises';
 import { jobQueue, Job, ImageGenerationJobData } from '../lib/job-queue';
 import { sanityImageUploader } from '../lib/sanity-image-upload';
+import { sdServerClient } from '../lib/sd-server-client';
 
 export class ImageGenerationWorker {
   private isRunning: boolean = false;
   private pollInterval: number = 5000; // 5秒間隔でポーリング
   private pythonEnvPath: string = '/Users/gotohiro/Documents/user/Products/stable-diffusion-local/venv310/bin/python';
   private scriptPath: string = './scripts/auto-sd-generator.py';
+  private timeoutMs: number = 30 * 60 * 1000; // Python スクリプトの制限時間（30分）
+  private deadlineMarginMs: number = 2 * 60 * 1000; // --deadline をタイムアウトより早めに設定する余白
+  private killGraceMs: number = 60 * 1000; // タイムアウト時の SIGTERM から強制終了までの猶予
 
   constructor() {
     console.log('🤖 ImageGenerationWorker initialized');
@@ -54,9 +58,11 @@ export class ImageGenerationWorker {
       if (!this.isRunning) return;
 
       try {
-        const job = await jobQueue.getNextJob();
-        if (job && job.type === 'image-generation') {
+        const job = await jobQueue.getNextJob(['image-generation', 'image-upload']);
+        if (job?.type === 'image-generation') {
           await this.processImageGenerationJob(job);
+        } else if (job?.type === 'image-upload') {
+          await this.processImageUploadJob(job);
         }
       } catch (error) {
         console.error('❌ Error in polling loop:', error);
@@ -87,8 +93,10 @@ export class ImageGenerationWorker {
       const outputDir = path.join('public/images/blog/auto-generated', job.id);
       await fs.mkdir(outputDir, { recursive: true });
 
-      // Python スクリプト実行
-      const generatedFiles = await this.executePythonScript(configPath, outputDir);
+      // 常駐生成サーバーがあれば直接依頼、なければ Python スクリプト実行
+      const generatedFiles = await sdServerClient.isAvailable()
+        ? await this.executeViaServer(jobData, outputDir)
+        : await this.executePythonScript(configPath, outputDir);
 
       // Sanity画像アップロード・記事更新
       const uploadResult = await sanityImageUploader.processImageIntegration(
@@ -115,6 +123,37 @@ export class ImageGenerationWorker {
     }
   }
 
+  /**
+   * 画像アップロードジョブ処理（Python ワーカーが生成したジョブの Sanity 統合）
+   */
+  private async processImageUploadJob(job: Job): Promise<void> {
+    console.log(`📤 Processing image upload job: ${job.id}`);
+
+    try {
+      const { articleId, outputDir, generationJobId } = job.data;
+
+      const uploadResult = await sanityImageUploader.processImageIntegration(
+        outputDir,
+        articleId,
+        generationJobId
+      );
+
+      await jobQueue.completeJob(job.id, {
+        outputDir,
+        generationJobId,
+        uploadResult,
+        heroImageAdded: !!uploadResult.heroImage,
+        sectionImagesAdded: uploadResult.sectionImages.length
+      });
+
+      console.log(`✅ Image upload completed: ${job.id}`);
+
+    } catch (error) {
+      console.error(`❌ Image upload failed: ${job.id}`, error);
+      await jobQueue.failJob(job.id, error instanceof Error ? error.message : 'Unknown error');
+    }
+  }
+
   /**
    * プロンプト設定ファイル作成
    */
@@ -136,6 +175,32 @@ export class ImageGenerationWorker {
     return configPath;
   }
 
+  /**
+   * 常駐生成サーバー経由で実行（モデル再ロードなし）
+   */
+  private async executeViaServer(jobData: ImageGenerationJobData, outputDir: string): Promise<string[]> {
+    console.log(`🔌 Using resident SD server: ${jobData.prompts.length} prompts -> ${outputDir}`);
+
+    const result = await sdServerClient.generateFromConfig(
+      {
+        prompts: jobData.prompts,
+        article_info: {
+          title: jobData.title,
+          estimated_scenes: jobData.prompts.length,
+          style: jobData.style,
+          theme: 'auto-generated'
+        }
+      },
+      outputDir
+    );
+
+    if (result.stats.failed_generations > 0) {
+      throw new Error(`SD server generation failed for ${result.stats.failed_generations} prompts`);
+    }
+
+    return Object.values(result.generated_files).flat();
+  }
+
   /**
    * Python スクリプト実行
    */
@@ -147,7 +212,9 @@ export class ImageGenerationWorker {
         this.scriptPath,
         '--config', configPath,
         '--output', outputDir,
-        '--variations', '1'
+        '--variations', '1',
+        // タイムアウト前に終わるよう画像ごとのステップ数を調整させる（間に合わないシーンは生成しない）
+        '--deadline', String((this.timeoutMs - this.deadlineMarginMs) / 1000)
       ], {
         stdio: ['pipe', 'pipe', 'pipe'],
         env: { ...process.env }
@@ -166,13 +233,23 @@ export class ImageGenerationWorker {
         console.error(`[Python Error]: ${data.toString().trim()}`);
       });
 
+      let timedOut = false;
+
       pythonProcess.on('close', async (code) => {
-        if (code === 0) {
+        // タイムアウトで止めた場合も生成済みの画像は結果として返す
+        if (code === 0 || timedOut) {
           try {
             // 生成されたファイル一覧を取得
             const files = await fs.readdir(outputDir);
             const imageFiles = files.filter(file => file.endsWith('.png') || file.endsWith('.jpg'));
             const fullPaths = imageFiles.map(file => path.join(outputDir, file));
+            if (timedOut) {
+              if (imageFiles.length === 0) {
+                reject(new Error('Python script execution timed out (30 minutes)'));
+                return;
+              }
+              console.warn(`⏰ Python script timed out. Keeping ${imageFiles.length} completed images.`);
+            }
             
             console.log(`✅ Python script completed successfully. Generated ${imageFiles.length} images.`);
             resolve(fullPaths);
@@ -188,11 +265,12 @@ export class ImageGenerationWorker {
         reject(new Error(`Failed to start Python process: ${error.message}`));
       });
 
-      // タイムアウト設定 (30分)
+      // タイムアウト設定 (30分): SIGTERM で生成済みの画像を結果として保存させ、応答がなければ強制終了
       const timeout = setTimeout(() => {
-        pythonProcess.kill();
-        reject(new Error('Python script execution timed out (30 minutes)'));
-      }, 30 * 60 * 1000);
+        timedOut = true;
+        pythonProcess.kill('SIGTERM');
+        setTimeout(() => pythonProcess.kill('SIGKILL'), this.killGraceMs).unref();
+      }, this.timeoutMs);
 
       pythonProcess.on('close', () => {
         clearTimeout(timeout);